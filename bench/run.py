@@ -0,0 +1,964 @@
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+import tracemalloc
+import uuid as _uuid
+import zipfile
+
+import psycopg2
+import sqlalchemy as _sql
+
+# Benchmark por endpoint con presupuesto de consultas. Crea una base de datos
+# desechable en el Postgres indicado, aplica las migraciones, siembra datos,
+# mide cada ruta de main.py y comprueba que ninguna haga más consultas de las
+# que fija bench/budgets.json. Sale con código 1 si alguna se pasa o si hay
+# rutas sin escenario.
+#   python -m bench.run --admin-url postgresql://postgres@localhost/postgres
+#   python -m bench.run --scenario publicaciones_escala
+#   python -m bench.run --compare bench/results/a.json bench/results/b.json
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BUDGETS_PATH = os.path.join(BENCH_DIR, "budgets.json")
+
+PASSWORD = "Bench-Passw0rd!"
+# exportacion: crecimiento de la memoria residente admitido, sea cual sea el
+# número de filas; zip además guarda su directorio central (un ZipInfo por
+# archivo) hasta el final
+EXPORT_MAX_RSS_GROWTH = 64 * 1024 * 1024
+EXPORT_ZIP_BYTES_PER_FILE = 1024
+
+
+def _crear_base(admin_url: str) -> str:
+    nombre = f"snippethub_bench_{_uuid.uuid4().hex[:8]}"
+    conn = psycopg2.connect(admin_url)
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute(f'CREATE DATABASE "{nombre}"')
+    conn.close()
+    return nombre
+
+def _borrar_base(admin_url: str, nombre: str):
+    conn = psycopg2.connect(admin_url)
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute(f'DROP DATABASE IF EXISTS "{nombre}" WITH (FORCE)')
+    conn.close()
+
+def _commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=BENCH_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+class _Consultas:
+    # cuenta las sentencias que llegan al motor de la API
+    def __init__(self, engine):
+        self.total = 0
+        _sql.event.listen(engine, "after_cursor_execute", self._contar)
+
+    def _contar(self, *args):
+        self.total += 1
+
+
+class _RespuestaFija:
+    output_text = "Informe de prueba."
+
+class _ClienteFijo:
+    # sustituye al cliente de OpenAI: el benchmark mide la API, no el modelo
+    class responses:
+        @staticmethod
+        async def create(model, input):
+            return _RespuestaFija()
+
+
+class Bench:
+    def __init__(self, client, consultas, semilla: dict):
+        self.client = client
+        self.consultas = consultas
+        self.semilla = semilla
+        self.usuarios = []
+
+    def auth(self, i: int = 0):
+        return {"Authorization": f"Bearer {self.usuarios[i]['token']}"}
+
+    async def pedir(self, metodo: str, url: str, **kwargs):
+        respuesta = await self.client.request(metodo, url, **kwargs)
+        if respuesta.status_code >= 400:
+            raise RuntimeError(f"{metodo} {url} -> {respuesta.status_code}: {respuesta.text[:300]}")
+        return respuesta
+
+    async def contar(self, metodo: str, url: str, **kwargs) -> int:
+        # consultas que hace una petición
+        self.consultas.total = 0
+        await self.pedir(metodo, url, **kwargs)
+        return self.consultas.total
+
+    # Datos de partida
+
+    async def crear_usuario(self, nombre: str):
+        await self.pedir("POST", "/users", json={
+            "username": nombre,
+            "full_name": f"Bench {nombre}",
+            "email": f"{nombre}@bench.local",
+            "hashed_password": PASSWORD,
+        })
+        token = (await self.pedir("POST", "/token", data={"username": nombre, "password": PASSWORD})).json()["access_token"]
+        usuario = (await self.pedir("GET", "/users/me", headers={"Authorization": f"Bearer {token}"})).json()
+        return {"username": nombre, "token": token, "Userid": usuario["Userid"]}
+
+    async def importar(self, i: int, n: int):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w") as archivo:
+            for j in range(n):
+                archivo.writestr(f"src/modulo_{j}.py", f"def funcion_{j}(x):\n    return x * {j}  # bench\n" * 20)
+        respuesta = await self.pedir(
+            "POST", "/import/snippets", headers=self.auth(i),
+            files={"files": ("snippets.zip", buffer.getvalue(), "application/zip")},
+        )
+        return [r["Snippetid"] for r in respuesta.json()["resultados"] if r["estado"] == "creado"]
+
+    async def publicar(self, i: int, Snippetid: str):
+        respuesta = await self.pedir("POST", "/publicaciones", headers=self.auth(i), data={
+            "Titulo": "Publicación bench", "Contenido": "Contenido de la publicación", "SnippetId": Snippetid,
+        })
+        return respuesta.json()["Publicacionid"]
+
+    async def comentar(self, i: int, Publicacionid: str):
+        respuesta = await self.pedir("POST", "/create/comentario", headers=self.auth(i), data={
+            "comentario": "Comentario bench", "Publicacionid": Publicacionid,
+        })
+        return respuesta.json()["ComentarioId"]
+
+    async def sembrar(self, engine):
+        for i in range(self.semilla["usuarios"]):
+            self.usuarios.append(await self.crear_usuario(f"bench{i}"))
+        async with engine.begin() as conn:
+            await conn.execute(_sql.text('UPDATE "user" SET role = \'admin\' WHERE username = \'bench0\''))
+        # el token de bench0 ya está en la caché de autenticación con el rol anterior
+        import services.auth_cache as _authCache
+        _authCache.clear()
+
+        for i, usuario in enumerate(self.usuarios):
+            usuario["snippets"] = await self.importar(i, self.semilla["snippets"])
+            usuario["publicaciones"] = [
+                await self.publicar(i, Snippetid)
+                for Snippetid in usuario["snippets"][: self.semilla["publicaciones"]]
+            ]
+        for i, usuario in enumerate(self.usuarios):
+            otro = (i + 1) % len(self.usuarios)
+            usuario["comentarios"] = []
+            for Publicacionid in self.usuarios[otro]["publicaciones"]:
+                for _ in range(self.semilla["comentarios"]):
+                    usuario["comentarios"].append(await self.comentar(i, Publicacionid))
+
+    # Escenarios: (método, ruta de main.py, preparar). preparar corre fuera de
+    # la medición y devuelve (url, kwargs) para la petición medida.
+
+    def escenarios(self):
+        u0 = lambda: self.usuarios[0]
+        u1 = lambda: self.usuarios[1]
+
+        async def snippet_nuevo():
+            return (await self.importar(0, 1))[0]
+
+        async def publicacion_nueva():
+            return await self.publicar(0, u0()["snippets"][0])
+
+        async def comentario_nuevo():
+            return await self.comentar(0, u1()["publicaciones"][0])
+
+        async def job():
+            return (await self.pedir("POST", "/admin/informe/jobs", headers=self.auth(0))).json()["job_id"]
+
+        async def fijo(url, **kwargs):
+            return url, kwargs
+
+        def zip_un_archivo():
+            buffer = io.BytesIO()
+            with zipfile.ZipFile(buffer, "w") as archivo:
+                archivo.writestr("uno.py", "print('bench')\n")
+            return {"files": ("uno.zip", buffer.getvalue(), "application/zip")}
+
+        return [
+            ("GET", "/metrics", lambda: fijo("/metrics")),
+            ("GET", "/users/me", lambda: fijo("/users/me", headers=self.auth(0))),
+            ("GET", "/users/{username}", lambda: fijo(f"/users/{u1()['username']}")),
+            ("POST", "/token", lambda: fijo("/token", data={"username": u0()["username"], "password": PASSWORD})),
+            ("POST", "/users", lambda: fijo("/users", json={
+                "username": f"nuevo_{_uuid.uuid4().hex[:8]}", "full_name": "Nuevo", "email": f"{_uuid.uuid4().hex[:8]}@bench.local",
+                "hashed_password": PASSWORD,
+            })),
+            ("GET", "/top_users", lambda: fijo("/top_users", headers=self.auth(0))),
+            ("GET", "/search", lambda: fijo("/search", params={"q": "funcion"}, headers=self.auth(0))),
+            ("GET", "/search/code", lambda: fijo("/search/code", params={"q": "return x"}, headers=self.auth(0))),
+            ("POST", "/create/snippets", lambda: fijo("/create/snippets", headers=self.auth(0), data={
+                "Titulo": "Nuevo", "Lenguaje": "Python", "descripcion": "bench",
+            }, files={"file": ("nuevo.py", b"print('bench')\n", "text/x-python")})),
+            ("POST", "/import/snippets", lambda: fijo("/import/snippets", headers=self.auth(0), files=zip_un_archivo())),
+            ("GET", "/export/me", lambda: fijo("/export/me", params={"formato": "tar"}, headers=self.auth(1))),
+            ("GET", "/snippets/me", lambda: fijo("/snippets/me", headers=self.auth(0))),
+            ("PUT", "/snippets/{snippet_id}", lambda: fijo(f"/snippets/{u0()['snippets'][-1]}", headers=self.auth(0), data={"descripcion": "editado"})),
+            ("GET", "/snippets/{username}", lambda: fijo(f"/snippets/{u1()['username']}", headers=self.auth(0))),
+            ("GET", "/snippets/{snippet_id}/raw", lambda: fijo(f"/snippets/{u0()['snippets'][0]}/raw", headers=self.auth(0))),
+            ("DELETE", "/snippets/{snippet_id}", lambda: self._con(snippet_nuevo, lambda i: (f"/snippets/{i}", {"headers": self.auth(0)}))),
+            ("POST", "/publicaciones", lambda: fijo("/publicaciones", headers=self.auth(0), data={
+                "Titulo": "Nueva", "Contenido": "bench", "SnippetId": u0()["snippets"][0],
+            })),
+            ("GET", "/publicaciones/me", lambda: fijo("/publicaciones/me", headers=self.auth(0))),
+            ("GET", "/publicaciones/{publicacion_id}", lambda: fijo(f"/publicaciones/{u1()['publicaciones'][0]}", headers=self.auth(0))),
+            ("GET", "/publications/user/{username}", lambda: fijo(f"/publications/user/{u1()['username']}", headers=self.auth(0))),
+            ("PUT", "/publicaciones/{publicacion_id}", lambda: fijo(f"/publicaciones/{u0()['publicaciones'][0]}", headers=self.auth(0), data={"Contenido": "editado"})),
+            ("DELETE", "/publicaciones/{publicacion_id}", lambda: self._con(publicacion_nueva, lambda i: (f"/publicaciones/{i}", {"headers": self.auth(0)}))),
+            ("POST", "/create/comentario", lambda: fijo("/create/comentario", headers=self.auth(0), data={
+                "comentario": "bench", "Publicacionid": u1()["publicaciones"][0],
+            })),
+            ("GET", "/comentarios/user/me", lambda: fijo("/comentarios/user/me", headers=self.auth(0))),
+            ("GET", "/comentarios/user/{Userid}", lambda: fijo(f"/comentarios/user/{u1()['Userid']}", headers=self.auth(0))),
+            ("GET", "/comentarios/{Publicacionid}", lambda: fijo(f"/comentarios/{u1()['publicaciones'][0]}", headers=self.auth(0))),
+            ("PUT", "/comentarios/{ComentarioId}", lambda: fijo(f"/comentarios/{u0()['comentarios'][0]}", headers=self.auth(0), data={"Contenido": "editado"})),
+            ("DELETE", "/comentarios/{ComentarioId}", lambda: self._con(comentario_nuevo, lambda i: (f"/comentarios/{i}", {"headers": self.auth(0)}))),
+            ("GET", "/admin/informe", lambda: fijo("/admin/informe", headers=self.auth(0))),
+            ("POST", "/admin/informe/jobs", lambda: fijo("/admin/informe/jobs", headers=self.auth(0))),
+            ("GET", "/admin/informe/jobs/{job_id}", lambda: self._con(job, lambda i: (f"/admin/informe/jobs/{i}", {"headers": self.auth(0)}))),
+            ("GET", "/admin/auth_cache", lambda: fijo("/admin/auth_cache", headers=self.auth(0))),
+            ("GET", "/admin/pool", lambda: fijo("/admin/pool", headers=self.auth(0))),
+            ("POST", "/admin/estadisticas/reconciliar", lambda: fijo("/admin/estadisticas/reconciliar", headers=self.auth(0))),
+        ]
+
+    async def _con(self, crear, construir):
+        return construir(await crear())
+
+    async def medir(self, metodo: str, ruta: str, preparar, iteraciones: int):
+        tiempos, consultas = [], []
+        estado = None
+        for _ in range(iteraciones):
+            url, kwargs = await preparar()
+            self.consultas.total = 0
+            inicio = time.perf_counter()
+            respuesta = await self.client.request(metodo, url, **kwargs)
+            await respuesta.aread()
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+            consultas.append(self.consultas.total)
+            estado = respuesta.status_code
+            if estado >= 400:
+                raise RuntimeError(f"{metodo} {ruta} -> {estado}: {respuesta.text[:300]}")
+        tiempos.sort()
+        return {
+            "method": metodo,
+            "route": ruta,
+            "status": estado,
+            "iterations": iteraciones,
+            "mean_ms": round(statistics.fmean(tiempos), 3),
+            "p50_ms": round(tiempos[len(tiempos) // 2], 3),
+            "p95_ms": round(tiempos[min(len(tiempos) - 1, int(len(tiempos) * 0.95))], 3),
+            "max_ms": round(tiempos[-1], 3),
+            "queries": max(consultas),
+        }
+
+
+# Escenarios de carga: en lugar del presupuesto de una ruta comprueban una
+# propiedad del servicio (consultas que no crecen con los datos, latencia bajo
+# carga, memoria acotada...). Se eligen con --scenario, corren después de las
+# rutas sobre la misma base y devuelven sus medidas con "ok".
+ESCENARIOS = {}
+
+def escenario(nombre: str):
+    def registrar(funcion):
+        ESCENARIOS[nombre] = funcion
+        return funcion
+    return registrar
+
+def _percentiles(tiempos: list) -> dict:
+    tiempos = sorted(tiempos)
+    def p(q):
+        return round(tiempos[min(len(tiempos) - 1, int(len(tiempos) * q))], 3)
+    return {"p50_ms": p(0.5), "p95_ms": p(0.95), "p99_ms": p(0.99), "max_ms": round(tiempos[-1], 3)}
+
+async def _retardo_loop(parar: asyncio.Event, intervalo: float = 0.005) -> float:
+    # Lo que tarda de más en despertar un sleep corto: mientras una ruta
+    # bloquea el event loop, todas las demás peticiones esperan otro tanto.
+    peor = 0.0
+    while not parar.is_set():
+        inicio = time.perf_counter()
+        await asyncio.sleep(intervalo)
+        peor = max(peor, time.perf_counter() - inicio - intervalo)
+    return round(peor * 1000, 3)
+
+async def _usuario_nuevo(bench: Bench, prefijo: str) -> int:
+    bench.usuarios.append(await bench.crear_usuario(f"{prefijo}_{_uuid.uuid4().hex[:8]}"))
+    return len(bench.usuarios) - 1
+
+@escenario("publicaciones_escala")
+async def _publicaciones_escala(bench: Bench, args) -> dict:
+    # Los listados de publicaciones traen sus snippets con la misma consulta:
+    # con N y con 10·N publicaciones en la página hacen las mismas consultas.
+    import services.pagination as _pagination
+
+    n = args.scale_publications
+    if 10 * n > _pagination.MAX_LIMIT:
+        raise ValueError(f"--scale-publications como mucho {_pagination.MAX_LIMIT // 10}: 10·N tiene que caber en una página")
+    i = await _usuario_nuevo(bench, "escala")
+    snippets = await bench.importar(i, 10 * n)
+    rutas = {"/publicaciones/me": "/publicaciones/me", "/publications/user/{username}": f"/publications/user/{bench.usuarios[i]['username']}"}
+    consultas = {}
+    publicadas = 0
+    for total in (n, 10 * n):
+        for Snippetid in snippets[publicadas:total]:
+            await bench.publicar(i, Snippetid)
+        publicadas = total
+        for ruta, url in rutas.items():
+            for inline in ("true", "false"):
+                consultas.setdefault(f"{ruta}?inline={inline}", []).append(await bench.contar(
+                    "GET", url, params={"limit": _pagination.MAX_LIMIT, "inline": inline}, headers=bench.auth(i),
+                ))
+    return {
+        "ok": all(valores[0] == valores[1] for valores in consultas.values()),
+        "publicaciones": [n, 10 * n],
+        "consultas": consultas,
+    }
+
+
+@escenario("carga_mixta")
+async def _carga_mixta(bench: Bench, args) -> dict:
+    # --concurrency clientes a la vez, cada uno con --requests peticiones de
+    # una mezcla de lecturas y escrituras. Se mide la latencia de cada una y el
+    # peor retardo del event loop: con la sesión async, una consulta lenta no
+    # para al resto de peticiones del worker.
+    u0, u1 = bench.usuarios[0], bench.usuarios[1]
+    mezcla = [
+        ("GET", "/snippets/me", "/snippets/me", lambda: {"headers": bench.auth(0)}),
+        ("GET", "/publicaciones/me", "/publicaciones/me", lambda: {"params": {"inline": "false"}, "headers": bench.auth(0)}),
+        ("GET", "/search", "/search", lambda: {"params": {"q": "funcion"}, "headers": bench.auth(0)}),
+        ("GET", "/comentarios/{Publicacionid}", f"/comentarios/{u1['publicaciones'][0]}", lambda: {"headers": bench.auth(0)}),
+        ("GET", "/snippets/{snippet_id}/raw", f"/snippets/{u0['snippets'][0]}/raw", lambda: {"headers": bench.auth(0)}),
+        ("POST", "/create/comentario", "/create/comentario", lambda: {"headers": bench.auth(0), "data": {
+            "comentario": "carga", "Publicacionid": u1["publicaciones"][0],
+        }}),
+    ]
+    tiempos = {f"{metodo} {ruta}": [] for metodo, ruta, _, _ in mezcla}
+    errores = 0
+
+    async def cliente(c: int):
+        nonlocal errores
+        for j in range(args.requests):
+            metodo, ruta, url, kwargs = mezcla[(c + j) % len(mezcla)]
+            inicio = time.perf_counter()
+            respuesta = await bench.client.request(metodo, url, **kwargs())
+            tiempos[f"{metodo} {ruta}"].append((time.perf_counter() - inicio) * 1000)
+            errores += respuesta.status_code >= 400
+
+    # calentamiento fuera de la medición
+    for metodo, _, url, kwargs in mezcla:
+        await bench.pedir(metodo, url, **kwargs())
+
+    parar = asyncio.Event()
+    sonda = asyncio.create_task(_retardo_loop(parar))
+    inicio = time.perf_counter()
+    await asyncio.gather(*(cliente(c) for c in range(args.concurrency)))
+    duracion = time.perf_counter() - inicio
+    parar.set()
+    todos = [t for lista in tiempos.values() for t in lista]
+    return {
+        "ok": errores == 0,
+        "concurrency": args.concurrency,
+        "requests": len(todos),
+        "errors": errores,
+        "rps": round(len(todos) / duracion, 1),
+        **_percentiles(todos),
+        "max_loop_lag_ms": await sonda,
+        "p99_ms_por_ruta": {clave: _percentiles(lista)["p99_ms"] for clave, lista in tiempos.items()},
+    }
+
+
+@escenario("tormenta_login")
+async def _tormenta_login(bench: Bench, args) -> dict:
+    # --logins logins a la vez (bcrypt) mientras un cliente consulta sin
+    # parar una ruta barata. bcrypt corre en su pool (services/hashing.py) y
+    # lo que no cabe en su cola sale con 503. Los hilos de bcrypt compiten
+    # por la CPU, así que la sonda se frena algo; lo que no puede es esperar
+    # un bcrypt entero: su p99 tiene que quedar por debajo de un login solo.
+    # Tampoco puede quedarse sin conexión mientras los logins esperan al
+    # pool de bcrypt: el máximo, por debajo de unos pocos logins.
+    credenciales = {"username": bench.usuarios[0]["username"], "password": PASSWORD}
+    sonda = ("/publicaciones/me", {"params": {"inline": "false"}, "headers": bench.auth(0)})
+
+    async def sondear(parar=None, veces: int = 0) -> list:
+        tiempos = []
+        while (parar is not None and not parar.done()) or len(tiempos) < veces:
+            inicio = time.perf_counter()
+            await bench.pedir("GET", sonda[0], **sonda[1])
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        return tiempos
+
+    async def login():
+        return (await bench.client.request("POST", "/token", data=credenciales)).status_code
+
+    await sondear(veces=10)
+    antes = _percentiles(await sondear(veces=args.requests))
+    inicio = time.perf_counter()
+    await login()
+    un_login = round((time.perf_counter() - inicio) * 1000, 3)
+
+    inicio = time.perf_counter()
+    tormenta = asyncio.ensure_future(asyncio.gather(*(login() for _ in range(args.logins))))
+    durante = _percentiles(await sondear(parar=tormenta))
+    estados = await tormenta
+    duracion = time.perf_counter() - inicio
+
+    aceptados = estados.count(200)
+    return {
+        "ok": aceptados > 0 and all(estado in (200, 503) for estado in estados) and durante["p99_ms"] < un_login and durante["max_ms"] < 5 * un_login,
+        "logins": args.logins,
+        "un_login_ms": un_login,
+        "aceptados": aceptados,
+        "rechazados_503": estados.count(503),
+        "logins_por_s": round(aceptados / duracion, 1),
+        "sonda_antes": antes,
+        "sonda_durante": durante,
+    }
+
+
+def _archivo_grande(tamano: int) -> str:
+    # contenido de código que no se repite, para que no comprima a nada
+    ruta = os.path.join(tempfile.mkdtemp(prefix="snippethub-bench-"), "grande.py")
+    with open(ruta, "w") as f:
+        escrito = 0
+        while escrito < tamano:
+            linea = f"valor_{_uuid.uuid4().hex} = {escrito}  # bench\n"
+            escrito += f.write(linea[: tamano - escrito])
+    return ruta
+
+@escenario("subidas_grandes")
+async def _subidas_grandes(bench: Bench, args) -> dict:
+    # --concurrency subidas a la vez de un archivo justo por debajo de
+    # MAX_UPLOAD_SIZE y otras tantas de uno --oversize veces mayor. El cliente
+    # lee los archivos del disco por trozos; el pico de memoria (tracemalloc,
+    # todo el proceso) tiene que crecer con el límite, no con lo que se envía,
+    # y las grandes salir con 413. Cada subida válida puede tener su contenido
+    # en memoria una vez al indexarlo (snippet_texto guarda el texto entero):
+    # como mucho dos MAX_UPLOAD_SIZE por subida.
+    import services.uploads as _uploads
+
+    valido = _archivo_grande(_uploads.MAX_UPLOAD_SIZE - 1024)
+    excesivo = _archivo_grande(_uploads.MAX_UPLOAD_SIZE * args.oversize)
+
+    async def subir(ruta: str) -> int:
+        with open(ruta, "rb") as f:
+            respuesta = await bench.client.request("POST", "/create/snippets", headers=bench.auth(0), data={
+                "Titulo": "Grande", "Lenguaje": "Python", "descripcion": "bench",
+            }, files={"file": ("grande.py", f, "text/x-python")})
+        return respuesta.status_code
+
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        inicio = time.perf_counter()
+        validos = await asyncio.gather(*(subir(valido) for _ in range(args.concurrency)))
+        duracion = time.perf_counter() - inicio
+        _, pico_validos = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        excesivos = await asyncio.gather(*(subir(excesivo) for _ in range(args.concurrency)))
+        _, pico_excesivos = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        for ruta in (valido, excesivo):
+            os.remove(ruta)
+
+    mb = 1024 * 1024
+    enviado = args.concurrency * _uploads.MAX_UPLOAD_SIZE * args.oversize
+    return {
+        "ok": all(estado == 200 for estado in validos) and all(estado == 413 for estado in excesivos)
+              and pico_validos < 2 * args.concurrency * _uploads.MAX_UPLOAD_SIZE and pico_excesivos < enviado / 10,
+        "concurrency": args.concurrency,
+        "max_upload_mb": round(_uploads.MAX_UPLOAD_SIZE / mb, 2),
+        "validas_s": round(duracion, 3),
+        "pico_validas_mb": round(pico_validos / mb, 2),
+        "pico_validas_por_subida_mb": round(pico_validos / args.concurrency / mb, 2),
+        "excesivas_enviadas_mb": round(enviado / mb, 2),
+        "pico_excesivas_mb": round(pico_excesivos / mb, 2),
+    }
+
+
+_VOCABULARIO = [
+    "parse", "json", "socket", "cache", "thread", "queue", "buffer", "stream", "token", "lexer",
+    "matrix", "vector", "render", "shader", "router", "handler", "logger", "config", "schema", "index",
+    "cursor", "batch", "merge", "sort", "filter", "reduce", "hash", "crypto", "retry", "timeout",
+    "client", "server", "proxy", "upload", "export", "import", "backup", "deploy", "docker", "kernel",
+    "regex", "string", "number", "date", "parser", "graph", "tree", "heap", "stack", "list",
+]
+_LENGUAJES = ["Python", "JavaScript", "Go", "Rust", "Java", "C", "Ruby", "SQL"]
+
+def _corpus_stmt(usuarios: list, total: int):
+    # Snippets sintéticos con el mismo vector que snippet_vector: cada palabra
+    # del vocabulario sale en ~1/50 de las filas y cada "marcaN" en total/10000.
+    # Sin contenido en el almacén: solo sirven para /search.
+    import models as _models
+
+    fts = _models.FTS_CONFIG
+    vocabulario = "(ARRAY[" + ", ".join(f"'{p}'" for p in _VOCABULARIO) + "])"
+    lenguajes = "(ARRAY[" + ", ".join(f"'{l}'" for l in _LENGUAJES) + "])"
+    autores = "(ARRAY[" + ", ".join(f"'{u}'::uuid" for u in usuarios) + "])"
+    return _sql.text(f"""
+        INSERT INTO snippet ("Snippetid", "Titulo", "Userid", "Lenguaje", descripcion, busqueda, fecha_creacion, actualiza, activo)
+        SELECT gen_random_uuid(), titulo, {autores}[1 + i % {len(usuarios)}], lenguaje, descripcion,
+               setweight(to_tsvector('{fts}', titulo), 'A') || setweight(to_tsvector('{fts}', lenguaje), 'A')
+               || setweight(to_tsvector('{fts}', descripcion), 'B') || setweight(to_tsvector('{fts}', contenido), 'C'),
+               now() - make_interval(secs => i), now(), true
+        FROM (
+            SELECT i,
+                   {vocabulario}[1 + i % 50] || ' ' || {vocabulario}[1 + (i / 50) % 50] AS titulo,
+                   {lenguajes}[1 + (i / 7) % {len(_LENGUAJES)}] AS lenguaje,
+                   'helper para ' || {vocabulario}[1 + (i * 7) % 50] || ' marca' || (i % 10000) AS descripcion,
+                   'def ' || {vocabulario}[1 + (i * 13) % 50] || '_' || i || '(x): return ' || {vocabulario}[1 + (i * 31) % 50] AS contenido
+            FROM generate_series(1, :total) AS i
+        ) AS filas
+    """).bindparams(total=total)
+
+@escenario("busqueda_corpus")
+async def _busqueda_corpus(bench: Bench, args) -> dict:
+    # /search sobre un corpus de --corpus snippets (1M por defecto): una
+    # palabra común (~2% de las filas, hay que ordenar todas por rank), una
+    # rara (~100 filas), dos palabras, los filtros y una segunda página.
+    import database as _database
+
+    autores = [await _usuario_nuevo(bench, "corpus") for _ in range(4)]
+    print(f"Insertando {args.corpus} snippets...", file=sys.stderr)
+    inicio = time.perf_counter()
+    async with _database.async_engine.begin() as conn:
+        await conn.execute(_corpus_stmt([bench.usuarios[i]["Userid"] for i in autores], args.corpus))
+    async with _database.async_engine.connect() as conn:
+        await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(_sql.text("VACUUM ANALYZE snippet"))
+    carga = time.perf_counter() - inicio
+
+    rara = 1234
+    cabeceras = bench.auth(0)
+    primera = (await bench.pedir("GET", "/search", params={"q": "parse", "limit": 20}, headers=cabeceras)).json()
+    consultas = {
+        "comun": {"q": "parse"},
+        "rara": {"q": f"marca{rara}"},
+        "dos_palabras": {"q": "parse socket"},
+        "comun_lenguaje": {"q": "parse", "lenguaje": "Go"},
+        # las filas de marcaN son de un solo autor: el de la fila N
+        "rara_autor": {"q": f"marca{rara}", "autor": bench.usuarios[autores[rara % len(autores)]]["username"]},
+        "comun_pagina_2": {"q": "parse", "cursor": primera["next_cursor"]},
+    }
+    resultados, ok = {}, primera["next_cursor"] is not None
+    for nombre, params in consultas.items():
+        tiempos, items = [], 0
+        for _ in range(args.iterations):
+            inicio_q = time.perf_counter()
+            respuesta = await bench.pedir("GET", "/search", params={"limit": 20, **params}, headers=cabeceras)
+            tiempos.append((time.perf_counter() - inicio_q) * 1000)
+            items = len(respuesta.json()["items"])
+        ok = ok and items > 0
+        resultados[nombre] = {"items": items, **_percentiles(tiempos)}
+    return {"ok": ok, "corpus": args.corpus, "carga_s": round(carga, 1), "consultas": resultados}
+
+
+# Índices de las tablas principales antes de migrations/0008 (y de los
+# compuestos de 0002): sobre columnas de texto, ninguno sobre las FKs.
+_INDICES_ANTES = [
+    'CREATE INDEX ix_publicacion_titulo ON publicacion (titulo)',
+    'CREATE INDEX ix_publicacion_contenido ON publicacion (contenido)',
+    'CREATE INDEX ix_comentario_contenido ON comentario (contenido)',
+    'CREATE INDEX "ix_snippet_Titulo" ON snippet ("Titulo")',
+    'CREATE INDEX ix_snippet_descripcion ON snippet (descripcion)',
+    'CREATE INDEX ix_user_full_name ON "user" (full_name)',
+]
+# Los de ahora que no existían entonces
+_INDICES_DESPUES = [
+    "ix_publicacion_usuario_fecha", "ix_publicacion_snippet", "ix_snippet_usuario_fecha",
+    "ix_comentario_usuario_fecha", "ix_comentario_publicacion_fecha", "ix_comentario_publicacion",
+]
+
+def _relleno_stmts() -> list:
+    # :n snippets y publicaciones y 10·:n comentarios de otro usuario, para
+    # que leer las filas de los usuarios del bench sin índice cueste
+    return [_sql.text(sql) for sql in (
+        """INSERT INTO snippet ("Snippetid", "Titulo", "Userid", "Lenguaje", descripcion, fecha_creacion, actualiza, activo)
+           SELECT gen_random_uuid(), 'Relleno ' || i, :Userid, 'Python', 'Descripción ' || i, now() - make_interval(secs => i), now(), true
+           FROM generate_series(1, :n) AS i""",
+        """INSERT INTO publicacion ("Publicacionid", "Userid", "SnippetId", titulo, contenido, fecha_creacion, actualiza, activo)
+           SELECT gen_random_uuid(), :Userid, "Snippetid", 'Relleno', 'Contenido de relleno ' || "Titulo", fecha_creacion, now(), true
+           FROM snippet WHERE "Userid" = :Userid""",
+        """INSERT INTO comentario ("ComentarioId", contenido, fecha_creacion, "Userid", "Publicacionid", actualiza, activo)
+           SELECT gen_random_uuid(), 'Comentario de relleno ' || j, now() - make_interval(secs => j), :Userid, "Publicacionid", now(), true
+           FROM publicacion, generate_series(1, 10) AS j WHERE "Userid" = :Userid""",
+    )]
+
+@escenario("indices")
+async def _indices(bench: Bench, args) -> dict:
+    # Latencia de lecturas y escrituras con los índices de ahora y con los de
+    # antes de la revisión (migrations/0008), sobre --index-rows comentarios
+    # de relleno. Al terminar deja los índices como estaban.
+    import database as _database
+
+    i = await _usuario_nuevo(bench, "relleno")
+    async with _database.async_engine.begin() as conn:
+        for stmt in _relleno_stmts():
+            await conn.execute(stmt, {"Userid": bench.usuarios[i]["Userid"], "n": args.index_rows // 10})
+
+    u0, u1 = bench.usuarios[0], bench.usuarios[1]
+    rutas = [
+        ("GET", "/comentarios/{Publicacionid}", lambda: (f"/comentarios/{u1['publicaciones'][0]}", {})),
+        ("GET", "/comentarios/user/{Userid}", lambda: (f"/comentarios/user/{u1['Userid']}", {})),
+        ("GET", "/comentarios/user/me", lambda: ("/comentarios/user/me", {})),
+        ("GET", "/publicaciones/me", lambda: ("/publicaciones/me", {"params": {"inline": "false"}})),
+        ("GET", "/publications/user/{username}", lambda: (f"/publications/user/{u1['username']}", {"params": {"inline": "false"}})),
+        ("GET", "/snippets/me", lambda: ("/snippets/me", {})),
+        ("POST", "/create/comentario", lambda: ("/create/comentario", {"data": {"comentario": "bench", "Publicacionid": u1["publicaciones"][0]}})),
+        ("PUT", "/comentarios/{ComentarioId}", lambda: (f"/comentarios/{u0['comentarios'][0]}", {"data": {"Contenido": "editado"}})),
+        ("POST", "/publicaciones", lambda: ("/publicaciones", {"data": {"Titulo": "bench", "Contenido": "bench", "SnippetId": u0["snippets"][0]}})),
+    ]
+
+    async def medir() -> dict:
+        async with _database.async_engine.connect() as conn:
+            await conn.execution_options(isolation_level="AUTOCOMMIT")
+            await conn.execute(_sql.text("ANALYZE"))
+        resultado = {}
+        for metodo, ruta, construir in rutas:
+            tiempos = []
+            for _ in range(args.iterations + 1):
+                url, kwargs = construir()
+                inicio = time.perf_counter()
+                await bench.pedir(metodo, url, headers=bench.auth(0), **kwargs)
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+            # la primera calienta la caché de Postgres
+            resultado[f"{metodo} {ruta}"] = round(statistics.median(tiempos[1:]), 3)
+        return resultado
+
+    async def indices(conn) -> dict:
+        filas = await conn.execute(_sql.text("SELECT indexname, indexdef FROM pg_indexes WHERE schemaname = current_schema()"))
+        return dict(filas.all())
+
+    despues = await medir()
+    async with _database.async_engine.begin() as conn:
+        originales = await indices(conn)
+        for nombre in _INDICES_DESPUES:
+            await conn.execute(_sql.text(f"DROP INDEX {nombre}"))
+        for definicion in _INDICES_ANTES:
+            await conn.execute(_sql.text(definicion))
+    try:
+        antes = await medir()
+    finally:
+        async with _database.async_engine.begin() as conn:
+            for definicion in _INDICES_ANTES:
+                await conn.execute(_sql.text(f"DROP INDEX {definicion.split()[2]}"))
+            for nombre in _INDICES_DESPUES:
+                await conn.execute(_sql.text(originales[nombre]))
+            restaurados = await indices(conn)
+
+    return {
+        "ok": restaurados == originales,
+        "comentarios_relleno": args.index_rows,
+        "mediana_ms": {clave: {"antes": antes[clave], "despues": despues[clave]} for clave in despues},
+    }
+
+
+def _archivo_importacion(formato: str, n: int) -> bytes:
+    # n archivos de código distintos (sin deduplicación de blobs)
+    buffer = io.BytesIO()
+    contenidos = (
+        (f"lib/paquete_{j // 100}/modulo_{j}.py", f"def funcion_{j}(x):\n    return x * {j}  # {_uuid.uuid4().hex}\n".encode() * 10)
+        for j in range(n)
+    )
+    if formato == "zip":
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archivo:
+            for nombre, contenido in contenidos:
+                archivo.writestr(nombre, contenido)
+    else:
+        with tarfile.open(fileobj=buffer, mode="w:gz") as archivo:
+            for nombre, contenido in contenidos:
+                info = tarfile.TarInfo(nombre)
+                info.size = len(contenido)
+                archivo.addfile(info, io.BytesIO(contenido))
+    return buffer.getvalue()
+
+@escenario("importacion")
+async def _importacion(bench: Bench, args) -> dict:
+    # POST /import/snippets con un zip y un tar.gz de --import-items archivos
+    # cada uno, para un usuario nuevo: snippets por segundo de punta a punta
+    # (subida, descompresión, blobs, índice de búsqueda y commit) y, en una
+    # segunda importación con tracemalloc (que la frena), pico de memoria.
+    i = await _usuario_nuevo(bench, "importa")
+
+    async def importar(formato: str, nombre: str):
+        archivo = _archivo_importacion(formato, args.import_items)
+        inicio = time.perf_counter()
+        respuesta = await bench.pedir("POST", "/import/snippets", headers=bench.auth(i), files={
+            "files": (nombre, archivo, "application/octet-stream"),
+        })
+        creados = sum(r["estado"] == "creado" for r in respuesta.json()["resultados"])
+        return creados, time.perf_counter() - inicio, len(archivo)
+
+    resultado = {"ok": True, "items": args.import_items}
+    for formato, nombre in (("zip", "biblioteca.zip"), ("tar", "biblioteca.tar.gz")):
+        creados, duracion, tamano = await importar(formato, nombre)
+        tracemalloc.start()
+        try:
+            creados_traza, _, _ = await importar(formato, nombre)
+            _, pico = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        resultado["ok"] = resultado["ok"] and creados == creados_traza == args.import_items
+        resultado[formato] = {
+            "creados": creados,
+            "archivo_mb": round(tamano / 1024 / 1024, 2),
+            "s": round(duracion, 3),
+            "snippets_por_s": round(creados / duracion, 1),
+            "pico_mb": round(pico / 1024 / 1024, 2),
+        }
+    return resultado
+
+
+def _rss() -> int:
+    # memoria residente actual (Linux)
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+async def _descargar(app, url: str, headers: dict) -> dict:
+    # httpx.ASGITransport junta la respuesta entera antes de devolverla: para
+    # medir la memoria de una respuesta en streaming se llama a la app ASGI
+    # directamente, cada trozo se descarta al llegar y con cada uno se mira
+    # la memoria residente (tracemalloc frenaría la exportación varias veces).
+    ruta, _, query = url.partition("?")
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": ruta, "raw_path": ruta.encode(), "query_string": query.encode(), "root_path": "",
+        "headers": [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers.items()],
+        "client": ("127.0.0.1", 0), "server": ("bench", 80),
+    }
+    base = _rss()
+    resultado = {"status": None, "bytes": 0, "primer_byte_s": None, "rss_crecimiento": 0}
+    pedido, fin = False, asyncio.Event()
+    inicio = time.perf_counter()
+
+    async def receive():
+        nonlocal pedido
+        if not pedido:
+            pedido = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await fin.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(mensaje):
+        if mensaje["type"] == "http.response.start":
+            resultado["status"] = mensaje["status"]
+        elif mensaje["type"] == "http.response.body" and mensaje.get("body"):
+            if resultado["primer_byte_s"] is None:
+                resultado["primer_byte_s"] = round(time.perf_counter() - inicio, 3)
+            resultado["bytes"] += len(mensaje["body"])
+            resultado["rss_crecimiento"] = max(resultado["rss_crecimiento"], _rss() - base)
+
+    try:
+        await app(scope, receive, send)
+    finally:
+        fin.set()
+    resultado["s"] = round(time.perf_counter() - inicio, 3)
+    return resultado
+
+_COPIAS_STMT = """
+    INSERT INTO snippet ("Snippetid", "Titulo", "Userid", "Lenguaje", descripcion, hash_contenido, tamano, tipo_contenido,
+                         nombre_archivo, lineas, vista_previa, fecha_creacion, actualiza, activo)
+    SELECT gen_random_uuid(), "Titulo" || ' ' || i, "Userid", "Lenguaje", descripcion, hash_contenido, tamano, tipo_contenido,
+           nombre_archivo, lineas, vista_previa, now() - make_interval(secs => i), now(), true
+    FROM snippet, generate_series(1, :n) AS i WHERE "Snippetid" = :Snippetid
+"""
+
+@escenario("exportacion")
+async def _exportacion(bench: Bench, args) -> dict:
+    # GET /export/me de un usuario con --export-rows snippets con contenido
+    # (copias de un mismo blob), más --export-rows/10 sin él y otras tantas
+    # publicaciones con diez comentarios cada una. Por formato: tiempo total,
+    # hasta el primer byte y crecimiento de la memoria residente, que no puede
+    # depender del número de filas.
+    import database as _database
+    import main
+
+    i = await _usuario_nuevo(bench, "exporta")
+    Snippetid = (await bench.importar(i, 1))[0]
+    async with _database.async_engine.begin() as conn:
+        parametros = {"Userid": bench.usuarios[i]["Userid"], "Snippetid": Snippetid, "n": args.export_rows}
+        await conn.execute(_sql.text(_COPIAS_STMT), parametros)
+        await conn.execute(_sql.text(
+            'UPDATE blob SET referencias = referencias + :n WHERE hash = (SELECT hash_contenido FROM snippet WHERE "Snippetid" = :Snippetid)'
+        ), parametros)
+        for stmt in _relleno_stmts():
+            await conn.execute(stmt, {**parametros, "n": args.export_rows // 10})
+
+    snippets = args.export_rows + args.export_rows // 10 + 1
+    resultado = {"ok": True, "snippets": snippets}
+    for formato in ("tar", "zip", "ndjson"):
+        descarga = await _descargar(main.app, f"/export/me?formato={formato}", bench.auth(i))
+        limite = EXPORT_MAX_RSS_GROWTH + (EXPORT_ZIP_BYTES_PER_FILE * snippets if formato == "zip" else 0)
+        resultado["ok"] = resultado["ok"] and descarga["status"] == 200 and descarga["rss_crecimiento"] < limite
+        resultado[formato] = {
+            "mb": round(descarga["bytes"] / 1024 / 1024, 1),
+            "s": descarga["s"],
+            "filas_por_s": round(snippets / descarga["s"], 1),
+            "primer_byte_s": descarga["primer_byte_s"],
+            "rss_crecimiento_mb": round(descarga["rss_crecimiento"] / 1024 / 1024, 2),
+        }
+    return resultado
+
+
+def _rutas(app):
+    from fastapi.routing import APIRoute
+    return {
+        (metodo, route.path)
+        for route in app.routes if isinstance(route, APIRoute)
+        for metodo in route.methods if metodo != "HEAD"
+    }
+
+async def _ejecutar(args) -> dict:
+    # importar después de fijar DATABASE_URL: database.py crea los motores al importarse
+    import database as _database
+    import main
+    import services.informe as _informe
+    import services.migrations as _migrations
+
+    _migrations.upgrade()
+    _informe.set_client(_ClienteFijo())
+
+    import httpx
+    semilla = {"usuarios": args.users, "snippets": args.snippets, "publicaciones": args.publications, "comentarios": args.comments}
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        bench = Bench(client, _Consultas(_database.async_engine.sync_engine), semilla)
+        print("Sembrando datos...", file=sys.stderr)
+        await bench.sembrar(_database.async_engine)
+
+        with open(BUDGETS_PATH) as f:
+            presupuestos = json.load(f)
+
+        escenarios = bench.escenarios()
+        cubiertas = {(metodo, ruta) for metodo, ruta, _ in escenarios}
+        sin_escenario = sorted(f"{m} {r}" for m, r in _rutas(main.app) - cubiertas)
+
+        resultados = []
+        for metodo, ruta, preparar in escenarios:
+            clave = f"{metodo} {ruta}"
+            resultado = await bench.medir(metodo, ruta, preparar, args.iterations)
+            resultado["budget"] = presupuestos.get(clave)
+            resultado["ok"] = resultado["budget"] is not None and resultado["queries"] <= resultado["budget"]
+            resultados.append(resultado)
+            marca = "ok " if resultado["ok"] else "MAL"
+            print(f"{marca} {clave:45} p50 {resultado['p50_ms']:8.2f} ms  p95 {resultado['p95_ms']:8.2f} ms  "
+                  f"consultas {resultado['queries']}/{resultado['budget']}", file=sys.stderr)
+
+        cargas = []
+        for nombre in args.scenario or []:
+            print(f"Escenario {nombre}...", file=sys.stderr)
+            resultado = {"scenario": nombre, **await ESCENARIOS[nombre](bench, args)}
+            cargas.append(resultado)
+            medidas = {k: v for k, v in resultado.items() if k not in ("scenario", "ok")}
+            print(f"{'ok ' if resultado['ok'] else 'MAL'} {nombre:45} {json.dumps(medidas, ensure_ascii=False)}", file=sys.stderr)
+
+    await _database.async_engine.dispose()
+    _database.engine.dispose()
+    return {
+        "commit": _commit(),
+        "fecha": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "semilla": semilla,
+        "missing_scenarios": sin_escenario,
+        "results": resultados,
+        "scenarios": cargas,
+    }
+
+def run(args) -> int:
+    nombre = _crear_base(args.admin_url)
+    url = _sql.engine.make_url(args.admin_url).set(database=nombre)
+    os.environ["DATABASE_URL"] = url.render_as_string(hide_password=False)
+    os.environ.pop("ASYNC_DATABASE_URL", None)
+    os.environ.pop("METRICS_TOKEN", None)
+    # todas las peticiones salen de un mismo cliente: los límites de admisión
+    # lo frenarían y se mediría la espera, no el endpoint
+    os.environ["ADMISSION_ENABLED"] = "false"
+    os.environ.setdefault("JWT_SECRET", "bench-secret")
+    os.environ.setdefault("ALGORITHM", "HS256")
+    os.environ["BLOB_STORAGE_PATH"] = tempfile.mkdtemp(prefix="snippethub-bench-")
+    try:
+        informe = asyncio.run(_ejecutar(args))
+    finally:
+        if not args.keep:
+            _borrar_base(args.admin_url, nombre)
+
+    salida = args.output or os.path.join(BENCH_DIR, "results", f"{informe['commit'][:12]}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(salida)), exist_ok=True)
+    with open(salida, "w") as f:
+        json.dump(informe, f, indent=2, ensure_ascii=False)
+    print(f"Resultados en {salida}", file=sys.stderr)
+
+    fallos = [f"{r['method']} {r['route']}" for r in informe["results"] if not r["ok"]]
+    fallos_carga = [r["scenario"] for r in informe["scenarios"] if not r["ok"]]
+    for ruta in informe["missing_scenarios"]:
+        print(f"Ruta sin escenario: {ruta}", file=sys.stderr)
+    for ruta in fallos:
+        print(f"Presupuesto de consultas superado: {ruta}", file=sys.stderr)
+    for nombre in fallos_carga:
+        print(f"Escenario fallido: {nombre}", file=sys.stderr)
+    return 1 if fallos or fallos_carga or informe["missing_scenarios"] else 0
+
+def compare(anterior: str, actual: str, max_slowdown: float) -> int:
+    # Compara dos archivos de resultados: falla si sube el número de consultas
+    # de alguna ruta o si su p50 empeora más de max_slowdown veces.
+    with open(anterior) as f:
+        antes = {(r["method"], r["route"]): r for r in json.load(f)["results"]}
+    with open(actual) as f:
+        despues = {(r["method"], r["route"]): r for r in json.load(f)["results"]}
+    regresiones = 0
+    for clave in sorted(despues):
+        nuevo = despues[clave]
+        viejo = antes.get(clave)
+        if viejo is None:
+            print(f"    {clave[0]} {clave[1]:45} nueva")
+            continue
+        factor = nuevo["p50_ms"] / viejo["p50_ms"] if viejo["p50_ms"] else 1.0
+        peor = nuevo["queries"] > viejo["queries"] or factor > max_slowdown
+        regresiones += peor
+        print(f"{'MAL' if peor else 'ok '} {clave[0]} {clave[1]:45} p50 {viejo['p50_ms']:8.2f} -> {nuevo['p50_ms']:8.2f} ms "
+              f"(x{factor:.2f})  consultas {viejo['queries']} -> {nuevo['queries']}")
+    return 1 if regresiones else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark por endpoint con presupuesto de consultas")
+    parser.add_argument("--admin-url", default=os.getenv("BENCH_ADMIN_URL", "postgresql://postgres@localhost/postgres"),
+                        help="Postgres donde crear (y borrar) la base desechable")
+    parser.add_argument("--output", help="Archivo de resultados (por defecto bench/results/<commit>.json)")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--users", type=int, default=3)
+    parser.add_argument("--snippets", type=int, default=200, help="Snippets por usuario")
+    parser.add_argument("--publications", type=int, default=20, help="Publicaciones por usuario")
+    parser.add_argument("--comments", type=int, default=3, help="Comentarios por publicación")
+    parser.add_argument("--keep", action="store_true", help="No borrar la base de datos al terminar")
+    parser.add_argument("--scenario", action="append", choices=sorted(ESCENARIOS),
+                        help="Escenario de carga a ejecutar tras las rutas (se puede repetir)")
+    parser.add_argument("--scale-publications", type=int, default=20,
+                        help="publicaciones_escala: N (se compara con 10·N)")
+    parser.add_argument("--concurrency", type=int, default=16, help="Clientes simultáneos de los escenarios de carga")
+    parser.add_argument("--requests", type=int, default=50, help="carga_mixta: peticiones por cliente")
+    parser.add_argument("--logins", type=int, default=64, help="tormenta_login: logins simultáneos")
+    parser.add_argument("--oversize", type=int, default=10, help="subidas_grandes: tamaño de las subidas rechazadas, en veces MAX_UPLOAD_SIZE")
+    parser.add_argument("--corpus", type=int, default=1_000_000, help="busqueda_corpus: snippets sintéticos")
+    parser.add_argument("--index-rows", type=int, default=200_000, help="indices: comentarios de relleno")
+    parser.add_argument("--import-items", type=int, default=5000, help="importacion: archivos por archivo comprimido")
+    parser.add_argument("--export-rows", type=int, default=100_000, help="exportacion: snippets con contenido del usuario")
+    parser.add_argument("--compare", nargs=2, metavar=("ANTERIOR", "ACTUAL"))
+    parser.add_argument("--max-slowdown", type=float, default=1.5)
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(compare(*args.compare, args.max_slowdown))
+    sys.exit(run(args))
@@ -0,0 +1,121 @@
+import argparse
+import datetime as _dt
+import json
+import os
+import statistics
+import sys
+import time
+import uuid as _uuid
+
+# Microbenchmark de serialización de listados grandes: compara el camino por
+# defecto de FastAPI (response_model: dict, nueva validación, jsonable y
+# json.dumps) con services.responses (una validación y dump_json de
+# pydantic-core). No necesita base de datos: las filas son objetos ORM sin
+# sesión, como los que devuelve la paginación.
+#   python -m bench.serialization --items 200 --repeat 50
+
+# database.py crea los motores al importarse; no se conecta hasta la primera consulta
+os.environ.setdefault("DATABASE_URL", "postgresql://bench@localhost/bench")
+os.environ.setdefault("JWT_SECRET", "bench-secret")
+os.environ.setdefault("ALGORITHM", "HS256")
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+import models as _models
+import schemas.Comentario as _comentario
+import schemas.Page as _page
+import schemas.Publicacion as _publicacion
+import schemas.Snippet as _snippet
+import services.responses as _responses
+import services.storage as _storage
+
+CODIGO = "def funcion(x):\n    return [i * x for i in range(10)]  # comentario\n"
+
+
+def _snippets(n: int, tamano: int):
+    ahora = _dt.datetime.utcnow()
+    contenido = (CODIGO * (tamano // len(CODIGO) + 1))[:tamano]
+    return [
+        _models.Snippet(
+            Snippetid=_uuid.uuid4(), Titulo=f"Snippet {i}", Userid=_uuid.uuid4(), descripcion="Descripción del snippet",
+            Lenguaje="Python", fecha_creacion=ahora, actualiza=ahora, activo=True, nombre_archivo=f"snippet_{i}.py",
+            tipo_contenido="text/x-python", hash_contenido="ab" * 32, **_storage.resumir(contenido.encode()).columnas(),
+        )
+        for i in range(n)
+    ]
+
+def _comentarios(n: int):
+    ahora = _dt.datetime.utcnow()
+    return [
+        _models.Comentario(
+            ComentarioId=_uuid.uuid4(), contenido=f"Comentario {i}", Userid=_uuid.uuid4(), Publicacionid=_uuid.uuid4(),
+            fecha_creacion=ahora, actualiza=ahora, activo=True,
+        )
+        for i in range(n)
+    ]
+
+def _publicaciones(n: int):
+    return [
+        {
+            "id": _uuid.uuid4(), "titulo": f"Publicación {i}", "contenido": "Contenido de la publicación",
+            "archivo_url": f"/snippets/{_uuid.uuid4()}/raw", "archivo_hash": "ab" * 32, "archivo_tamano": 2048,
+        }
+        for i in range(n)
+    ]
+
+
+def _completar(corutina):
+    # serialize_response es async pero, para rutas async def, no llega a suspenderse
+    try:
+        corutina.send(None)
+    except StopIteration as fin:
+        return fin.value
+    raise RuntimeError("serialize_response se suspendió")
+
+def _fastapi(tipo, contenido, **opciones):
+    campo = create_model_field(name="Response", type_=tipo, mode="serialization")
+    def serializar():
+        return JSONResponse(_completar(serialize_response(field=campo, response_content=contenido, **opciones))).body
+    return serializar
+
+def _rapido(tipo, contenido, **opciones):
+    def serializar():
+        return _responses.json_response(tipo, contenido, **opciones).body
+    return serializar
+
+def _medir(funcion, repeticiones: int):
+    funcion()  # calentamiento: esquemas y adaptadores
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return statistics.median(tiempos)
+
+
+def run(args) -> int:
+    casos = [
+        ("Page[SnippetResumen]", _page.Page[_snippet.SnippetResumen], {"items": _snippets(args.items, args.size), "next_cursor": "x"}, {}),
+        ("Page[Comentario]", _page.Page[_comentario.Comentario], {"items": _comentarios(args.items), "next_cursor": "x"}, {}),
+        ("Page[PublicacionItem]", _page.Page[_publicacion.PublicacionItem], {"items": _publicaciones(args.items), "next_cursor": "x"}, {"exclude_unset": True}),
+    ]
+    print(f"{args.items} elementos por página, mediana de {args.repeat} repeticiones")
+    print(f"{'respuesta':<24}{'fastapi':>12}{'dump_json':>12}{'mejora':>9}")
+    for nombre, tipo, contenido, opciones in casos:
+        fastapi, rapido = _fastapi(tipo, contenido, **opciones), _rapido(tipo, contenido, **opciones)
+        # los dos caminos tienen que producir el mismo documento
+        if json.loads(fastapi()) != json.loads(rapido()):
+            print(f"{nombre}: las respuestas no coinciden", file=sys.stderr)
+            return 1
+        t_fastapi, t_rapido = _medir(fastapi, args.repeat), _medir(rapido, args.repeat)
+        print(f"{nombre:<24}{t_fastapi * 1000:>9.2f} ms{t_rapido * 1000:>9.2f} ms{t_fastapi / t_rapido:>8.1f}x")
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Microbenchmark de serialización de listados")
+    parser.add_argument("--items", type=int, default=200, help="elementos por página (MAX_LIMIT)")
+    parser.add_argument("--size", type=int, default=2048, help="bytes de contenido por snippet")
+    parser.add_argument("--repeat", type=int, default=50)
+    sys.exit(run(parser.parse_args()))
@@ -1,15 +1,79 @@
 import sqlalchemy as _sql 
 import sqlalchemy.ext.declarative as _declarative
+import sqlalchemy.ext.asyncio as _asyncio
 import sqlalchemy.orm as _orm
+import sqlalchemy.pool as _pool
 import os
+import time
 from dotenv import load_dotenv
 
+import services.metrics as _metrics
+
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-engine = _sql.create_engine(DATABASE_URL)
+# La API usa el motor asíncrono (asyncpg); el motor síncrono queda para
+# create_all y los comandos de mantenimiento que corren fuera del event loop.
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or _sql.engine.make_url(DATABASE_URL).set(drivername="postgresql+asyncpg")
+
+# Pool por proceso: con N workers el máximo de conexiones es
+# N * (DB_POOL_SIZE + DB_MAX_OVERFLOW) y debe caber en max_connections.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+# segundos esperando una conexión libre antes de fallar
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# reabrir conexiones más viejas que esto (evita las que cortan balanceadores/failover)
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+# statement_timeout de Postgres para la API (0 = sin límite). No se aplica al
+# motor síncrono: migraciones y reindexados pueden tardar más.
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))
+
+
+def _timed_pool(base, nombre: str):
+    # Mide cuánto espera cada checkout hasta obtener conexión (incluida la
+    # apertura de una nueva) y cuenta los que agotan DB_POOL_TIMEOUT.
+    class TimedPool(base):
+        def _do_get(self):
+            inicio = time.perf_counter()
+            try:
+                conexion = super()._do_get()
+            except _sql.exc.TimeoutError:
+                _metrics.observe_pool_wait(nombre, time.perf_counter() - inicio, timeout=True)
+                raise
+            _metrics.observe_pool_wait(nombre, time.perf_counter() - inicio)
+            return conexion
+
+    TimedPool.__name__ = f"Timed{base.__name__}"
+    return TimedPool
+
+_POOL_OPTIONS = dict(
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=DB_POOL_PRE_PING,
+)
+
+engine = _sql.create_engine(DATABASE_URL, poolclass=_timed_pool(_pool.QueuePool, "sync"), **_POOL_OPTIONS)
 
 SessionLocal = _orm.sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-Base = _declarative.declarative_base()
\ No newline at end of file
+_async_connect_args = {}
+if DB_STATEMENT_TIMEOUT_MS > 0:
+    _async_connect_args["server_settings"] = {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}
+
+async_engine = _asyncio.create_async_engine(
+    ASYNC_DATABASE_URL,
+    poolclass=_timed_pool(_pool.AsyncAdaptedQueuePool, "async"),
+    connect_args=_async_connect_args,
+    **_POOL_OPTIONS,
+)
+
+AsyncSessionLocal = _asyncio.async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+_metrics.register_engine("async", async_engine.sync_engine)
+_metrics.register_engine("sync", engine)
+
+Base = _declarative.declarative_base()
@@ -1,27 +1,63 @@
-from typing import List, Optional
+from typing import Dict, List, Literal, Optional, Union
 
-from fastapi import FastAPI, Depends, Form, HTTPException, File, UploadFile
+from fastapi import FastAPI, Depends, Form, HTTPException, File, UploadFile, Query, Request, Response
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
 
-import sqlalchemy.orm as _orm
+import sqlalchemy.ext.asyncio as _asyncio
 from datetime import timedelta
 
 import schemas.user as _user
 import schemas.Snippet as _snippet
 import schemas.Comentario as _comentario
+import schemas.Page as _page
+import schemas.Publicacion as _publicacion
+import schemas.Busqueda as _busqueda
+import schemas.Informe as _informe
+import schemas.Mensaje as _mensaje
 
 import services.user as _userServices
 import services.database as _databaseServices
 import services.snippet as _snippetServices
 import services.publication as _publicationServices
 import services.comments as _commentsServices
+import services.pagination as _pagination
 
 import services.informe as _informeServices
+import services.auth_cache as _authCacheServices
+import services.uploads as _uploadsServices
+import services.http_cache as _httpCache
+import services.search as _searchServices
+import services.stats as _statsServices
+import services.leaderboard as _leaderboardServices
+import services.importer as _importerServices
+import services.export as _exportServices
+import services.metrics as _metricsServices
+import services.compression as _compressionServices
+import services.admission as _admissionServices
+import services.responses as _responses
 
 app = FastAPI()
 
+app.add_middleware(
+    _uploadsServices.UploadLimitMiddleware,
+    path_limits={"/import/snippets": _importerServices.IMPORT_MAX_SIZE},
+)
 
+# dentro de CORS para que los 429/503 lleven sus cabeceras; fuera del límite
+# de subida para rechazar antes de leer el cuerpo
+app.add_middleware(
+    _admissionServices.AdmissionMiddleware,
+    route_classes={
+        ("POST", "/token"): _admissionServices.AUTH_CLASS,
+        ("POST", "/users"): _admissionServices.AUTH_CLASS,
+        ("GET", "/admin/informe"): _admissionServices.INFORME_CLASS,
+        ("POST", "/admin/informe/jobs"): _admissionServices.INFORME_CLASS,
+        ("POST", "/create/snippets"): _admissionServices.UPLOAD_CLASS,
+        ("PUT", "/snippets/{snippet_id}"): _admissionServices.UPLOAD_CLASS,
+        ("POST", "/import/snippets"): _admissionServices.UPLOAD_CLASS,
+    },
+)
 
 app.add_middleware(
     CORSMiddleware,
@@ -31,36 +67,52 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(_compressionServices.CompressionMiddleware)
+
+# la más externa: mide también lo que rechazan los demás middlewares
+app.add_middleware(_metricsServices.MetricsMiddleware)
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics(request: Request):
+    if not _metricsServices.authorized(request.headers.get("authorization")):
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return Response(_metricsServices.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/users/me", response_model=_user.User)
 async def get_user(user: _user.User = Depends(_userServices.get_current_user)):
-    return user
+    return _responses.json_response(_user.User, user)
 
 
 @app.get("/users/{username}", response_model=_user.User)
 async def get_user_by_id(
-    username: str, db: _orm.Session = Depends(_databaseServices.get_db)
+    username: str, request: Request, response: Response, db: _asyncio.AsyncSession = Depends(_databaseServices.get_db)
 ):
+    version, last_modified = await _userServices.get_user_version(username, db)
+    cached = _httpCache.conditional(request, response, version, last_modified, _httpCache.PUBLIC)
+    if cached:
+        return cached
+
     user = await _userServices.get_user_by_username(username=username, db = db)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    return user
+    return _responses.json_response(_user.User, user, response)
 
-@app.post("/token")
-async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: _orm.Session = Depends(_databaseServices.get_db),):
+@app.post("/token", response_model=_user.Token)
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: _asyncio.AsyncSession = Depends(_databaseServices.get_db),):
     user = await _userServices.authenticate_user(form_data.username, form_data.password, db)
 
     access_token_expires = timedelta(minutes=30)
     access_token_jwt = _userServices.create_token({"sub": user.username, "id": str(user.Userid), "role": str(user.role)}, access_token_expires)
 
-    return {
+    return _responses.json_response(_user.Token, {
         "access_token": access_token_jwt,
         "token_type": "bearer"
-    }
+    })
 
 
-@app.post("/users")
+@app.post("/users", response_model=_user.User)
 async def create_user(
-    user: _user.UserCreate, db: _orm.Session = Depends(_databaseServices.get_db)
+    user: _user.UserCreate, db: _asyncio.AsyncSession = Depends(_databaseServices.get_db)
 ):
     db_user = await _userServices.get_user_by_username(user.email, db)
     if db_user:
@@ -68,36 +120,106 @@ async def create_user(
 
     user = await _userServices.create_user(user, db)
 
-    return user
+    return _responses.json_response(_user.User, user)
 
-@app.get("/top_users")
+@app.get("/top_users", response_model=List[_user.UsuarioTop])
 async def top_users(
-    db: _orm.Session = Depends(_databaseServices.get_db),
+    ventana: Literal["all", "30d", "7d"] = "all",
+    k: int = Query(5, ge=1, le=_leaderboardServices.LEADERBOARD_MAX_K),
+    db: _asyncio.AsyncSession = Depends(_databaseServices.get_db),
     user: _user.User = Depends(_userServices.get_current_user)
 ):
-    top = await _userServices.top_five_users(db=db, user=user)
-
-    return top
+    """
+    Users with the most publications in the window. The ranking is served
+    from a snapshot refreshed in the background every LEADERBOARD_TTL
+    seconds (30 by default), so it can lag recent publications by that long.
+    """
+    top = await _userServices.top_five_users(db=db, user=user, ventana=ventana, k=k)
+
+    return _responses.json_response(List[_user.UsuarioTop], top)
     
 
+@app.get("/search", tags=["search"], response_model=_page.Page[Union[_busqueda.ResultadoSnippet, _busqueda.ResultadoPublicacion]])
+async def search(
+    q: str = Query(..., min_length=1),
+    tipo: Literal["snippet", "publicacion"] = "snippet",
+    lenguaje: Optional[str] = None,
+    autor: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(_pagination.DEFAULT_LIMIT, ge=1, le=_pagination.MAX_LIMIT),
+    user: _user.User = Depends(_userServices.get_current_user),
+    db: _asyncio.AsyncSession = Depends(_databaseServices.get_db)
+):
+    resultados = await _searchServices.search(db, q, tipo=tipo, lenguaje=lenguaje, autor=autor, cursor=cursor, limit=limit)
+    item = _busqueda.ResultadoSnippet if tipo == "snippet" else _busqueda.ResultadoPublicacion
+    return _responses.json_response(_page.Page[item], resultados)
+
+
+@app.get("/search/code", tags=["search"], response_model=_page.Page[_busqueda.CoincidenciaCodigo])
+async def search_code(
+    q: str = Query(..., min_length=1),
+    modo: Literal["substring", "regex"] = "substring",
+    ignore_case: bool = False,
+    lenguaje: Optional[str] = None,
+    autor: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(_pagination.DEFAULT_LIMIT, ge=1, le=_pagination.MAX_LIMIT),
+    user: _user.User = Depends(_userServices.get_current_user),
+    db: _asyncio.AsyncSession = Depends(_databaseServices.get_db)
+):
+    resultados = await _searchServices.search_code(db, q, modo=modo, ignore_case=ignore_case, lenguaje=lenguaje, autor=autor, cursor=cursor, limit=limit)
+    return _responses.json_response(_page.Page[_busqueda.CoincidenciaCodigo], resultados)
+
+
 # CRUD ENDPOINTS - Snippets
-@app.post("/create/snippets", tags=["snippets"])
-def create_snippet(
+@app.post("/create/snippets", tags=["snippets"], response_model=_snippet.SnippetInfo)
+async def create_snippet(
     Titulo: str = Form(...),
     Lenguaje: str = Form(...),
     descripcion: str = Form(...),
     user: _user.User = Depends(_userServices.get_current_user),
     file: UploadFile = File(...), 
-    db: _orm.Session = Depends(_databaseServices.get_db)
+    db: _asyncio.AsyncSession = Depends(_databaseServices.get_db)
+):
+    snippet = await _snippetServices.create_snippet(Titulo=Titulo, Lenguaje=Lenguaje, descripcion=descripcion, user=user, db=db, file=file)
+    return _responses.json_response(_snippet.SnippetInfo, snippet)
+
+@app.post("/import/snippets", tags=["snippets"], response_model=_snippet.Importacion, response_model_exclude_unset=True)
+async def import_snippets(
+    files: List[UploadFile] = File(...),
+    user: _user.User = Depends(_userServices.get_current_user),
+    db: _asyncio.AsyncSession = Depends(_databaseServices.get_db)
+):
+    # Archivos sueltos o un .zip/.tar(.gz); Titulo y Lenguaje se deducen del nombre
+    importacion = await _importerServices.import_snippets(user=user, files=files, db=db)
+    return _responses.json_response(_snippet.Importacion, importacion, exclude_unset=True)
+
+@app.get("/export/me", tags=["snippets"])
+async def export_me(
+    formato: Literal["tar", "zip", "ndjson"] = "tar",
+    user: _user.User = Depends(_userServices.get_current_user),
+):
+    # Snippets, publicaciones y comentarios del usuario, enviados en streaming
+    return _exportServices.export_user(user, formato)
+
+@app.get("/snippets/me",tags=["snippets"], response_model=_page.Page[_snippet.SnippetResumen])
+async def get_snippets(
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(_pagination.DEFAULT_LIMIT, ge=1, le=_pagination.MAX_LIMIT),
+    user: _user.User = Depends(_userServices.get_current_user),
+    db: _asyncio.AsyncSession = Depends(_databaseServices.get_db)
 ):
-    return  _snippetServices.create_snippet(Titulo=Titulo, Lenguaje=Lenguaje, descripcion=descripcion, user=user, db=db, file=file)
+    version, last_modified = await _snippetServices.get_snippets_version(user.Userid, db)
+    cached = _httpCache.conditional(request, response, version, last_modified, _httpCache.PRIVATE)
+    if cached:
+        return cached
 
-@app.get("/snippets/me",tags=["snippets"], response_model=List[_snippet.Snippet])
-async def get_snippets(user: _user.User = Depends(_userServices.get_current_user), db: _orm.Session = Depends(_databaseServices.get_db)):
-    snippets = await _snippetServices.get_snippets_by_user(user=user, db=db)
-    return snippets
+    snippets = await _snippetServices.get_snippets_by_user(user=user, db=db, cursor=cursor, limit=limit)
+    return _responses.json_response(_page.Page[_snippet.SnippetResumen], snippets, response)
 
-@app.put("/snippets/{snippet_id}", tags=["snippets"])
+@app.put("/snippets/{snippet_id}", tags=["snippets"], response_model=_snippet.SnippetInfo)
 async def update_snippet(
     snippet_id: str,
     Titulo: Optional[str] = Form(None),
@@ -105,134 +227,228 @@ async def update_snippet(
     descripcion: Optional[str] = Form(None),
     file: Optional[UploadFile] = File(None),
     user: _user.User = Depends(_userServices.get_current_user),
-    db: _orm.Session = Depends(_databaseServices.get_db)
+    db: _asyncio.AsyncSession = Depends(_databaseServices.get_db)
 ):
-    snippet = await _snippetServices.update_snippet(snippet_id, Titulo, Lenguaje,descripcion, file, user, db=db)
-    return snippet
+    snippet = await _snippetServices.update_snippet(snippet_id, Titulo=Titulo, Lenguaje=Lenguaje, descripcion=descripcion, file=file, user=user, db=db)
+    return _responses.json_response(_snippet.SnippetInfo, snippet)
 
-@app.get("/snippets/{username}", tags=["snippets"])
+@app.get("/snippets/{username}", tags=["snippets"], response_model=_page.Page[_snippet.SnippetResumen])
 async def get_snippets_by_user(
     username: str,
-    db: _orm.Session = Depends(_databaseServices.get_db),
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(_pagination.DEFAULT_LIMIT, ge=1, le=_pagination.MAX_LIMIT),
+    db: _asyncio.AsyncSession = Depends(_databaseServices.get_db),
     user: _user.User = Depends(_userServices.get_current_user),
 ):
-    snippets = await _snippetServices.get_snippets_by_username(username=username, db=db, user=user)
-    if not snippets:
+    version, last_modified = await _snippetServices.get_snippets_version_by_username(username, db)
+    cached = _httpCache.conditional(request, response, version, last_modified, _httpCache.PRIVATE)
+    if cached:
+        return cached
+
+    snippets = await _snippetServices.get_snippets_by_username(username=username, db=db, user=user, cursor=cursor, limit=limit)
+    if not snippets["items"] and cursor is None:
         raise HTTPException(status_code=404, detail="Snippets not found")
-    return snippets
+    return _responses.json_response(_page.Page[_snippet.SnippetResumen], snippets, response)
 
 
-@app.delete("/snippets/{snippet_id}", tags=["snippets"])
+@app.get("/snippets/{snippet_id}/raw", tags=["snippets"])
+async def get_snippet_raw(
+    snippet_id: str,
+    request: Request,
+    user: _user.User = Depends(_userServices.get_current_user),
+    db: _asyncio.AsyncSession = Depends(_databaseServices.get_db)
+):
+    return await _snippetServices.get_snippet_raw(snippet_id, request, db=db)
+
+
+@app.delete("/snippets/{snippet_id}", tags=["snippets"], response_model=_mensaje.Mensaje)
 async def delete_snippet(
     snippet_id: str,
     user: _user.User = Depends(_userServices.get_current_user),
-    db: _orm.Session = Depends(_databaseServices.get_db)
+    db: _asyncio.AsyncSession = Depends(_databaseServices.get_db)
 ):
-    snippet = await _snippetServices.delete_snippet(snippet_id, user, db=db)
-    return snippet
+    resultado = await _snippetServices.delete_snippet(snippet_id, user, db=db)
+    return _responses.json_response(_mensaje.Mensaje, resultado)
 
 
 # CRUD ENDPOINTS - Publicaciones
-@app.post("/publicaciones", tags=["publicaciones"])
+@app.post("/publicaciones", tags=["publicaciones"], response_model=_publicacion.Publicacion)
 async def create_publicacion(
     Titulo: str = Form(...),
     Contenido: str = Form(...),
     SnippetId: str = Form(...),
     user: _user.User = Depends(_userServices.get_current_user),
-    db: _orm.Session = Depends(_databaseServices.get_db)
+    db: _asyncio.AsyncSession = Depends(_databaseServices.get_db)
 ):
-    return await _publicationServices.create_publicacion(Titulo=Titulo, Contenido=Contenido, SnippetId=SnippetId, user=user, db=db)
+    publicacion = await _publicationServices.create_publicacion(Titulo=Titulo, Contenido=Contenido, SnippetId=SnippetId, user=user, db=db)
+    return _responses.json_response(_publicacion.Publicacion, publicacion)
 
-@app.get("/publicaciones/me", tags=["publicaciones"])
+@app.get("/publicaciones/me", tags=["publicaciones"], response_model=_page.Page[_publicacion.PublicacionItem], response_model_exclude_unset=True)
 async def get_publicaciones(
+    cursor: Optional[str] = None,
+    limit: int = Query(_pagination.DEFAULT_LIMIT, ge=1, le=_pagination.MAX_LIMIT),
+    inline: bool = True,
     user: _user.User = Depends(_userServices.get_current_user),
-    db: _orm.Session = Depends(_databaseServices.get_db)
+    db: _asyncio.AsyncSession = Depends(_databaseServices.get_db)
 ):
-    return await _publicationServices.get_publicaciones_by_user(user, db)
+    publicaciones = await _publicationServices.get_publicaciones_by_user(user, db, cursor=cursor, limit=limit, inline=inline)
+    return _responses.json_response(_page.Page[_publicacion.PublicacionItem], publicaciones, exclude_unset=True)
 
-@app.get("/publicaciones/{publicacion_id}", tags=["publicaciones"])
+@app.get("/publicaciones/{publicacion_id}", tags=["publicaciones"], response_model=_publicacion.PublicacionItem, response_model_exclude_unset=True)
 async def get_publicacion_by_id(
     publicacion_id: str,
-    db: _orm.Session = Depends(_databaseServices.get_db)
+    request: Request,
+    response: Response,
+    inline: bool = True,
+    db: _asyncio.AsyncSession = Depends(_databaseServices.get_db)
 ):
-    return await _publicationServices.get_publicacion_by_id(publicacion_id, db)
+    version, last_modified = await _publicationServices.get_publicacion_version(publicacion_id, db)
+    cached = _httpCache.conditional(request, response, version, last_modified, _httpCache.PUBLIC)
+    if cached:
+        return cached
+
+    publicacion = await _publicationServices.get_publicacion_by_id(publicacion_id, db, inline=inline)
+    return _responses.json_response(_publicacion.PublicacionItem, publicacion, response, exclude_unset=True)
 
-@app.get("/publications/user/{username}", tags=["publicaciones"])
+@app.get("/publications/user/{username}", tags=["publicaciones"], response_model=_page.Page[_publicacion.PublicacionItem], response_model_exclude_unset=True)
 async def get_publicaciones(
     username: str,
-    db: _orm.Session = Depends(_databaseServices.get_db),
+    cursor: Optional[str] = None,
+    limit: int = Query(_pagination.DEFAULT_LIMIT, ge=1, le=_pagination.MAX_LIMIT),
+    inline: bool = True,
+    db: _asyncio.AsyncSession = Depends(_databaseServices.get_db),
     user: _user.User = Depends(_userServices.get_current_user),
 ):
-    return await _publicationServices.get_publication_by_user(username=username, db=db, user=user)
+    publicaciones = await _publicationServices.get_publication_by_user(username=username, db=db, user=user, cursor=cursor, limit=limit, inline=inline)
+    return _responses.json_response(_page.Page[_publicacion.PublicacionItem], publicaciones, exclude_unset=True)
 
-@app.put("/publicaciones/{publicacion_id}", tags=["publicaciones"])
+@app.put("/publicaciones/{publicacion_id}", tags=["publicaciones"], response_model=_publicacion.Publicacion)
 async def update_publicacion(
     publicacion_id: str,
     Titulo: Optional[str] = Form(None),
     Contenido: Optional[str] = Form(None),
     SnippetId: Optional[str] = Form(None),
     user: _user.User = Depends(_userServices.get_current_user),
-    db: _orm.Session = Depends(_databaseServices.get_db)
+    db: _asyncio.AsyncSession = Depends(_databaseServices.get_db)
 ):
-    return await _publicationServices.update_publicacion(Publicacionid=publicacion_id, Titulo=Titulo, Contenido=Contenido, Snippetid=SnippetId, user=user, db=db)
+    publicacion = await _publicationServices.update_publicacion(Publicacionid=publicacion_id, Titulo=Titulo, Contenido=Contenido, Snippetid=SnippetId, user=user, db=db)
+    return _responses.json_response(_publicacion.Publicacion, publicacion)
 
-@app.delete("/publicaciones/{publicacion_id}", tags=["publicaciones"])
+@app.delete("/publicaciones/{publicacion_id}", tags=["publicaciones"], response_model=_mensaje.Mensaje)
 async def delete_publicacion(
     publicacion_id: str,
     user: _user.User = Depends(_userServices.get_current_user),
-    db: _orm.Session = Depends(_databaseServices.get_db)
+    db: _asyncio.AsyncSession = Depends(_databaseServices.get_db)
 ):
-    return await _publicationServices.delete_publicacion(Publicacionid=publicacion_id, user=user, db=db)
+    resultado = await _publicationServices.delete_publicacion(Publicacionid=publicacion_id, user=user, db=db)
+    return _responses.json_response(_mensaje.Mensaje, resultado)
 
 # CRUD ENDPOINTS - Comentarios
-@app.post("/create/comentario", tags=["comments"])
+@app.post("/create/comentario", tags=["comments"], response_model=_comentario.Comentario)
 async def create_comment(
     comentario: str = Form(...),
     Publicacionid: str = Form(...),
     user: _user.User = Depends(_userServices.get_current_user),
-    db: _orm.Session = Depends(_databaseServices.get_db)
+    db: _asyncio.AsyncSession = Depends(_databaseServices.get_db)
 ):
-    return await _commentsServices.create_comment(Publicacionid=Publicacionid, comment=comentario, user=user, db=db)
+    comentario = await _commentsServices.create_comment(Publicacionid=Publicacionid, comment=comentario, user=user, db=db)
+    return _responses.json_response(_comentario.Comentario, comentario)
 
-@app.get("/comentarios/user/me", tags=["comments"])
+@app.get("/comentarios/user/me", tags=["comments"], response_model=_page.Page[_comentario.Comentario])
 async def get_comments_me(
+    cursor: Optional[str] = None,
+    limit: int = Query(_pagination.DEFAULT_LIMIT, ge=1, le=_pagination.MAX_LIMIT),
     user: _user.User = Depends(_userServices.get_current_user),
-    db: _orm.Session = Depends(_databaseServices.get_db)
+    db: _asyncio.AsyncSession = Depends(_databaseServices.get_db)
 ):
-    return await _commentsServices.get_comments_by_me(user, db)
+    comentarios = await _commentsServices.get_comments_by_me(user, db, cursor=cursor, limit=limit)
+    return _responses.json_response(_page.Page[_comentario.Comentario], comentarios)
 
-@app.get("/comentarios/user/{Userid}", tags=["comments"])
+@app.get("/comentarios/user/{Userid}", tags=["comments"], response_model=_page.Page[_comentario.Comentario])
 async def get_comments_user(
     Userid: str,
-    db: _orm.Session = Depends(_databaseServices.get_db)
+    cursor: Optional[str] = None,
+    limit: int = Query(_pagination.DEFAULT_LIMIT, ge=1, le=_pagination.MAX_LIMIT),
+    db: _asyncio.AsyncSession = Depends(_databaseServices.get_db)
 ):
-    return await _commentsServices.get_comments_by_user(Userid=Userid, db=db)
+    comentarios = await _commentsServices.get_comments_by_user(Userid=Userid, db=db, cursor=cursor, limit=limit)
+    return _responses.json_response(_page.Page[_comentario.Comentario], comentarios)
 
-@app.get("/comentarios/{Publicacionid}", tags=["comments"])
-def get_comments_public(
+@app.get("/comentarios/{Publicacionid}", tags=["comments"], response_model=_page.Page[_comentario.ComentarioPublico])
+async def get_comments_public(
     Publicacionid: str,
-    db: _orm.Session = Depends(_databaseServices.get_db)
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(_pagination.DEFAULT_LIMIT, ge=1, le=_pagination.MAX_LIMIT),
+    db: _asyncio.AsyncSession = Depends(_databaseServices.get_db)
 ):
-    return _commentsServices.get_comments_by_publicacion(Publicacionid=Publicacionid, db=db)
+    version, last_modified = await _commentsServices.get_comments_version(Publicacionid, db)
+    cached = _httpCache.conditional(request, response, version, last_modified, _httpCache.PUBLIC)
+    if cached:
+        return cached
 
-@app.put("/comentarios/{ComentarioId}", tags=["comments"])
-def update_comment(
+    comentarios = await _commentsServices.get_comments_by_publicacion(Publicacionid=Publicacionid, db=db, cursor=cursor, limit=limit)
+    return _responses.json_response(_page.Page[_comentario.ComentarioPublico], comentarios, response)
+
+@app.put("/comentarios/{ComentarioId}", tags=["comments"], response_model=_comentario.Comentario)
+async def update_comment(
     ComentarioId: str,
     Contenido: Optional[str] = Form(None),
     user: _user.User = Depends(_userServices.get_current_user),
-    db: _orm.Session = Depends(_databaseServices.get_db)
+    db: _asyncio.AsyncSession = Depends(_databaseServices.get_db)
 ):
-    return  _commentsServices.update_comment(ComentarioId=ComentarioId, Contenido=Contenido, user=user, db=db)
+    comentario = await _commentsServices.update_comment(ComentarioId=ComentarioId, Contenido=Contenido, user=user, db=db)
+    return _responses.json_response(_comentario.Comentario, comentario)
 
-@app.delete("/comentarios/{ComentarioId}", tags=["comments"])
-def delete_comment(
+@app.delete("/comentarios/{ComentarioId}", tags=["comments"], response_model=_mensaje.Mensaje)
+async def delete_comment(
     ComentarioId: str,
     user: _user.User = Depends(_userServices.get_current_user),
-    db: _orm.Session = Depends(_databaseServices.get_db)
+    db: _asyncio.AsyncSession = Depends(_databaseServices.get_db)
 ):
-    return _commentsServices.delete_comment(ComentarioId=ComentarioId, user=user, db=db)
-
-@app.get("/admin/informe")
-def obtener_informe(user: _user.User = Depends(_userServices.get_current_user), db: _orm.Session = Depends(_databaseServices.get_db)):
-    informe = _informeServices.generar_informe(user=user, db=db)
-    return informe
\ No newline at end of file
+    resultado = await _commentsServices.delete_comment(ComentarioId=ComentarioId, user=user, db=db)
+    return _responses.json_response(_mensaje.Mensaje, resultado)
+
+@app.get("/admin/informe", response_model=_informe.Informe)
+async def obtener_informe(user: _user.User = Depends(_userServices.get_current_user), db: _asyncio.AsyncSession = Depends(_databaseServices.get_db)):
+    if not user.is_admin():
+        raise HTTPException(status_code=403, detail="You do not have permission to view this resource")
+    informe = await _informeServices.generar_informe(user=user, db=db)
+    return _responses.json_response(_informe.Informe, informe)
+
+@app.post("/admin/informe/jobs", status_code=202, response_model=_informe.InformeJob)
+async def enviar_informe(user: _user.User = Depends(_userServices.get_current_user), db: _asyncio.AsyncSession = Depends(_databaseServices.get_db)):
+    if not user.is_admin():
+        raise HTTPException(status_code=403, detail="You do not have permission to view this resource")
+    job = await _informeServices.enviar_informe(user=user, db=db)
+    return _responses.json_response(_informe.InformeJob, job, status_code=202)
+
+@app.get("/admin/informe/jobs/{job_id}", response_model=_informe.InformeJob)
+async def obtener_informe_job(job_id: str, user: _user.User = Depends(_userServices.get_current_user)):
+    if not user.is_admin():
+        raise HTTPException(status_code=403, detail="You do not have permission to view this resource")
+    job = _informeServices.obtener_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return _responses.json_response(_informe.InformeJob, job)
+
+@app.get("/admin/auth_cache", response_model=Dict[str, _informe.CacheStats])
+async def auth_cache_stats(user: _user.User = Depends(_userServices.get_current_user)):
+    if not user.is_admin():
+        raise HTTPException(status_code=403, detail="You do not have permission to view this resource")
+    return _responses.json_response(Dict[str, _informe.CacheStats], _authCacheServices.stats())
+
+@app.get("/admin/pool", response_model=Dict[str, _informe.PoolStats], response_model_exclude_unset=True)
+async def pool_stats(user: _user.User = Depends(_userServices.get_current_user)):
+    if not user.is_admin():
+        raise HTTPException(status_code=403, detail="You do not have permission to view this resource")
+    return _responses.json_response(Dict[str, _informe.PoolStats], _metricsServices.pool_stats(), exclude_unset=True)
+
+@app.post("/admin/estadisticas/reconciliar", response_model=_informe.Estadisticas)
+async def reconciliar_estadisticas(user: _user.User = Depends(_userServices.get_current_user), db: _asyncio.AsyncSession = Depends(_databaseServices.get_db)):
+    if not user.is_admin():
+        raise HTTPException(status_code=403, detail="You do not have permission to view this resource")
+    return _responses.json_response(_informe.Estadisticas, await _statsServices.reconciliar(db))
\ No newline at end of file
@@ -0,0 +1,73 @@
+# Esquema original (el que creaba Base.metadata.create_all). IF NOT EXISTS
+# permite adoptar bases de datos creadas antes de tener migraciones.
+description = "Esquema inicial: user, snippet, publicacion, comentario"
+
+def upgrade(conn):
+    conn.exec_driver_sql("""
+        CREATE TABLE IF NOT EXISTS "user" (
+            "Userid" UUID PRIMARY KEY,
+            role VARCHAR,
+            username VARCHAR,
+            full_name VARCHAR,
+            email VARCHAR,
+            hashed_password VARCHAR,
+            fecha_creacion TIMESTAMP WITHOUT TIME ZONE,
+            activo BOOLEAN,
+            actualiza TIMESTAMP WITHOUT TIME ZONE
+        )
+    """)
+    conn.exec_driver_sql('CREATE UNIQUE INDEX IF NOT EXISTS ix_user_username ON "user" (username)')
+    conn.exec_driver_sql('CREATE UNIQUE INDEX IF NOT EXISTS ix_user_email ON "user" (email)')
+    conn.exec_driver_sql('CREATE INDEX IF NOT EXISTS ix_user_full_name ON "user" (full_name)')
+
+    conn.exec_driver_sql("""
+        CREATE TABLE IF NOT EXISTS snippet (
+            "Snippetid" UUID PRIMARY KEY,
+            "Titulo" VARCHAR,
+            "Userid" UUID REFERENCES "user" ("Userid"),
+            "Lenguaje" VARCHAR NOT NULL,
+            descripcion VARCHAR,
+            snippet BYTEA,
+            fecha_creacion TIMESTAMP WITHOUT TIME ZONE,
+            activo BOOLEAN,
+            actualiza TIMESTAMP WITHOUT TIME ZONE
+        )
+    """)
+    conn.exec_driver_sql('CREATE INDEX IF NOT EXISTS "ix_snippet_Titulo" ON snippet ("Titulo")')
+    conn.exec_driver_sql('CREATE INDEX IF NOT EXISTS "ix_snippet_Lenguaje" ON snippet ("Lenguaje")')
+    conn.exec_driver_sql('CREATE INDEX IF NOT EXISTS ix_snippet_descripcion ON snippet (descripcion)')
+    conn.exec_driver_sql('CREATE INDEX IF NOT EXISTS ix_snippet_snippet ON snippet (snippet)')
+
+    conn.exec_driver_sql("""
+        CREATE TABLE IF NOT EXISTS publicacion (
+            "Publicacionid" UUID PRIMARY KEY,
+            "Userid" UUID REFERENCES "user" ("Userid"),
+            "SnippetId" UUID REFERENCES snippet ("Snippetid"),
+            titulo VARCHAR,
+            contenido TEXT,
+            fecha_creacion TIMESTAMP WITHOUT TIME ZONE,
+            activo BOOLEAN,
+            actualiza TIMESTAMP WITHOUT TIME ZONE
+        )
+    """)
+    conn.exec_driver_sql('CREATE INDEX IF NOT EXISTS ix_publicacion_titulo ON publicacion (titulo)')
+    conn.exec_driver_sql('CREATE INDEX IF NOT EXISTS ix_publicacion_contenido ON publicacion (contenido)')
+
+    conn.exec_driver_sql("""
+        CREATE TABLE IF NOT EXISTS comentario (
+            "ComentarioId" UUID PRIMARY KEY,
+            contenido TEXT,
+            fecha_creacion TIMESTAMP WITHOUT TIME ZONE,
+            "Userid" UUID REFERENCES "user" ("Userid"),
+            "Publicacionid" UUID REFERENCES publicacion ("Publicacionid"),
+            activo BOOLEAN,
+            actualiza TIMESTAMP WITHOUT TIME ZONE
+        )
+    """)
+    conn.exec_driver_sql('CREATE INDEX IF NOT EXISTS ix_comentario_contenido ON comentario (contenido)')
+
+def downgrade(conn):
+    conn.exec_driver_sql("DROP TABLE IF EXISTS comentario")
+    conn.exec_driver_sql("DROP TABLE IF EXISTS publicacion")
+    conn.exec_driver_sql("DROP TABLE IF EXISTS snippet")
+    conn.exec_driver_sql('DROP TABLE IF EXISTS "user"')
@@ -0,0 +1,13 @@
+description = "Índices compuestos para la paginación keyset de los listados"
+
+def upgrade(conn):
+    conn.exec_driver_sql('CREATE INDEX IF NOT EXISTS ix_snippet_usuario_fecha ON snippet ("Userid", fecha_creacion, "Snippetid")')
+    conn.exec_driver_sql('CREATE INDEX IF NOT EXISTS ix_publicacion_usuario_fecha ON publicacion ("Userid", fecha_creacion, "Publicacionid")')
+    conn.exec_driver_sql('CREATE INDEX IF NOT EXISTS ix_comentario_usuario_fecha ON comentario ("Userid", fecha_creacion, "ComentarioId")')
+    conn.exec_driver_sql('CREATE INDEX IF NOT EXISTS ix_comentario_publicacion_fecha ON comentario ("Publicacionid", fecha_creacion, "ComentarioId")')
+
+def downgrade(conn):
+    conn.exec_driver_sql("DROP INDEX IF EXISTS ix_comentario_publicacion_fecha")
+    conn.exec_driver_sql("DROP INDEX IF EXISTS ix_comentario_usuario_fecha")
+    conn.exec_driver_sql("DROP INDEX IF EXISTS ix_publicacion_usuario_fecha")
+    conn.exec_driver_sql("DROP INDEX IF EXISTS ix_snippet_usuario_fecha")
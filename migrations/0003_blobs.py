@@ -0,0 +1,25 @@
+description = "Almacén de blobs: tabla blob y metadatos del contenido en snippet"
+
+def upgrade(conn):
+    conn.exec_driver_sql("""
+        CREATE TABLE IF NOT EXISTS blob (
+            hash VARCHAR(64) PRIMARY KEY,
+            tamano BIGINT NOT NULL,
+            referencias INTEGER NOT NULL,
+            fecha_creacion TIMESTAMP WITHOUT TIME ZONE
+        )
+    """)
+    conn.exec_driver_sql("ALTER TABLE snippet ADD COLUMN IF NOT EXISTS hash_contenido VARCHAR(64)")
+    conn.exec_driver_sql("ALTER TABLE snippet ADD COLUMN IF NOT EXISTS tamano BIGINT")
+    conn.exec_driver_sql("ALTER TABLE snippet ADD COLUMN IF NOT EXISTS tipo_contenido VARCHAR")
+    conn.exec_driver_sql("ALTER TABLE snippet ADD COLUMN IF NOT EXISTS nombre_archivo VARCHAR")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_snippet_hash_contenido ON snippet (hash_contenido)")
+    conn.exec_driver_sql("DROP INDEX IF EXISTS ix_snippet_snippet")
+
+def downgrade(conn):
+    conn.exec_driver_sql("DROP INDEX IF EXISTS ix_snippet_hash_contenido")
+    conn.exec_driver_sql("ALTER TABLE snippet DROP COLUMN IF EXISTS nombre_archivo")
+    conn.exec_driver_sql("ALTER TABLE snippet DROP COLUMN IF EXISTS tipo_contenido")
+    conn.exec_driver_sql("ALTER TABLE snippet DROP COLUMN IF EXISTS tamano")
+    conn.exec_driver_sql("ALTER TABLE snippet DROP COLUMN IF EXISTS hash_contenido")
+    conn.exec_driver_sql("DROP TABLE IF EXISTS blob")
@@ -0,0 +1,18 @@
+description = "Búsqueda de texto: columnas tsvector e índices GIN"
+
+def upgrade(conn):
+    conn.exec_driver_sql("ALTER TABLE snippet ADD COLUMN IF NOT EXISTS busqueda tsvector")
+    conn.exec_driver_sql("""
+        ALTER TABLE publicacion ADD COLUMN IF NOT EXISTS busqueda tsvector GENERATED ALWAYS AS (
+            setweight(to_tsvector('simple', coalesce(titulo, '')), 'A') ||
+            setweight(to_tsvector('simple', coalesce(contenido, '')), 'B')
+        ) STORED
+    """)
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_snippet_busqueda ON snippet USING gin (busqueda)")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_publicacion_busqueda ON publicacion USING gin (busqueda)")
+
+def downgrade(conn):
+    conn.exec_driver_sql("DROP INDEX IF EXISTS ix_publicacion_busqueda")
+    conn.exec_driver_sql("DROP INDEX IF EXISTS ix_snippet_busqueda")
+    conn.exec_driver_sql("ALTER TABLE publicacion DROP COLUMN IF EXISTS busqueda")
+    conn.exec_driver_sql("ALTER TABLE snippet DROP COLUMN IF EXISTS busqueda")
@@ -0,0 +1,14 @@
+description = "Búsqueda de código: pg_trgm y tabla snippet_texto"
+
+def upgrade(conn):
+    conn.exec_driver_sql("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    conn.exec_driver_sql("""
+        CREATE TABLE IF NOT EXISTS snippet_texto (
+            "Snippetid" UUID PRIMARY KEY REFERENCES snippet ("Snippetid") ON DELETE CASCADE,
+            texto TEXT NOT NULL
+        )
+    """)
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_snippet_texto_trgm ON snippet_texto USING gin (texto gin_trgm_ops)")
+
+def downgrade(conn):
+    conn.exec_driver_sql("DROP TABLE IF EXISTS snippet_texto")
@@ -0,0 +1,14 @@
+description = "Contadores de estadísticas para /admin/informe"
+
+def upgrade(conn):
+    conn.exec_driver_sql("""
+        CREATE TABLE IF NOT EXISTS estadistica (
+            clave VARCHAR NOT NULL,
+            shard SMALLINT NOT NULL,
+            valor BIGINT NOT NULL,
+            PRIMARY KEY (clave, shard)
+        )
+    """)
+
+def downgrade(conn):
+    conn.exec_driver_sql("DROP TABLE IF EXISTS estadistica")
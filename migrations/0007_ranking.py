@@ -0,0 +1,24 @@
+description = "Conteos diarios de publicaciones por usuario para /top_users"
+
+def upgrade(conn):
+    conn.exec_driver_sql("""
+        CREATE TABLE IF NOT EXISTS ranking_diario (
+            "Userid" UUID NOT NULL REFERENCES "user" ("Userid"),
+            dia DATE NOT NULL,
+            publicaciones INTEGER NOT NULL,
+            PRIMARY KEY ("Userid", dia)
+        )
+    """)
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_ranking_diario_dia ON ranking_diario (dia)")
+    # backfill con las publicaciones existentes
+    conn.exec_driver_sql("""
+        INSERT INTO ranking_diario ("Userid", dia, publicaciones)
+        SELECT "Userid", fecha_creacion::date, count(*)
+        FROM publicacion
+        WHERE "Userid" IS NOT NULL
+        GROUP BY "Userid", fecha_creacion::date
+        ON CONFLICT DO NOTHING
+    """)
+
+def downgrade(conn):
+    conn.exec_driver_sql("DROP TABLE IF EXISTS ranking_diario")
@@ -0,0 +1,32 @@
+# Índices según las consultas reales de services/*.py:
+#  - fuera: índices btree sobre columnas que nunca se buscan por igualdad
+#    (Text/String largos y descripciones); solo encarecían cada escritura.
+#  - FKs: Userid y Publicacionid ya quedan cubiertos como primera columna de
+#    los índices compuestos de 0002; faltaba publicacion.SnippetId, que usan
+#    delete_snippet y las versiones de /publicaciones/{id}.
+# CONCURRENTLY no puede ir dentro de una transacción.
+description = "Revisión de índices: quitar los que no se usan y cubrir publicacion.SnippetId"
+transactional = False
+
+_SOBRANTES = [
+    "ix_publicacion_contenido",
+    "ix_publicacion_titulo",
+    "ix_comentario_contenido",
+    "ix_snippet_descripcion",
+    '"ix_snippet_Titulo"',
+    "ix_user_full_name",
+]
+
+def upgrade(conn):
+    conn.exec_driver_sql('CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_publicacion_snippet ON publicacion ("SnippetId")')
+    for indice in _SOBRANTES:
+        conn.exec_driver_sql(f"DROP INDEX CONCURRENTLY IF EXISTS {indice}")
+
+def downgrade(conn):
+    conn.exec_driver_sql('CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_user_full_name ON "user" (full_name)')
+    conn.exec_driver_sql('CREATE INDEX CONCURRENTLY IF NOT EXISTS "ix_snippet_Titulo" ON snippet ("Titulo")')
+    conn.exec_driver_sql('CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_snippet_descripcion ON snippet (descripcion)')
+    conn.exec_driver_sql('CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_comentario_contenido ON comentario (contenido)')
+    conn.exec_driver_sql('CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_publicacion_titulo ON publicacion (titulo)')
+    conn.exec_driver_sql('CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_publicacion_contenido ON publicacion (contenido)')
+    conn.exec_driver_sql("DROP INDEX CONCURRENTLY IF EXISTS ix_publicacion_snippet")
@@ -0,0 +1,10 @@
+# Las filas existentes se completan con: python -m services.storage summarize
+description = "Resumen de los snippets para los listados: líneas y vista previa"
+
+def upgrade(conn):
+    conn.exec_driver_sql("ALTER TABLE snippet ADD COLUMN IF NOT EXISTS lineas INTEGER")
+    conn.exec_driver_sql("ALTER TABLE snippet ADD COLUMN IF NOT EXISTS vista_previa TEXT")
+
+def downgrade(conn):
+    conn.exec_driver_sql("ALTER TABLE snippet DROP COLUMN IF EXISTS vista_previa")
+    conn.exec_driver_sql("ALTER TABLE snippet DROP COLUMN IF EXISTS lineas")
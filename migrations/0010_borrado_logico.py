@@ -0,0 +1,15 @@
+# activo pasa a ser la marca de borrado lógico (services/purge.py elimina las
+# filas después). Las filas que se insertaron sin valor cuentan como activas,
+# y el default del servidor cubre los INSERT que no pasan por el ORM.
+description = "Borrado lógico: activo con default true en snippet, publicacion y comentario"
+
+_TABLAS = ("snippet", "publicacion", "comentario")
+
+def upgrade(conn):
+    for tabla in _TABLAS:
+        conn.exec_driver_sql(f"UPDATE {tabla} SET activo = true WHERE activo IS NULL")
+        conn.exec_driver_sql(f"ALTER TABLE {tabla} ALTER COLUMN activo SET DEFAULT true")
+
+def downgrade(conn):
+    for tabla in _TABLAS:
+        conn.exec_driver_sql(f"ALTER TABLE {tabla} ALTER COLUMN activo DROP DEFAULT")
@@ -0,0 +1,44 @@
+# Con borrado lógico todas las lecturas filtran por activo: los índices de los
+# listados y de búsqueda pasan a ser parciales (WHERE activo), así las filas
+# borradas no ocupan sitio en ellos ni se recorren. Cada uno se reconstruye
+# con otro nombre y se renombra, para no dejar la tabla sin índice.
+#  - ix_publicacion_snippet sigue completo: lo usa la FK al purgar snippets.
+#  - ix_comentario_publicacion (nuevo, completo): lo mismo al purgar publicaciones.
+#  - ix_*_borrado (WHERE NOT activo): la purga localiza las filas borradas
+#    sin recorrer la tabla.
+description = "Índices parciales sobre filas activas y para la purga de filas borradas"
+transactional = False
+
+_PARCIALES = {
+    "ix_snippet_usuario_fecha": 'snippet ("Userid", fecha_creacion, "Snippetid")',
+    "ix_publicacion_usuario_fecha": 'publicacion ("Userid", fecha_creacion, "Publicacionid")',
+    "ix_comentario_usuario_fecha": 'comentario ("Userid", fecha_creacion, "ComentarioId")',
+    "ix_comentario_publicacion_fecha": 'comentario ("Publicacionid", fecha_creacion, "ComentarioId")',
+    "ix_snippet_busqueda": "snippet USING gin (busqueda)",
+    "ix_publicacion_busqueda": "publicacion USING gin (busqueda)",
+}
+
+_NUEVOS = {
+    "ix_comentario_publicacion": 'comentario ("Publicacionid")',
+    "ix_snippet_borrado": "snippet (actualiza) WHERE NOT activo",
+    "ix_publicacion_borrado": "publicacion (actualiza) WHERE NOT activo",
+    "ix_comentario_borrado": "comentario (actualiza) WHERE NOT activo",
+}
+
+def _reconstruir(conn, nombre, definicion):
+    conn.exec_driver_sql(f"DROP INDEX CONCURRENTLY IF EXISTS {nombre}_nuevo")
+    conn.exec_driver_sql(f"CREATE INDEX CONCURRENTLY {nombre}_nuevo ON {definicion}")
+    conn.exec_driver_sql(f"DROP INDEX CONCURRENTLY IF EXISTS {nombre}")
+    conn.exec_driver_sql(f"ALTER INDEX {nombre}_nuevo RENAME TO {nombre}")
+
+def upgrade(conn):
+    for nombre, definicion in _NUEVOS.items():
+        conn.exec_driver_sql(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {nombre} ON {definicion}")
+    for nombre, definicion in _PARCIALES.items():
+        _reconstruir(conn, nombre, f"{definicion} WHERE activo")
+
+def downgrade(conn):
+    for nombre, definicion in _PARCIALES.items():
+        _reconstruir(conn, nombre, definicion)
+    for nombre in _NUEVOS:
+        conn.exec_driver_sql(f"DROP INDEX CONCURRENTLY IF EXISTS {nombre}")
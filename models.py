@@ -1,6 +1,6 @@
 import datetime as _dt
 from uuid import uuid4 as _uuid
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.dialects.postgresql import UUID, TSVECTOR
 
 import sqlalchemy as _sql
 import sqlalchemy.orm as _orm
@@ -10,17 +10,21 @@ import database as _database
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# Configuración de búsqueda de texto: 'simple' no aplica stemming, lo que
+# funciona igual para prosa en cualquier idioma y para identificadores de código.
+FTS_CONFIG = "simple"
+
 class User(_database.Base):
     __tablename__ = "user"
     Userid = _sql.Column(UUID(as_uuid=True), primary_key=True, default=_uuid)
     role = _sql.Column(_sql.String, default="user")
     username = _sql.Column(_sql.String, index=True, unique=True)
-    full_name = _sql.Column(_sql.String, index=True)
+    full_name = _sql.Column(_sql.String)
     email = _sql.Column(_sql.String, unique=True, index=True)
     hashed_password = _sql.Column(_sql.String)
     fecha_creacion = _sql.Column(_sql.DateTime, default=_dt.datetime.utcnow)
     activo = _sql.Column(_sql.Boolean, default=True)
-    actualiza = _sql.Column(_sql.DateTime, nullable=True, default=_dt.datetime.utcnow)
+    actualiza = _sql.Column(_sql.DateTime, nullable=True, default=_dt.datetime.utcnow, onupdate=_dt.datetime.utcnow)
 
     publicaciones = _orm.relationship("Publicacion", back_populates="user")
     snippets = _orm.relationship("Snippet", back_populates="user")
@@ -37,41 +41,120 @@ class Publicacion(_database.Base):
     Publicacionid = _sql.Column(UUID(as_uuid=True), primary_key=True, default=_uuid)
     Userid = _sql.Column(UUID(as_uuid=True), _sql.ForeignKey("user.Userid"))
     SnippetId = _sql.Column(UUID(as_uuid=True), _sql.ForeignKey("snippet.Snippetid"))
-    titulo = _sql.Column(_sql.String, index=True)
-    contenido = _sql.Column(_sql.Text, index=True)
+    titulo = _sql.Column(_sql.String)
+    contenido = _sql.Column(_sql.Text)
     fecha_creacion = _sql.Column(_sql.DateTime, default=_dt.datetime.utcnow)
-    activo = _sql.Column(_sql.Boolean, default=True)
-    actualiza = _sql.Column(_sql.DateTime, nullable=True, default=_dt.datetime.utcnow)
+    # False = borrado lógico; services/purge.py elimina la fila más tarde
+    activo = _sql.Column(_sql.Boolean, default=True, server_default=_sql.true())
+    actualiza = _sql.Column(_sql.DateTime, nullable=True, default=_dt.datetime.utcnow, onupdate=_dt.datetime.utcnow)
+    busqueda = _sql.Column(TSVECTOR, _sql.Computed(
+        f"setweight(to_tsvector('{FTS_CONFIG}', coalesce(titulo, '')), 'A') || "
+        f"setweight(to_tsvector('{FTS_CONFIG}', coalesce(contenido, '')), 'B')",
+        persisted=True,
+    ))
 
     user = _orm.relationship("User", back_populates="publicaciones")
     Snippet = _orm.relationship("Snippet", back_populates="publicaciones")
     comentarios = _orm.relationship("Comentario", back_populates="publicacion")
 
+    __table_args__ = (
+        # parciales: las lecturas solo ven filas activas (migrations/0011)
+        _sql.Index("ix_publicacion_usuario_fecha", "Userid", "fecha_creacion", "Publicacionid", postgresql_where=_sql.text("activo")),
+        _sql.Index("ix_publicacion_snippet", "SnippetId"),
+        _sql.Index("ix_publicacion_busqueda", "busqueda", postgresql_using="gin", postgresql_where=_sql.text("activo")),
+        _sql.Index("ix_publicacion_borrado", "actualiza", postgresql_where=_sql.text("NOT activo")),
+    )
+
 
 class Snippet(_database.Base):
     __tablename__ = "snippet"
     Snippetid = _sql.Column(UUID(as_uuid=True), primary_key=True, default=_uuid)
-    Titulo = _sql.Column(_sql.String, index=True)
+    Titulo = _sql.Column(_sql.String)
     Userid = _sql.Column(UUID(as_uuid=True), _sql.ForeignKey("user.Userid"))
     Lenguaje = _sql.Column(_sql.String, nullable=False, index=True)
-    descripcion = _sql.Column(_sql.String, nullable=True, index=True)
-    snippet = _sql.Column(_sql.LargeBinary, index=True)
+    descripcion = _sql.Column(_sql.String, nullable=True)
+    # El contenido vive en el almacén de blobs (services/storage.py); la columna
+    # snippet solo conserva filas antiguas hasta que se migran. Diferida: un
+    # select(Snippet) no la trae, hay que pedirla (undefer o refresh).
+    snippet = _orm.deferred(_sql.Column(_sql.LargeBinary, nullable=True))
+    hash_contenido = _sql.Column(_sql.String(64), nullable=True, index=True)
+    tamano = _sql.Column(_sql.BigInteger, nullable=True)
+    tipo_contenido = _sql.Column(_sql.String, nullable=True)
+    nombre_archivo = _sql.Column(_sql.String, nullable=True)
+    # Resumen para los listados, calculado al escribir el contenido
+    lineas = _sql.Column(_sql.Integer, nullable=True)
+    vista_previa = _sql.Column(_sql.Text, nullable=True)
+    # El contenido no está en la fila, así que el vector se calcula al escribir
+    # (services/search.py) en lugar de como columna generada. Solo se usa en
+    # filtros: también diferido.
+    busqueda = _orm.deferred(_sql.Column(TSVECTOR, nullable=True))
     fecha_creacion = _sql.Column(_sql.DateTime, default=_dt.datetime.utcnow)
-    activo = _sql.Column(_sql.Boolean, default=True)
-    actualiza = _sql.Column(_sql.DateTime, nullable=True, default=_dt.datetime.utcnow)
+    activo = _sql.Column(_sql.Boolean, default=True, server_default=_sql.true())
+    actualiza = _sql.Column(_sql.DateTime, nullable=True, default=_dt.datetime.utcnow, onupdate=_dt.datetime.utcnow)
 
     user = _orm.relationship("User", back_populates="snippets")
     publicaciones = _orm.relationship("Publicacion", back_populates="Snippet")
 
+    __table_args__ = (
+        _sql.Index("ix_snippet_usuario_fecha", "Userid", "fecha_creacion", "Snippetid", postgresql_where=_sql.text("activo")),
+        _sql.Index("ix_snippet_busqueda", "busqueda", postgresql_using="gin", postgresql_where=_sql.text("activo")),
+        _sql.Index("ix_snippet_borrado", "actualiza", postgresql_where=_sql.text("NOT activo")),
+    )
+
+# Copia en texto del contenido solo para búsqueda de código: el índice de
+# trigramas (pg_trgm) poda candidatos y Postgres verifica cada uno con el
+# LIKE/regex real. Vive fuera de snippet para no engordar esa tabla.
+class SnippetTexto(_database.Base):
+    __tablename__ = "snippet_texto"
+    Snippetid = _sql.Column(UUID(as_uuid=True), _sql.ForeignKey("snippet.Snippetid", ondelete="CASCADE"), primary_key=True)
+    texto = _sql.Column(_sql.Text, nullable=False)
+
+    __table_args__ = (
+        _sql.Index("ix_snippet_texto_trgm", "texto", postgresql_using="gin", postgresql_ops={"texto": "gin_trgm_ops"}),
+    )
+
+# Publicaciones por usuario y día, para el ranking de /top_users
+class RankingDiario(_database.Base):
+    __tablename__ = "ranking_diario"
+    Userid = _sql.Column(UUID(as_uuid=True), _sql.ForeignKey("user.Userid"), primary_key=True)
+    dia = _sql.Column(_sql.Date, primary_key=True)
+    publicaciones = _sql.Column(_sql.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        _sql.Index("ix_ranking_diario_dia", "dia"),
+    )
+
+# Contadores para /admin/informe, mantenidos por services/stats.py
+class Estadistica(_database.Base):
+    __tablename__ = "estadistica"
+    clave = _sql.Column(_sql.String, primary_key=True)
+    shard = _sql.Column(_sql.SmallInteger, primary_key=True, default=0)
+    valor = _sql.Column(_sql.BigInteger, nullable=False, default=0)
+
+class Blob(_database.Base):
+    __tablename__ = "blob"
+    hash = _sql.Column(_sql.String(64), primary_key=True)
+    tamano = _sql.Column(_sql.BigInteger, nullable=False)
+    referencias = _sql.Column(_sql.Integer, nullable=False, default=1)
+    fecha_creacion = _sql.Column(_sql.DateTime, default=_dt.datetime.utcnow)
+
 class Comentario(_database.Base):
     __tablename__ = "comentario"
     ComentarioId = _sql.Column(UUID(as_uuid=True), primary_key=True, default=_uuid)
-    contenido = _sql.Column(_sql.Text, index=True)
+    contenido = _sql.Column(_sql.Text)
     fecha_creacion = _sql.Column(_sql.DateTime, default=_dt.datetime.utcnow)
     Userid = _sql.Column(UUID(as_uuid=True), _sql.ForeignKey("user.Userid"))
     Publicacionid = _sql.Column(UUID(as_uuid=True), _sql.ForeignKey("publicacion.Publicacionid"))
-    activo = _sql.Column(_sql.Boolean, default=True)
-    actualiza = _sql.Column(_sql.DateTime, nullable=True, default=_dt.datetime.utcnow)
+    activo = _sql.Column(_sql.Boolean, default=True, server_default=_sql.true())
+    actualiza = _sql.Column(_sql.DateTime, nullable=True, default=_dt.datetime.utcnow, onupdate=_dt.datetime.utcnow)
 
     publicacion = _orm.relationship("Publicacion", back_populates="comentarios")
     user = _orm.relationship("User", back_populates="comentarios")
+
+    __table_args__ = (
+        _sql.Index("ix_comentario_usuario_fecha", "Userid", "fecha_creacion", "ComentarioId", postgresql_where=_sql.text("activo")),
+        _sql.Index("ix_comentario_publicacion_fecha", "Publicacionid", "fecha_creacion", "ComentarioId", postgresql_where=_sql.text("activo")),
+        # completo: la comprobación de la FK al purgar publicaciones no usa índices parciales
+        _sql.Index("ix_comentario_publicacion", "Publicacionid"),
+        _sql.Index("ix_comentario_borrado", "actualiza", postgresql_where=_sql.text("NOT activo")),
+    )
\ No newline at end of file
@@ -0,0 +1,31 @@
+import datetime as _dt
+import uuid as _uuid
+import pydantic as _pydantic
+
+
+class ResultadoSnippet(_pydantic.BaseModel):
+    id: _uuid.UUID
+    titulo: str
+    lenguaje: str
+    descripcion: str
+    autor: str
+    fecha_creacion: _dt.datetime
+    rank: float
+
+
+class ResultadoPublicacion(_pydantic.BaseModel):
+    id: _uuid.UUID
+    titulo: str
+    contenido: str
+    snippet_id: _uuid.UUID
+    autor: str
+    fecha_creacion: _dt.datetime
+    rank: float
+
+
+class CoincidenciaCodigo(_pydantic.BaseModel):
+    id: _uuid.UUID
+    titulo: str
+    lenguaje: str
+    autor: str
+    coincidencia: str
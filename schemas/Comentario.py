@@ -22,3 +22,9 @@ class Comentario(_ComentarioBase):
     Publicacionid: _uuid.UUID
 
     model_config = _pydantic.ConfigDict(from_attributes=True)
+
+
+# Comentarios de una publicación, con el autor por nombre
+class ComentarioPublico(_pydantic.BaseModel):
+    comentario: str
+    usuario: str
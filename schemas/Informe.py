@@ -0,0 +1,49 @@
+import datetime as _dt
+from typing import Dict, Literal, Optional
+import pydantic as _pydantic
+
+
+class Estadisticas(_pydantic.BaseModel):
+    total_usuarios: int
+    total_snippets: int
+    total_publicaciones: int
+    total_comentarios: int
+    snippets_aprobados: int
+    usuarios_activos: int
+
+
+class Informe(Estadisticas):
+    barras: str
+    torta: str
+
+
+class InformeJob(_pydantic.BaseModel):
+    job_id: str
+    estado: Literal["pendiente", "completado", "error"]
+    creado: _dt.datetime
+    terminado: Optional[_dt.datetime] = None
+    resultado: Optional[Informe] = None
+    error: Optional[str] = None
+
+
+# Diagnóstico de /admin/auth_cache y /admin/pool
+class CacheStats(_pydantic.BaseModel):
+    size: int
+    hits: int
+    misses: int
+
+
+class Histograma(_pydantic.BaseModel):
+    buckets: Dict[str, int]
+    sum: float
+    count: int
+
+
+class PoolStats(_pydantic.BaseModel):
+    wait_seconds: Histograma
+    timeouts: int
+    size: Optional[int] = None
+    checked_in: Optional[int] = None
+    checked_out: Optional[int] = None
+    overflow: Optional[int] = None
+    max_overflow: Optional[int] = None
@@ -0,0 +1,6 @@
+import pydantic as _pydantic
+
+
+# Respuesta de las rutas que solo confirman la operación (borrados)
+class Mensaje(_pydantic.BaseModel):
+    detail: str
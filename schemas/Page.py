@@ -0,0 +1,11 @@
+from typing import Generic, List, Optional, TypeVar
+import pydantic as _pydantic
+
+T = TypeVar("T")
+
+
+class Page(_pydantic.BaseModel, Generic[T]):
+    items: List[T]
+    next_cursor: Optional[str] = None
+
+    model_config = _pydantic.ConfigDict(from_attributes=True)
@@ -1,5 +1,6 @@
 import uuid as _uuid
 import datetime as _dt
+from typing import Optional
 import pydantic as _pydantic
 
 
@@ -24,3 +25,16 @@ class Publicacion(_PublicacionBase):
     SnippetId: _uuid.UUID
 
     model_config = _pydantic.ConfigDict(from_attributes=True)
+
+
+# Publicación en los listados: el archivo va inline (archivo / archivo_base64)
+# o como enlace (archivo_url, archivo_hash, archivo_tamano) según ?inline.
+class PublicacionItem(_pydantic.BaseModel):
+    id: _uuid.UUID
+    titulo: str
+    contenido: str
+    archivo: Optional[str] = None
+    archivo_base64: Optional[str] = None
+    archivo_url: Optional[str] = None
+    archivo_hash: Optional[str] = None
+    archivo_tamano: Optional[int] = None
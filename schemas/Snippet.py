@@ -1,5 +1,6 @@
 import datetime as _dt
 import uuid as _uuid
+from typing import List, Literal, Optional
 import pydantic as _pydantic
 
 
@@ -28,3 +29,44 @@ class Snippet(_SnippetBase):
     Lenguaje: str
 
     model_config = _pydantic.ConfigDict(from_attributes=True)
+
+
+# Respuesta de alta y edición: los metadatos sin el contenido, que se
+# descarga aparte desde /snippets/{Snippetid}/raw.
+class SnippetInfo(_pydantic.BaseModel):
+    Snippetid: _uuid.UUID
+    Titulo: str
+    descripcion: str
+    Lenguaje: str
+    Userid: _uuid.UUID
+    nombre_archivo: Optional[str] = None
+    tipo_contenido: Optional[str] = None
+    tamano: Optional[int] = None
+    lineas: Optional[int] = None
+    hash_contenido: Optional[str] = None
+    fecha_creacion: _dt.datetime
+    actualiza: _dt.datetime
+    activo: bool
+
+    model_config = _pydantic.ConfigDict(from_attributes=True)
+
+
+# Elemento de los listados: el resumen con las primeras líneas del contenido
+class SnippetResumen(SnippetInfo):
+    vista_previa: Optional[str] = None
+
+
+class ImportResultado(_pydantic.BaseModel):
+    archivo: str
+    estado: Literal["creado", "omitido", "error"]
+    detalle: Optional[str] = None
+    Snippetid: Optional[_uuid.UUID] = None
+    Titulo: Optional[str] = None
+    Lenguaje: Optional[str] = None
+    tamano: Optional[int] = None
+
+
+class Importacion(_pydantic.BaseModel):
+    creados: int
+    errores: int
+    resultados: List[ImportResultado]
@@ -1,4 +1,5 @@
 import datetime as _dt
+from typing import Optional
 from uuid import UUID
 import re
 import pydantic as _pydantic
@@ -35,4 +36,26 @@ class UserCreate(_UserBase):
 class User(_UserBase):
     Userid: UUID
 
-    model_config = _pydantic.ConfigDict(from_attributes=True)
\ No newline at end of file
+    model_config = _pydantic.ConfigDict(from_attributes=True)
+
+
+class Principal(User):
+    role: Optional[str] = None
+    activo: Optional[bool] = None
+
+    model_config = _pydantic.ConfigDict(from_attributes=True, frozen=True)
+
+    def is_admin(self):
+        return self.role == "admin"
+
+
+class Token(_pydantic.BaseModel):
+    access_token: str
+    token_type: str
+
+
+class UsuarioTop(_pydantic.BaseModel):
+    id: UUID
+    username: str
+    full_name: str
+    numero_publicaciones: int
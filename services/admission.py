@@ -0,0 +1,177 @@
+import hashlib
+import math
+import os
+import time
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+from starlette.responses import JSONResponse
+from starlette.routing import compile_path
+
+import services.auth_cache as _authCache
+import services.metrics as _metrics
+
+load_dotenv()
+
+# Control de admisión en proceso, antes de que la petición llegue a la ruta:
+#  - token bucket por usuario (token Bearer) y por IP: cada petición gasta el
+#    coste de su clase; sin saldo, 429 con el tiempo hasta tenerlo.
+#  - concurrencia máxima por clase de ruta: con todas las plazas ocupadas se
+#    responde 503 al momento en lugar de encolar.
+# Cada worker lleva sus propios límites; el total es por número de workers.
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() in ("1", "true", "yes")
+ADMISSION_USER_RATE = float(os.getenv("ADMISSION_USER_RATE", "10"))
+ADMISSION_USER_BURST = float(os.getenv("ADMISSION_USER_BURST", "50"))
+ADMISSION_IP_RATE = float(os.getenv("ADMISSION_IP_RATE", "20"))
+ADMISSION_IP_BURST = float(os.getenv("ADMISSION_IP_BURST", "100"))
+# clientes con bucket en memoria; por encima se descartan los menos recientes
+ADMISSION_MAX_CLIENTS = int(os.getenv("ADMISSION_MAX_CLIENTS", "10000"))
+ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", "1"))
+
+
+class RouteClass:
+    # coste: fichas del bucket que gasta cada petición; concurrencia: peticiones
+    # en curso a la vez en este worker (None = sin límite)
+    def __init__(self, nombre: str, coste: float = 1, concurrencia: int = None):
+        self.nombre = nombre
+        self.coste = coste
+        self.concurrencia = concurrencia
+        self.en_curso = 0
+
+DEFAULT_CLASS = RouteClass("default")
+# bcrypt (services/hashing.py)
+AUTH_CLASS = RouteClass(
+    "auth",
+    coste=float(os.getenv("ADMISSION_AUTH_COST", "10")),
+    concurrencia=int(os.getenv("ADMISSION_AUTH_CONCURRENCY", "16")),
+)
+# dos llamadas al modelo por informe (services/informe.py)
+INFORME_CLASS = RouteClass(
+    "informe",
+    coste=float(os.getenv("ADMISSION_INFORME_COST", "20")),
+    concurrencia=int(os.getenv("ADMISSION_INFORME_CONCURRENCY", "4")),
+)
+# escritura de blobs
+UPLOAD_CLASS = RouteClass(
+    "upload",
+    coste=float(os.getenv("ADMISSION_UPLOAD_COST", "5")),
+    concurrencia=int(os.getenv("ADMISSION_UPLOAD_CONCURRENCY", "8")),
+)
+
+
+class TokenBuckets:
+    # Un bucket por clave en un OrderedDict ordenado por último uso. Un bucket
+    # que ha vuelto a llenarse es igual que uno nuevo, así que se descarta: en
+    # memoria solo quedan los clientes activos, y nunca más de maxsize.
+    # Solo se usa desde el event loop: no necesita lock.
+    def __init__(self, rate: float, burst: float, maxsize: int = ADMISSION_MAX_CLIENTS):
+        self.rate = rate
+        self.burst = burst
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+
+    def _saldo(self, clave, ahora: float) -> float:
+        saldo, ultimo = self._data.get(clave, (self.burst, ahora))
+        return min(self.burst, saldo + (ahora - ultimo) * self.rate)
+
+    def espera(self, clave, coste: float, ahora: float = None) -> float:
+        # como take, pero sin gastar nada ni tocar el bucket
+        ahora = time.monotonic() if ahora is None else ahora
+        return max(0.0, (min(coste, self.burst) - self._saldo(clave, ahora)) / self.rate)
+
+    def take(self, clave, coste: float, ahora: float = None) -> float:
+        # 0 si hay saldo (y se descuenta); si no, segundos hasta que lo haya
+        ahora = time.monotonic() if ahora is None else ahora
+        coste = min(coste, self.burst)
+        saldo = self._saldo(clave, ahora)
+        self._data.pop(clave, None)
+        espera = 0.0
+        if saldo >= coste:
+            saldo -= coste
+        else:
+            espera = (coste - saldo) / self.rate
+        self._data[clave] = (saldo, ahora)
+        self._expirar(ahora)
+        return espera
+
+    def _expirar(self, ahora: float):
+        while self._data:
+            clave, (saldo, ultimo) = next(iter(self._data.items()))
+            if len(self._data) <= self.maxsize and saldo + (ahora - ultimo) * self.rate < self.burst:
+                break
+            del self._data[clave]
+
+    def __len__(self):
+        return len(self._data)
+
+
+_usuarios = TokenBuckets(ADMISSION_USER_RATE, ADMISSION_USER_BURST)
+_ips = TokenBuckets(ADMISSION_IP_RATE, ADMISSION_IP_BURST)
+
+
+def _usuario(headers: dict):
+    # Userid si el token ya está en la caché de auth; si no, el hash del token.
+    # Aquí no se valida: un token falso solo gasta su bucket y el de su IP.
+    esquema, _, token = headers.get(b"authorization", b"").decode("latin-1").partition(" ")
+    if esquema.lower() != "bearer" or not token:
+        return None
+    return _authCache.get_token(token) or hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+def _rechazo(status_code: int, detail: str, espera: float, clase: RouteClass, motivo: str):
+    _metrics.observe_admission_rejection(clase.nombre, motivo)
+    return JSONResponse({"detail": detail}, status_code=status_code, headers={
+        "Retry-After": str(max(math.ceil(espera), 1))
+    })
+
+
+class AdmissionMiddleware:
+    # route_classes: {(método, plantilla): RouteClass} para las rutas caras,
+    # con la plantilla como en main.py ("/snippets/{snippet_id}"). Corre antes
+    # del router, así que las plantillas se compilan aquí con el mismo
+    # compile_path de Starlette. Detrás de un proxy, la IP es la que deja el
+    # servidor en scope["client"] (uvicorn --proxy-headers --forwarded-allow-ips).
+    def __init__(self, app, route_classes: dict = None, enabled: bool = ADMISSION_ENABLED):
+        self.app = app
+        self.route_classes = [
+            (metodo.upper(), compile_path(plantilla)[0], clase)
+            for (metodo, plantilla), clase in (route_classes or {}).items()
+        ]
+        self.enabled = enabled
+
+    def _clase(self, metodo: str, path: str) -> RouteClass:
+        for metodo_clase, patron, clase in self.route_classes:
+            if metodo_clase == metodo and patron.match(path):
+                return clase
+        return DEFAULT_CLASS
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.enabled:
+            return await self.app(scope, receive, send)
+
+        clase = self._clase(scope["method"], scope["path"])
+        # sin plazas no se gasta saldo: el rechazo no es culpa del cliente
+        if clase.concurrencia is not None and clase.en_curso >= clase.concurrencia:
+            return await _rechazo(503, "Server busy, try again later", ADMISSION_RETRY_AFTER, clase, "concurrencia")(scope, receive, send)
+
+        ahora = time.monotonic()
+        cliente = scope.get("client")
+        ip = cliente[0] if cliente else None
+        usuario = _usuario(dict(scope["headers"]))
+
+        # se comprueban los dos buckets antes de gastar de ninguno: un rechazo
+        # por usuario no se cobra a la IP, ni al revés
+        for buckets, clave, motivo in ((_ips, ip, "ip"), (_usuarios, usuario, "usuario")):
+            if clave is not None:
+                espera = buckets.espera(clave, clase.coste, ahora)
+                if espera:
+                    return await _rechazo(429, "Too many requests", espera, clase, motivo)(scope, receive, send)
+        if ip is not None:
+            _ips.take(ip, clase.coste, ahora)
+        if usuario is not None:
+            _usuarios.take(usuario, clase.coste, ahora)
+
+        clase.en_curso += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            clase.en_curso -= 1
@@ -0,0 +1,118 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import sqlalchemy as _sql
+import sqlalchemy.orm as _orm
+from dotenv import load_dotenv
+
+import models as _models
+import schemas.user as _user
+
+load_dotenv()
+
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "60"))
+
+
+class _TTLCache:
+    # LRU acotado con expiración por entrada; seguro entre hilos.
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
+
+
+# sha256(token) -> Userid (el token nunca se guarda en claro)
+_tokens = _TTLCache(AUTH_CACHE_SIZE, AUTH_CACHE_TTL)
+# Userid -> Principal
+_principals = _TTLCache(AUTH_CACHE_SIZE, AUTH_CACHE_TTL)
+
+def _token_key(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+def get_token(token: str) -> Optional[str]:
+    return _tokens.get(_token_key(token))
+
+def put_token(token: str, user_id: str, exp: Optional[int] = None):
+    # no cachear más allá de la expiración del propio JWT
+    ttl = None if exp is None else exp - time.time()
+    _tokens.put(_token_key(token), str(user_id), ttl)
+
+def get_principal(user_id) -> Optional[_user.Principal]:
+    return _principals.get(str(user_id))
+
+def put_principal(user: _models.User) -> _user.Principal:
+    principal = _user.Principal.model_validate(user)
+    _principals.put(str(principal.Userid), principal)
+    return principal
+
+def invalidate_user(user_id):
+    _principals.pop(str(user_id))
+
+def clear():
+    _tokens.clear()
+    _principals.clear()
+
+def stats():
+    return {"tokens": _tokens.stats(), "principals": _principals.stats()}
+
+
+# Invalidación: cualquier UPDATE/DELETE ORM sobre user (incluido activo) marca el
+# Userid en la sesión, y se descarta de la caché cuando la transacción confirma.
+# Las actualizaciones masivas con update() deben llamar a invalidate_user.
+def _marcar_usuario(mapper, connection, target):
+    session = _orm.object_session(target)
+    if session is not None:
+        session.info.setdefault("auth_cache_invalidar", set()).add(target.Userid)
+
+_sql.event.listen(_models.User, "after_update", _marcar_usuario)
+_sql.event.listen(_models.User, "after_delete", _marcar_usuario)
+
+@_sql.event.listens_for(_orm.Session, "after_commit")
+def _invalidar_tras_commit(session):
+    for user_id in session.info.pop("auth_cache_invalidar", ()):
+        invalidate_user(user_id)
+
+@_sql.event.listens_for(_orm.Session, "after_rollback")
+def _descartar_tras_rollback(session):
+    session.info.pop("auth_cache_invalidar", None)
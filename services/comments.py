@@ -1,13 +1,22 @@
+import datetime as _dt
+from typing import Optional
+
 import models as _models
 import schemas.user as _user
+import services.pagination as _pagination
+import services.stats as _stats
 
-import sqlalchemy.orm as _orm
+import sqlalchemy as _sql
+import sqlalchemy.ext.asyncio as _asyncio
 from fastapi import HTTPException
 
-async def create_comment(Publicacionid: str , user: _user.User, db: _orm.Session, comment: str):
+async def create_comment(Publicacionid: str , user: _user.User, db: _asyncio.AsyncSession, comment: str):
 
     # Verificar si la publicación existe
-    publicacion = db.query(_models.Publicacion).filter(_models.Publicacion.Publicacionid == Publicacionid).first()
+    publicacion = await db.scalar(
+        _sql.select(_models.Publicacion.Publicacionid)
+        .filter(_models.Publicacion.Publicacionid == Publicacionid, _models.Publicacion.activo)
+    )
     if publicacion is None:
         raise HTTPException(status_code=404, detail="Publication not found")
 
@@ -18,42 +27,63 @@ async def create_comment(Publicacionid: str , user: _user.User, db: _orm.Session
     )
 
     db.add(comment_obj)
-    db.commit()
-    db.refresh(comment_obj)
+    await _stats.incrementar(db, total_comentarios=1)
+    await db.commit()
+    await db.refresh(comment_obj)
 
     return comment_obj
 
-async def get_comments_by_me(user: _user.User, db: _orm.Session):
-    comments = db.query(_models.Comentario).filter(_models.Comentario.Userid == user.Userid).all()
-    if not comments:
+async def get_comments_by_me(user: _user.User, db: _asyncio.AsyncSession, cursor: Optional[str] = None, limit: int = _pagination.DEFAULT_LIMIT):
+    stmt = _sql.select(_models.Comentario).filter(_models.Comentario.Userid == user.Userid, _models.Comentario.activo)
+    comments = await _pagination.paginate(db, stmt, _models.Comentario.fecha_creacion, _models.Comentario.ComentarioId, cursor, limit)
+    if not comments["items"] and cursor is None:
         raise HTTPException(status_code=404, detail="No comments found")
     return comments
 
-async def get_comments_by_user(Userid: str, db: _orm.Session):
-    comments = db.query(_models.Comentario).filter(_models.Comentario.Userid == Userid).all()
-    if not comments:
+async def get_comments_by_user(Userid: str, db: _asyncio.AsyncSession, cursor: Optional[str] = None, limit: int = _pagination.DEFAULT_LIMIT):
+    stmt = _sql.select(_models.Comentario).filter(_models.Comentario.Userid == Userid, _models.Comentario.activo)
+    comments = await _pagination.paginate(db, stmt, _models.Comentario.fecha_creacion, _models.Comentario.ComentarioId, cursor, limit)
+    if not comments["items"] and cursor is None:
         raise HTTPException(status_code=404, detail="No comments found")
     return comments
 
 
-def get_comments_by_publicacion(Publicacionid: str, db: _orm.Session):
-    results = (
-        db.query(_models.Comentario.contenido, _models.User.username)
+async def get_comments_version(Publicacionid: str, db: _asyncio.AsyncSession):
+    total, ultima = (await db.execute(
+        _sql.select(_sql.func.count(_models.Comentario.ComentarioId), _sql.func.max(_models.Comentario.actualiza))
+        .filter(_models.Comentario.Publicacionid == Publicacionid, _models.Comentario.activo)
+    )).one()
+    return (total, ultima), ultima
+
+async def get_comments_by_publicacion(Publicacionid: str, db: _asyncio.AsyncSession, cursor: Optional[str] = None, limit: int = _pagination.DEFAULT_LIMIT):
+    stmt = (
+        _sql.select(
+            _models.Comentario.contenido,
+            _models.User.username,
+            _models.Comentario.fecha_creacion,
+            _models.Comentario.ComentarioId,
+        )
         .join(_models.User, _models.User.Userid == _models.Comentario.Userid)
-        .filter(_models.Comentario.Publicacionid == Publicacionid)
-        .all()
+        .filter(_models.Comentario.Publicacionid == Publicacionid, _models.Comentario.activo)
     )
+    results = await _pagination.paginate(db, stmt, _models.Comentario.fecha_creacion, _models.Comentario.ComentarioId, cursor, limit)
     
-    if not results:
+    if not results["items"] and cursor is None:
         raise HTTPException(status_code=404, detail="No comments found")
     
-    return [
-        {"comentario": contenido, "usuario": username}
-        for contenido, username in results
-    ]
-
-def update_comment(ComentarioId: str, Contenido: str, user: _user.User, db: _orm.Session):
-    comment_db = db.query(_models.Comentario).filter(_models.Comentario.ComentarioId == ComentarioId).first()
+    return {
+        "items": [
+            {"comentario": row.contenido, "usuario": row.username}
+            for row in results["items"]
+        ],
+        "next_cursor": results["next_cursor"],
+    }
+
+async def update_comment(ComentarioId: str, Contenido: str, user: _user.User, db: _asyncio.AsyncSession):
+    comment_db = await db.scalar(
+        _sql.select(_models.Comentario)
+        .filter(_models.Comentario.ComentarioId == ComentarioId, _models.Comentario.activo)
+    )
 
     if comment_db is None:
         raise HTTPException(status_code=404, detail="Comment not found")
@@ -64,21 +94,35 @@ def update_comment(ComentarioId: str, Contenido: str, user: _user.User, db: _orm
 
     comment_db.contenido = Contenido
 
-    db.commit()
-    db.refresh(comment_db)
+    await db.commit()
+    await db.refresh(comment_db)
 
     return comment_db
 
-def delete_comment(ComentarioId: str, user: _user.User, db: _orm.Session):
-    comment_db = db.query(_models.Comentario).filter(_models.Comentario.ComentarioId == ComentarioId).first()
-
-    if comment_db is None:
-        raise HTTPException(status_code=404, detail="Comment not found")
+async def delete_comment(ComentarioId: str, user: _user.User, db: _asyncio.AsyncSession):
+    # borrado lógico: la fila la elimina después services/purge.py
+    borrado = await db.scalar(
+        _sql.update(_models.Comentario)
+        .where(
+            _models.Comentario.ComentarioId == ComentarioId,
+            _models.Comentario.Userid == user.Userid,
+            _models.Comentario.activo,
+        )
+        .values(activo=False, actualiza=_dt.datetime.utcnow())
+        .returning(_models.Comentario.ComentarioId)
+        .execution_options(synchronize_session=False)
+    )
 
-    if user.Userid != comment_db.Userid:
+    if borrado is None:
+        Userid = await db.scalar(
+            _sql.select(_models.Comentario.Userid)
+            .filter(_models.Comentario.ComentarioId == ComentarioId, _models.Comentario.activo)
+        )
+        if Userid is None:
+            raise HTTPException(status_code=404, detail="Comment not found")
         raise HTTPException(status_code=403, detail="You do not have permission to delete this comment")
 
-    db.delete(comment_db)
-    db.commit()
+    await _stats.incrementar(db, total_comentarios=-1)
+    await db.commit()
 
     return {"detail": "Comment deleted"}
\ No newline at end of file
@@ -0,0 +1,229 @@
+import os
+import zlib
+from typing import Optional
+
+from dotenv import load_dotenv
+from fastapi.concurrency import run_in_threadpool
+
+import services.metrics as _metrics
+
+# brotli y zstandard están en requirements.txt, pero siguen siendo opcionales:
+# si no están instalados solo se negocia gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+load_dotenv()
+
+# respuestas más pequeñas no compensan la cabecera ni la CPU
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+ZSTD_LEVEL = int(os.getenv("COMPRESSION_ZSTD_LEVEL", "3"))
+# cuerpos más grandes se comprimen en el threadpool para no bloquear el event loop
+_THREADPOOL_SIZE = 256 * 1024
+
+_COMPRIMIBLES = (
+    "text/",
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "application/xml",
+    "application/x-tar",
+    "image/svg+xml",
+)
+
+
+class _Gzip:
+    def __init__(self):
+        self._c = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._c.compress(data)
+
+    def flush(self) -> bytes:
+        return self._c.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._c.flush(zlib.Z_FINISH)
+
+class _Brotli:
+    def __init__(self):
+        self._c = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._c.process(data)
+
+    def flush(self) -> bytes:
+        return self._c.flush()
+
+    def finish(self) -> bytes:
+        return self._c.finish()
+
+class _Zstd:
+    def __init__(self):
+        self._c = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._c.compress(data)
+
+    def flush(self) -> bytes:
+        return self._c.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self._c.flush()
+
+# en orden de preferencia cuando el cliente no distingue con q
+ENCODINGS = {}
+if zstandard is not None:
+    ENCODINGS["zstd"] = _Zstd
+if brotli is not None:
+    ENCODINGS["br"] = _Brotli
+ENCODINGS["gzip"] = _Gzip
+
+
+def _calidades(accept_encoding: str) -> dict:
+    calidades = {}
+    for parte in accept_encoding.split(","):
+        nombre, _, parametros = parte.strip().partition(";")
+        q = 1.0
+        parametro = parametros.strip()
+        if parametro.startswith("q="):
+            try:
+                q = float(parametro[2:])
+            except ValueError:
+                q = 0.0
+        if nombre:
+            calidades[nombre.strip().lower()] = q
+    return calidades
+
+def negotiate(accept_encoding: Optional[str], disponibles=None) -> Optional[str]:
+    # La codificación con mayor q entre las disponibles; a igual q, la primera de ENCODINGS
+    if not accept_encoding:
+        return None
+    calidades = _calidades(accept_encoding)
+    comodin = calidades.get("*", 0.0)
+    mejor, mejor_q = None, 0.0
+    for nombre in disponibles or ENCODINGS:
+        q = calidades.get(nombre, comodin)
+        if q > mejor_q:
+            mejor, mejor_q = nombre, q
+    return mejor
+
+def _comprimible(content_type: str) -> bool:
+    content_type = content_type.split(";", 1)[0].strip().lower()
+    return content_type.startswith(_COMPRIMIBLES) or content_type.endswith(("+json", "+xml"))
+
+
+async def _aplicar(funcion, data: bytes):
+    if len(data) > _THREADPOOL_SIZE:
+        return await run_in_threadpool(funcion, data)
+    return funcion(data)
+
+
+class CompressionMiddleware:
+    # Comprime las respuestas según Accept-Encoding (zstd, br o gzip). Las que
+    # llegan en un solo bloque se comprimen enteras si superan min_size; las
+    # respuestas en streaming se comprimen bloque a bloque con un flush tras
+    # cada uno, así el cliente recibe los datos a medida que se generan.
+    def __init__(self, app, min_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.min_size = min_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope["headers"])
+        encoding = negotiate(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        # sin pathsend, FileResponse envía el cuerpo por bloques y se puede comprimir
+        extensions = scope.get("extensions") or {}
+        if "http.response.pathsend" in extensions:
+            scope = {**scope, "extensions": {k: v for k, v in extensions.items() if k != "http.response.pathsend"}}
+
+        inicio = None
+        compresor = None
+        entrada = salida = 0
+
+        async def send_comprimido(message):
+            nonlocal inicio, compresor, entrada, salida
+            tipo = message["type"]
+
+            if tipo == "http.response.start":
+                inicio = message
+                return
+
+            if tipo != "http.response.body":
+                # otro tipo de mensaje: se deja la respuesta como venía
+                if inicio is not None:
+                    await send(inicio)
+                    inicio = None
+                return await send(message)
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if compresor is None:
+                cabeceras = [(k.lower(), v) for k, v in inicio["headers"]]
+                nombres = {k for k, _ in cabeceras}
+                content_type = next((v.decode("latin-1") for k, v in cabeceras if k == b"content-type"), "")
+                if (
+                    inicio["status"] < 200
+                    or inicio["status"] in (204, 206, 304)
+                    or b"content-encoding" in nombres
+                    or b"content-range" in nombres
+                    or not _comprimible(content_type)
+                    or (not more_body and len(body) < self.min_size)
+                ):
+                    await send(inicio)
+                    inicio = None
+                    await send(message)
+                    # a partir de aquí todo pasa sin tocar
+                    compresor = False
+                    return
+
+                nuevas = []
+                # puede venir más de una cabecera Vary: se juntan todos sus
+                # valores, sin repetir, y se añade Accept-Encoding
+                vary = []
+                for k, v in cabeceras:
+                    if k == b"content-length":
+                        continue
+                    if k == b"etag" and not v.startswith(b"W/"):
+                        # otra representación: el ETag fuerte ya no identifica estos bytes
+                        v = b"W/" + v
+                    if k == b"vary":
+                        vary.extend(c.strip() for c in v.split(b",") if c.strip())
+                        continue
+                    nuevas.append((k, v))
+                nuevas.append((b"content-encoding", encoding.encode("latin-1")))
+                vary.append(b"Accept-Encoding")
+                vistos = set()
+                vary = [c for c in vary if not (c.lower() in vistos or vistos.add(c.lower()))]
+                nuevas.append((b"vary", b"*" if b"*" in vary else b", ".join(vary)))
+                await send({**inicio, "headers": nuevas})
+                inicio = None
+                compresor = ENCODINGS[encoding]()
+
+            if compresor is False:
+                return await send(message)
+
+            entrada += len(body)
+            if more_body:
+                datos = await _aplicar(lambda b: compresor.compress(b) + compresor.flush(), body)
+            else:
+                datos = await _aplicar(lambda b: compresor.compress(b) + compresor.finish(), body)
+            salida += len(datos)
+            if not more_body:
+                _metrics.observe_compression(encoding, entrada, salida)
+            await send({"type": "http.response.body", "body": datos, "more_body": more_body})
+
+        await self.app(scope, receive, send_comprimido)
@@ -1,13 +1,11 @@
 import psycopg2
 import database as _database
 import models as _models
+import services.migrations as _migrations
 
 def create_database():
-    return _database.Base.metadata.create_all(bind=_database.engine)
+    return _migrations.upgrade()
 
-def get_db():
-    db = _database.SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
\ No newline at end of file
+async def get_db():
+    async with _database.AsyncSessionLocal() as db:
+        yield db
\ No newline at end of file
@@ -0,0 +1,297 @@
+import base64
+import datetime as _dt
+import json
+import os
+import posixpath
+import re
+import tarfile
+import tempfile
+import time
+import uuid as _uuid
+import zipfile
+
+import sqlalchemy as _sql
+from dotenv import load_dotenv
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+
+import database as _database
+import models as _models
+import schemas.user as _user
+import services.storage as _storage
+
+load_dotenv()
+
+# Exportación de todo el contenido de un usuario (snippets, publicaciones y
+# comentarios) como tar, zip o NDJSON. Las filas se leen con un cursor del
+# servidor (yield_per) y la salida se envía a medida que se genera, así que
+# la memoria no depende del número de snippets.
+EXPORT_YIELD_PER = int(os.getenv("EXPORT_YIELD_PER", "1000"))
+# Los snippets se leen y empaquetan por lotes, en una sola llamada al
+# threadpool por lote: hasta EXPORT_BATCH_SIZE filas o EXPORT_BATCH_BYTES de
+# contenido, lo que llegue antes (un snippet más grande va solo).
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "200"))
+EXPORT_BATCH_BYTES = int(os.getenv("EXPORT_BATCH_BYTES", str(4 * 1024 * 1024)))
+# metadatos de los archivos tar/zip: en memoria hasta este tamaño, después a disco
+_SPOOL_SIZE = 1024 * 1024
+
+FORMATOS = {
+    "tar": "application/x-tar",
+    "zip": "application/zip",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def _json_default(valor):
+    if isinstance(valor, (_dt.datetime, _dt.date)):
+        return valor.isoformat()
+    if isinstance(valor, _uuid.UUID):
+        return str(valor)
+    raise TypeError(f"Object of type {type(valor).__name__} is not JSON serializable")
+
+def _linea(registro: dict) -> bytes:
+    return json.dumps(registro, default=_json_default, ensure_ascii=False).encode("utf-8") + b"\n"
+
+
+def _snippets_stmt(Userid):
+    return (
+        _sql.select(
+            _models.Snippet.Snippetid,
+            _models.Snippet.Titulo,
+            _models.Snippet.Lenguaje,
+            _models.Snippet.descripcion,
+            _models.Snippet.nombre_archivo,
+            _models.Snippet.tipo_contenido,
+            _models.Snippet.tamano,
+            _models.Snippet.hash_contenido,
+            _models.Snippet.fecha_creacion,
+            _models.Snippet.actualiza,
+            _models.Snippet.activo,
+            _models.Snippet.snippet,
+        )
+        .filter(_models.Snippet.Userid == Userid, _models.Snippet.activo)
+        .order_by(_models.Snippet.fecha_creacion, _models.Snippet.Snippetid)
+    )
+
+def _publicaciones_stmt(Userid):
+    return (
+        _sql.select(
+            _models.Publicacion.Publicacionid,
+            _models.Publicacion.SnippetId,
+            _models.Publicacion.titulo,
+            _models.Publicacion.contenido,
+            _models.Publicacion.fecha_creacion,
+            _models.Publicacion.actualiza,
+            _models.Publicacion.activo,
+        )
+        .filter(_models.Publicacion.Userid == Userid, _models.Publicacion.activo)
+        .order_by(_models.Publicacion.fecha_creacion, _models.Publicacion.Publicacionid)
+    )
+
+def _comentarios_stmt(Userid):
+    return (
+        _sql.select(
+            _models.Comentario.ComentarioId,
+            _models.Comentario.Publicacionid,
+            _models.Comentario.contenido,
+            _models.Comentario.fecha_creacion,
+            _models.Comentario.actualiza,
+            _models.Comentario.activo,
+        )
+        .filter(_models.Comentario.Userid == Userid, _models.Comentario.activo)
+        .order_by(_models.Comentario.fecha_creacion, _models.Comentario.ComentarioId)
+    )
+
+async def _filas(conn, stmt):
+    resultado = await conn.stream(stmt.execution_options(yield_per=EXPORT_YIELD_PER))
+    async for fila in resultado.mappings():
+        yield dict(fila)
+
+async def _lotes(conn, stmt):
+    lote, tamano = [], 0
+    async for fila in _filas(conn, stmt):
+        if lote and (len(lote) >= EXPORT_BATCH_SIZE or tamano + (fila["tamano"] or 0) > EXPORT_BATCH_BYTES):
+            yield lote
+            lote, tamano = [], 0
+        lote.append(fila)
+        tamano += fila["tamano"] or 0
+    if lote:
+        yield lote
+
+def _contenido(fila: dict) -> bytes:
+    legado = fila.pop("snippet")
+    if fila["hash_contenido"]:
+        return _storage.get_store().read(fila["hash_contenido"])
+    return legado or b""
+
+def _ruta(fila: dict) -> str:
+    # el nombre viene del usuario: sin directorios ni caracteres de control
+    nombre = posixpath.basename((fila["nombre_archivo"] or fila["Titulo"] or "").replace("\\", "/"))
+    nombre = "".join(c for c in nombre if c.isprintable()).strip(". ") or "snippet"
+    return f"snippets/{fila['Snippetid']}/{nombre}"
+
+
+# Formatos de archivo. Cada uno produce bytes a medida que se le añaden
+# miembros; ninguno necesita volver atrás sobre lo ya enviado.
+class _TarSalida:
+    def _cabecera(self, nombre: str, tamano: int, fecha) -> bytes:
+        info = tarfile.TarInfo(nombre)
+        info.size = tamano
+        info.mtime = fecha.replace(tzinfo=_dt.timezone.utc).timestamp() if fecha else time.time()
+        info.mode = 0o644
+        return info.tobuf(format=tarfile.PAX_FORMAT)
+
+    def _relleno(self, tamano: int) -> bytes:
+        return b"\0" * (-tamano % tarfile.BLOCKSIZE)
+
+    def agregar(self, nombre: str, datos: bytes, fecha=None):
+        return [self._cabecera(nombre, len(datos), fecha), datos, self._relleno(len(datos))]
+
+    def agregar_archivo(self, nombre: str, archivo, tamano: int):
+        yield self._cabecera(nombre, tamano, None)
+        while True:
+            chunk = archivo.read(_storage.CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+        yield self._relleno(tamano)
+
+    def cerrar(self):
+        return [b"\0" * (2 * tarfile.BLOCKSIZE)]
+
+
+class _Buffer:
+    # destino sin seek para zipfile: obliga a usar descriptores de datos y
+    # deja recoger lo escrito después de cada miembro
+    def __init__(self):
+        self.partes = []
+        self.posicion = 0
+
+    def write(self, datos):
+        self.partes.append(bytes(datos))
+        self.posicion += len(datos)
+        return len(datos)
+
+    def tell(self):
+        return self.posicion
+
+    def flush(self):
+        pass
+
+    def vaciar(self):
+        partes, self.partes = self.partes, []
+        return partes
+
+
+class _ZipSalida:
+    def __init__(self):
+        self.buffer = _Buffer()
+        self.zip = zipfile.ZipFile(self.buffer, mode="w", compression=zipfile.ZIP_DEFLATED, allowZip64=True)
+
+    def _info(self, nombre: str, fecha):
+        info = zipfile.ZipInfo(nombre, date_time=(fecha or _dt.datetime.utcnow()).timetuple()[:6])
+        info.compress_type = zipfile.ZIP_DEFLATED
+        return info
+
+    def agregar(self, nombre: str, datos: bytes, fecha=None):
+        self.zip.writestr(self._info(nombre, fecha), datos)
+        return self.buffer.vaciar()
+
+    def agregar_archivo(self, nombre: str, archivo, tamano: int):
+        with self.zip.open(self._info(nombre, None), mode="w", force_zip64=True) as destino:
+            while True:
+                chunk = archivo.read(_storage.CHUNK_SIZE)
+                if not chunk:
+                    break
+                destino.write(chunk)
+                yield from self.buffer.vaciar()
+        yield from self.buffer.vaciar()
+
+    def cerrar(self):
+        self.zip.close()
+        return self.buffer.vaciar()
+
+
+def _lineas_snippets(lote: list) -> bytes:
+    lineas = []
+    for fila in lote:
+        contenido = _contenido(fila)
+        try:
+            fila["contenido"] = contenido.decode("utf-8")
+        except UnicodeDecodeError:
+            fila["contenido_base64"] = base64.b64encode(contenido).decode("ascii")
+        lineas.append(_linea({"tipo": "snippet", **fila}))
+    return b"".join(lineas)
+
+def _miembros_snippets(salida, lote: list, indice) -> bytes:
+    partes = []
+    for fila in lote:
+        ruta = _ruta(fila)
+        partes.extend(salida.agregar(ruta, _contenido(fila), fila["actualiza"] or fila["fecha_creacion"]))
+        indice.write(_linea({**fila, "archivo": ruta}))
+    return b"".join(partes)
+
+async def _ndjson(conn, user: _user.User):
+    async for lote in _lotes(conn, _snippets_stmt(user.Userid)):
+        yield await run_in_threadpool(_lineas_snippets, lote)
+    async for fila in _filas(conn, _publicaciones_stmt(user.Userid)):
+        yield _linea({"tipo": "publicacion", **fila})
+    async for fila in _filas(conn, _comentarios_stmt(user.Userid)):
+        yield _linea({"tipo": "comentario", **fila})
+
+async def _archivo(conn, user: _user.User, salida):
+    # Los contenidos van como miembros sueltos; los metadatos se acumulan en
+    # temporales (a disco si crecen) y se añaden al final como NDJSON.
+    indices = {
+        nombre: tempfile.SpooledTemporaryFile(max_size=_SPOOL_SIZE)
+        for nombre in ("snippets.ndjson", "publicaciones.ndjson", "comentarios.ndjson")
+    }
+    try:
+        async for lote in _lotes(conn, _snippets_stmt(user.Userid)):
+            yield await run_in_threadpool(_miembros_snippets, salida, lote, indices["snippets.ndjson"])
+        async for fila in _filas(conn, _publicaciones_stmt(user.Userid)):
+            indices["publicaciones.ndjson"].write(_linea(fila))
+        async for fila in _filas(conn, _comentarios_stmt(user.Userid)):
+            indices["comentarios.ndjson"].write(_linea(fila))
+
+        for nombre, indice in indices.items():
+            tamano = indice.tell()
+            indice.seek(0)
+            miembro = salida.agregar_archivo(nombre, indice, tamano)
+            while True:
+                chunk = await run_in_threadpool(next, miembro, None)
+                if chunk is None:
+                    break
+                yield chunk
+        for chunk in await run_in_threadpool(salida.cerrar):
+            yield chunk
+    finally:
+        for indice in indices.values():
+            indice.close()
+
+async def _exportar(user: _user.User, formato: str):
+    # Conexión propia (no la sesión de la petición, que se cierra antes de que
+    # termine la respuesta) y una sola transacción REPEATABLE READ de solo
+    # lectura: las tres consultas ven la misma instantánea.
+    async with _database.async_engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="REPEATABLE READ", postgresql_readonly=True)
+        async with conn.begin():
+            if formato == "ndjson":
+                cuerpo = _ndjson(conn, user)
+            else:
+                cuerpo = _archivo(conn, user, _TarSalida() if formato == "tar" else _ZipSalida())
+            async for chunk in cuerpo:
+                if chunk:
+                    yield chunk
+
+def export_user(user: _user.User, formato: str = "tar"):
+    fecha = _dt.datetime.utcnow().strftime("%Y%m%d")
+    nombre = f"snippethub-{re.sub(r'[^A-Za-z0-9._-]', '_', user.username)}-{fecha}.{formato}"
+    return StreamingResponse(
+        _exportar(user, formato),
+        media_type=FORMATOS[formato],
+        headers={
+            "Content-Disposition": f'attachment; filename="{nombre}"',
+            "Cache-Control": "private, no-store",
+        },
+    )
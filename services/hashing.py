@@ -0,0 +1,39 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+from fastapi import HTTPException
+
+import models as _models
+
+load_dotenv()
+
+# bcrypt es CPU puro: se ejecuta en un pool propio para no bloquear el event loop.
+# Solo se admiten HASH_WORKERS trabajos en curso más HASH_QUEUE_SIZE en espera;
+# por encima de eso se responde 503 en lugar de encolar sin límite.
+HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+HASH_QUEUE_SIZE = int(os.getenv("PASSWORD_HASH_QUEUE_SIZE", "32"))
+
+_executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="bcrypt")
+_pendientes = 0
+
+async def _run(fn, *args):
+    global _pendientes
+
+    if _pendientes >= HASH_WORKERS + HASH_QUEUE_SIZE:
+        raise HTTPException(status_code=503, detail="Server busy, try again later", headers={
+            "Retry-After": "1"
+        })
+
+    _pendientes += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_executor, fn, *args)
+    finally:
+        _pendientes -= 1
+
+async def hash_password(password: str) -> str:
+    return await _run(_models.pwd_context.hash, password)
+
+async def verify_password(password: str, hashed_password: str) -> bool:
+    return await _run(_models.pwd_context.verify, password, hashed_password)
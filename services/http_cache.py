@@ -0,0 +1,70 @@
+import datetime as _dt
+import hashlib
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+
+from fastapi import Request, Response
+
+# Políticas de Cache-Control por tipo de ruta: siempre se revalida, pero el
+# cliente (o un proxy, si es pública) puede reutilizar el cuerpo con un 304.
+PUBLIC = "public, max-age=0, must-revalidate"
+PRIVATE = "private, no-cache"
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    # If-None-Match usa comparación débil: W/"x" equivale a "x"
+    if not if_none_match:
+        return False
+    etag = etag.removeprefix("W/")
+    for candidato in if_none_match.split(","):
+        candidato = candidato.strip()
+        if candidato == "*" or candidato.removeprefix("W/") == etag:
+            return True
+    return False
+
+def _http_date(fecha: _dt.datetime) -> str:
+    if fecha.tzinfo is None:
+        fecha = fecha.replace(tzinfo=_dt.timezone.utc)
+    return format_datetime(fecha, usegmt=True)
+
+def _modified_since(if_modified_since: str, last_modified: _dt.datetime) -> bool:
+    try:
+        desde = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return True
+    if last_modified.tzinfo is None:
+        last_modified = last_modified.replace(tzinfo=_dt.timezone.utc)
+    # las fechas HTTP tienen resolución de segundos
+    return last_modified.replace(microsecond=0) > desde
+
+def conditional(request: Request, response: Response, version, last_modified: Optional[_dt.datetime] = None, cache_control: str = PRIVATE) -> Optional[Response]:
+    # version es cualquier tupla que cambie cuando cambian las filas que forman
+    # la respuesta (actualiza, conteos...). Devuelve un 304 listo para enviar si
+    # el cliente ya tiene esta versión; si no, deja los validadores en response.
+    if version is None:
+        return None
+
+    firma = repr((request.url.path, request.url.query, version)).encode("utf-8")
+    headers = {
+        "ETag": f'W/"{hashlib.sha1(firma).hexdigest()}"',
+        "Cache-Control": cache_control,
+    }
+    if last_modified is not None:
+        headers["Last-Modified"] = _http_date(last_modified)
+    if cache_control == PRIVATE:
+        headers["Vary"] = "Authorization"
+
+    if_none_match = request.headers.get("if-none-match")
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_none_match is not None:
+        no_modificado = etag_matches(if_none_match, headers["ETag"])
+    elif if_modified_since is not None and last_modified is not None:
+        no_modificado = not _modified_since(if_modified_since, last_modified)
+    else:
+        no_modificado = False
+
+    if no_modificado:
+        return Response(status_code=304, headers=headers)
+
+    response.headers.update(headers)
+    return None
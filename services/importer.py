@@ -0,0 +1,240 @@
+import mimetypes
+import os
+import posixpath
+import tarfile
+import uuid as _uuid
+import zipfile
+from typing import List
+
+import sqlalchemy as _sql
+import sqlalchemy.ext.asyncio as _asyncio
+from dotenv import load_dotenv
+from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
+
+import models as _models
+import schemas.user as _user
+import services.search as _search
+import services.stats as _stats
+import services.storage as _storage
+import services.uploads as _uploads
+
+load_dotenv()
+
+# Importación masiva de snippets: varios archivos sueltos o un .zip/.tar(.gz)
+# por petición. Cada archivo sigue limitado a MAX_UPLOAD_SIZE; el cuerpo
+# completo a IMPORT_MAX_SIZE (UploadLimitMiddleware).
+IMPORT_MAX_SIZE = int(os.getenv("IMPORT_MAX_SIZE", str(200 * 1024 * 1024)))
+IMPORT_MAX_ITEMS = int(os.getenv("IMPORT_MAX_ITEMS", "10000"))
+# un lote se inserta al llegar a cualquiera de los dos límites
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "500"))
+IMPORT_BATCH_BYTES = int(os.getenv("IMPORT_BATCH_BYTES", str(32 * 1024 * 1024)))
+
+LENGUAJES = {
+    ".py": "Python",
+    ".js": "JavaScript",
+    ".mjs": "JavaScript",
+    ".jsx": "JavaScript",
+    ".ts": "TypeScript",
+    ".tsx": "TypeScript",
+    ".java": "Java",
+    ".kt": "Kotlin",
+    ".c": "C",
+    ".h": "C",
+    ".cpp": "C++",
+    ".cc": "C++",
+    ".hpp": "C++",
+    ".cs": "C#",
+    ".go": "Go",
+    ".rs": "Rust",
+    ".rb": "Ruby",
+    ".php": "PHP",
+    ".swift": "Swift",
+    ".scala": "Scala",
+    ".dart": "Dart",
+    ".lua": "Lua",
+    ".r": "R",
+    ".sh": "Shell",
+    ".bash": "Shell",
+    ".ps1": "PowerShell",
+    ".sql": "SQL",
+    ".html": "HTML",
+    ".css": "CSS",
+    ".scss": "SCSS",
+    ".json": "JSON",
+    ".yaml": "YAML",
+    ".yml": "YAML",
+    ".toml": "TOML",
+    ".xml": "XML",
+    ".md": "Markdown",
+}
+_NOMBRES = {
+    "Dockerfile": "Dockerfile",
+    "Makefile": "Makefile",
+}
+LENGUAJE_DESCONOCIDO = "Text"
+
+_TAR = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+
+
+def inferir(nombre: str):
+    # Titulo = nombre del archivo sin extensión; Lenguaje por extensión
+    base = posixpath.basename(nombre.replace("\\", "/"))
+    raiz, extension = posixpath.splitext(base)
+    lenguaje = _NOMBRES.get(base) or LENGUAJES.get(extension.lower(), LENGUAJE_DESCONOCIDO)
+    return raiz or base, lenguaje
+
+def _oculto(nombre: str) -> bool:
+    # metadatos que añaden los compresores (__MACOSX, .DS_Store, .git/...)
+    return any(parte.startswith(".") or parte == "__MACOSX" for parte in nombre.replace("\\", "/").split("/") if parte)
+
+def _tipo(nombre: str):
+    return mimetypes.guess_type(nombre)[0] or "text/plain"
+
+
+# Recorrido síncrono de la subida. Produce (nombre, tipo, contenido, error) por
+# archivo; contenido None sin error significa omitido. Los .tar se leen en modo
+# stream ("r|*") y los .zip desde su índice central sobre el archivo temporal
+# de la subida, así que en memoria solo hay un miembro a la vez, acotado por
+# MAX_UPLOAD_SIZE.
+def _leer(fuente, tamano: int = None):
+    if tamano is not None and tamano > _uploads.MAX_UPLOAD_SIZE:
+        return None
+    contenido = fuente.read(_uploads.MAX_UPLOAD_SIZE + 1)
+    return None if len(contenido) > _uploads.MAX_UPLOAD_SIZE else contenido
+
+def _demasiado_grande():
+    return f"File too large (max {_uploads.MAX_UPLOAD_SIZE} bytes)"
+
+def _miembros_zip(upload: UploadFile):
+    try:
+        archivo = zipfile.ZipFile(upload.file)
+    except zipfile.BadZipFile:
+        yield upload.filename, None, None, "Invalid zip archive"
+        return
+    with archivo:
+        for info in archivo.infolist():
+            if info.is_dir():
+                continue
+            if _oculto(info.filename):
+                yield info.filename, None, None, None
+                continue
+            try:
+                with archivo.open(info) as fuente:
+                    contenido = _leer(fuente, info.file_size)
+            except (zipfile.BadZipFile, RuntimeError, NotImplementedError) as error:
+                yield info.filename, None, None, str(error) or "Unreadable zip member"
+                continue
+            if contenido is None:
+                yield info.filename, None, None, _demasiado_grande()
+                continue
+            yield info.filename, _tipo(info.filename), contenido, None
+
+def _miembros_tar(upload: UploadFile):
+    try:
+        with tarfile.open(fileobj=upload.file, mode="r|*") as archivo:
+            for miembro in archivo:
+                # solo archivos regulares: enlaces y dispositivos no son snippets
+                if not miembro.isfile():
+                    continue
+                if _oculto(miembro.name):
+                    yield miembro.name, None, None, None
+                    continue
+                contenido = _leer(archivo.extractfile(miembro), miembro.size)
+                if contenido is None:
+                    yield miembro.name, None, None, _demasiado_grande()
+                    continue
+                yield miembro.name, _tipo(miembro.name), contenido, None
+    except (tarfile.TarError, EOFError, OSError):
+        yield upload.filename, None, None, "Invalid or truncated tar archive"
+
+def _miembros(files: List[UploadFile]):
+    for upload in files:
+        nombre = upload.filename or ""
+        minusculas = nombre.lower()
+        if minusculas.endswith(".zip"):
+            yield from _miembros_zip(upload)
+        elif minusculas.endswith(_TAR):
+            yield from _miembros_tar(upload)
+        else:
+            contenido = _leer(upload.file)
+            if contenido is None:
+                yield nombre, None, None, _demasiado_grande()
+                continue
+            yield nombre, upload.content_type or _tipo(nombre), contenido, None
+
+
+async def _guardar_lote(db: _asyncio.AsyncSession, lote: list):
+    blobs = await _storage.save_blobs(db, [contenido for _, contenido in lote])
+    resumenes = await run_in_threadpool(lambda: [_storage.resumir(contenido).columnas() for _, contenido in lote])
+    filas = []
+    for (fila, _), (hash_contenido, _), resumen in zip(lote, blobs, resumenes):
+        fila["hash_contenido"] = hash_contenido
+        fila.update(resumen)
+        filas.append(fila)
+    await db.execute(_sql.insert(_models.Snippet), filas)
+    await _search.index_batch(db, {fila["Snippetid"]: contenido for fila, contenido in lote})
+
+async def import_snippets(user: _user.User, files: List[UploadFile], db: _asyncio.AsyncSession):
+    # Todo el lote va en una transacción: o se importan todos los archivos
+    # válidos o ninguno. Los inválidos se informan y no cancelan el resto.
+    resultados = []
+    lote = []
+    bytes_lote = 0
+    creados = 0
+    miembros = _miembros(files)
+
+    while True:
+        miembro = await run_in_threadpool(next, miembros, None)
+        if miembro is None:
+            break
+        nombre, tipo, contenido, error = miembro
+        if error:
+            resultados.append({"archivo": nombre, "estado": "error", "detalle": error})
+            continue
+        if contenido is None:
+            resultados.append({"archivo": nombre, "estado": "omitido"})
+            continue
+        if creados + len(lote) >= IMPORT_MAX_ITEMS:
+            resultados.append({"archivo": nombre, "estado": "error", "detalle": f"Too many files (max {IMPORT_MAX_ITEMS})"})
+            break
+
+        Titulo, Lenguaje = inferir(nombre)
+        fila = {
+            "Snippetid": _uuid.uuid4(),
+            "Titulo": Titulo,
+            "Userid": user.Userid,
+            "descripcion": nombre,
+            "Lenguaje": Lenguaje,
+            "tipo_contenido": tipo,
+            "nombre_archivo": posixpath.basename(nombre.replace("\\", "/")),
+        }
+        lote.append((fila, contenido))
+        bytes_lote += len(contenido)
+        resultados.append({
+            "archivo": nombre,
+            "estado": "creado",
+            "Snippetid": fila["Snippetid"],
+            "Titulo": Titulo,
+            "Lenguaje": Lenguaje,
+            "tamano": len(contenido),
+        })
+
+        if len(lote) >= IMPORT_BATCH_SIZE or bytes_lote >= IMPORT_BATCH_BYTES:
+            await _guardar_lote(db, lote)
+            creados += len(lote)
+            lote, bytes_lote = [], 0
+
+    if lote:
+        await _guardar_lote(db, lote)
+        creados += len(lote)
+
+    if creados:
+        await _stats.incrementar(db, total_snippets=creados, snippets_aprobados=creados)
+        await db.commit()
+
+    return {
+        "creados": creados,
+        "errores": sum(1 for r in resultados if r["estado"] == "error"),
+        "resultados": resultados,
+    }
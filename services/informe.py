@@ -1,37 +1,42 @@
-from models import User, Snippet, Publicacion, Comentario
-import sqlalchemy.orm as _orm
-from sqlalchemy import func 
+import asyncio
+import datetime as _dt
+import hashlib
+import json
+import uuid as _uuid
+from collections import OrderedDict
+
+import sqlalchemy.ext.asyncio as _asyncio
 import schemas.user as _user
+import services.stats as _stats
 
 from dotenv import load_dotenv
 import os
-from openai import OpenAI
+from openai import AsyncOpenAI
 
 load_dotenv()
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+INFORME_MODEL = os.getenv("INFORME_MODEL", "gpt-4.1-nano")
+INFORME_CACHE_SIZE = int(os.getenv("INFORME_CACHE_SIZE", "128"))
+INFORME_MAX_JOBS = int(os.getenv("INFORME_MAX_JOBS", "100"))
 
-def generar_informe(db: _orm.Session, user: _user.User):
+# El cliente es inyectable: cualquier objeto con responses.create(model, input)
+# asíncrono que devuelva algo con output_text (p. ej. un stub local).
+_client = None
 
-    cantidad_usuarios = db.query(func.count(User.Userid)).scalar()
-    cantidad_snippets = db.query(func.count(Snippet.Snippetid)).scalar()
-    cantidad_publicaciones = db.query(func.count(Publicacion.Publicacionid)).scalar()
-    cantidad_comentarios = db.query(func.count(Comentario.ComentarioId)).scalar()
-    cantidad_usuarios_activos = db.query(func.count(User.Userid)).filter(User.activo == True).scalar()
-    cantidad_snippets_aprobados = db.query(func.count(Snippet.Snippetid)).filter(Snippet.activo == True).scalar()
+def get_client():
+    global _client
+    if _client is None:
+        _client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    return _client
+
+def set_client(client):
+    global _client
+    _client = client
+    _textos.clear()
 
-    stats = {
-        "total_usuarios": cantidad_usuarios,
-        "total_snippets": cantidad_snippets,
-        "total_publicaciones": cantidad_publicaciones,
-        "total_comentarios": cantidad_comentarios,
-        "snippets_aprobados": cantidad_snippets_aprobados,
-        "usuarios_activos": cantidad_usuarios_activos,
-    }
 
-    barras = client.responses.create(
-        model="gpt-4.1-nano",
-        input=f"""
+def _prompt_barras(stats: dict) -> str:
+    return f"""
             Actúa como un analista de datos experto y objetivo. A continuación, te proporcionaré datos destinados a una gráfica de barras (o la descripción de una). Tu tarea es realizar un análisis conciso y altamente profesional de la información que esta gráfica representaría, destacando:
 
             1.  **Comparaciones Clave:** Las diferencias más notables en magnitud entre las categorías/barras.
@@ -46,11 +51,9 @@ def generar_informe(db: _orm.Session, user: _user.User):
             ESTADISTICAS: {stats}
 
         """
-    )
 
-    torta = client.responses.create(
-        model="gpt-4.1-nano",
-        input=f"""
+def _prompt_torta(stats: dict) -> str:
+    return f"""
             Actúa como un analista de datos experto y objetivo. A continuación, te proporcionaré datos destinados a una gráfica de torta/pastel (o la descripción de una). 
             Tu tarea es realizar un análisis conciso y altamente profesional de la información que esta gráfica representaría, enfocándote en:
 
@@ -67,16 +70,102 @@ def generar_informe(db: _orm.Session, user: _user.User):
             ESTADISTICAS: {stats}
 
         """
+
+
+# Textos generados por hash de stats: mientras los números no cambien no se
+# vuelve a llamar al modelo. Las peticiones simultáneas con las mismas stats
+# comparten la misma tarea en curso.
+_textos = OrderedDict()
+_en_curso = {}
+
+def _stats_key(stats: dict) -> str:
+    return hashlib.sha256(json.dumps(stats, sort_keys=True).encode("utf-8")).hexdigest()
+
+async def _generar_textos(stats: dict) -> dict:
+    client = get_client()
+    barras, torta = await asyncio.gather(
+        client.responses.create(model=INFORME_MODEL, input=_prompt_barras(stats)),
+        client.responses.create(model=INFORME_MODEL, input=_prompt_torta(stats)),
     )
+    return {"barras": barras.output_text, "torta": torta.output_text}
+
+def _guardar_textos(key: str, tarea: asyncio.Future):
+    _en_curso.pop(key, None)
+    if tarea.cancelled() or tarea.exception() is not None:
+        return
+    _textos[key] = tarea.result()
+    while len(_textos) > INFORME_CACHE_SIZE:
+        _textos.popitem(last=False)
+
+async def analizar(stats: dict) -> dict:
+    key = _stats_key(stats)
+    if key in _textos:
+        _textos.move_to_end(key)
+        return _textos[key]
 
+    tarea = _en_curso.get(key)
+    if tarea is None:
+        tarea = asyncio.ensure_future(_generar_textos(stats))
+        _en_curso[key] = tarea
+        tarea.add_done_callback(lambda t: _guardar_textos(key, t))
+
+    # shield: si el cliente se desconecta, la generación sigue y queda en caché
+    return await asyncio.shield(tarea)
+
+async def generar_informe(db: _asyncio.AsyncSession, user: _user.User):
+
+    stats = await _stats.leer(db)
 
     return {
-        "total_usuarios": cantidad_usuarios,
-        "total_snippets": cantidad_snippets,
-        "total_publicaciones": cantidad_publicaciones,
-        "total_comentarios": cantidad_comentarios,
-        "snippets_aprobados": cantidad_snippets_aprobados,
-        "usuarios_activos": cantidad_usuarios_activos,
-        "barras": barras.output_text,
-        "torta": torta.output_text
+        **stats,
+        **await analizar(stats),
+    }
+
+
+# Trabajos en segundo plano: las stats se leen al enviar (es O(1)) y solo las
+# llamadas al modelo corren fuera de la petición. Los trabajos viven en memoria
+# del proceso y se conservan los últimos INFORME_MAX_JOBS terminados.
+_jobs = OrderedDict()
+
+def _expirar_jobs():
+    # Solo se descartan trabajos terminados, de más antiguo a más reciente: la
+    # entrada de uno en curso guarda la única referencia a su tarea. Si todos
+    # siguen en curso, se supera el límite hasta que acaben.
+    sobran = len(_jobs) - INFORME_MAX_JOBS
+    for job_id in [job_id for job_id, job in _jobs.items() if job["terminado"] is not None][:max(sobran, 0)]:
+        del _jobs[job_id]
+
+async def _ejecutar(job: dict, stats: dict):
+    try:
+        job["resultado"] = {**stats, **await analizar(stats)}
+        job["estado"] = "completado"
+    except Exception as e:
+        job["estado"] = "error"
+        job["error"] = str(e)
+    job["terminado"] = _dt.datetime.utcnow()
+    job.pop("tarea", None)
+    _expirar_jobs()
+
+async def enviar_informe(db: _asyncio.AsyncSession, user: _user.User) -> dict:
+    stats = await _stats.leer(db)
+
+    job_id = str(_uuid.uuid4())
+    job = _jobs[job_id] = {
+        "job_id": job_id,
+        "estado": "pendiente",
+        "creado": _dt.datetime.utcnow(),
+        "terminado": None,
+        "resultado": None,
+        "error": None,
     }
+    _expirar_jobs()
+
+    # se guarda la referencia para que la tarea no se recolecte antes de terminar
+    job["tarea"] = asyncio.ensure_future(_ejecutar(job, stats))
+    return obtener_job(job_id)
+
+def obtener_job(job_id: str):
+    job = _jobs.get(job_id)
+    if job is None:
+        return None
+    return {clave: valor for clave, valor in job.items() if clave != "tarea"}
@@ -0,0 +1,131 @@
+import argparse
+import asyncio
+import datetime as _dt
+import logging
+import os
+import time
+
+import sqlalchemy as _sql
+import sqlalchemy.ext.asyncio as _asyncio
+from sqlalchemy.dialects import postgresql as _postgresql
+from dotenv import load_dotenv
+
+import database as _database
+import models as _models
+import services.migrations as _migrations
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Ventanas soportadas: días hacia atrás (None = desde siempre)
+VENTANAS = {"all": None, "30d": 30, "7d": 7}
+LEADERBOARD_MAX_K = int(os.getenv("LEADERBOARD_MAX_K", "100"))
+LEADERBOARD_TTL = float(os.getenv("LEADERBOARD_TTL", "30"))
+
+
+# Conteos por usuario y día en ranking_diario, actualizados en la misma
+# transacción que crea o borra la publicación.
+async def registrar(db: _asyncio.AsyncSession, Userid, fecha: _dt.datetime, delta: int):
+    await db.execute(
+        _postgresql.insert(_models.RankingDiario)
+        .values(Userid=Userid, dia=fecha.date(), publicaciones=delta)
+        .on_conflict_do_update(
+            index_elements=[_models.RankingDiario.Userid, _models.RankingDiario.dia],
+            set_={"publicaciones": _models.RankingDiario.publicaciones + delta},
+        )
+    )
+
+
+def _top_stmt(dias, k: int):
+    total = _sql.func.sum(_models.RankingDiario.publicaciones).label("numero_publicaciones")
+    stmt = (
+        _sql.select(_models.User.Userid, _models.User.username, _models.User.full_name, total)
+        .join(_models.User, _models.User.Userid == _models.RankingDiario.Userid)
+        .group_by(_models.User.Userid, _models.User.username, _models.User.full_name)
+        .having(total > 0)
+        .order_by(total.desc(), _models.User.username)
+        .limit(k)
+    )
+    if dias is not None:
+        desde = _dt.datetime.utcnow().date() - _dt.timedelta(days=dias - 1)
+        stmt = stmt.where(_models.RankingDiario.dia >= desde)
+    return stmt
+
+# Top precalculado por ventana: se guarda el top LEADERBOARD_MAX_K y cada
+# lectura solo corta los primeros k. Las lecturas no esperan al recálculo:
+# con el snapshot caducado devuelven el que hay y lanzan uno en segundo plano
+# (uno por ventana, con su propia sesión). Solo la primera lectura de cada
+# ventana, cuando aún no hay snapshot, lo calcula dentro de la petición. El
+# top va como mucho LEADERBOARD_TTL segundos, más lo que tarde el recálculo,
+# por detrás de las publicaciones.
+_snapshots = {}
+_locks = {ventana: asyncio.Lock() for ventana in VENTANAS}
+_refrescos = {}
+
+async def _refrescar(db: _asyncio.AsyncSession, ventana: str):
+    rows = (await db.execute(_top_stmt(VENTANAS[ventana], LEADERBOARD_MAX_K))).all()
+    top = [
+        {
+            "id": r.Userid,
+            "username": r.username,
+            "full_name": r.full_name,
+            "numero_publicaciones": int(r.numero_publicaciones),
+        } for r in rows
+    ]
+    _snapshots[ventana] = (time.monotonic() + LEADERBOARD_TTL, top)
+    return top
+
+async def _refrescar_en_segundo_plano(ventana: str):
+    try:
+        async with _locks[ventana], _database.AsyncSessionLocal() as db:
+            await _refrescar(db, ventana)
+    except Exception:
+        # se sigue sirviendo el snapshot anterior; la próxima lectura reintenta
+        logger.exception("Could not refresh the %s leaderboard", ventana)
+    finally:
+        _refrescos.pop(ventana, None)
+
+async def top(db: _asyncio.AsyncSession, ventana: str = "all", k: int = 5):
+    snapshot = _snapshots.get(ventana)
+    if snapshot is None:
+        async with _locks[ventana]:
+            snapshot = _snapshots.get(ventana)
+            if snapshot is None:
+                return (await _refrescar(db, ventana))[:k]
+    if snapshot[0] <= time.monotonic() and ventana not in _refrescos:
+        _refrescos[ventana] = asyncio.ensure_future(_refrescar_en_segundo_plano(ventana))
+    return snapshot[1][:k]
+
+def invalidate():
+    _snapshots.clear()
+
+
+# Reconstrucción completa desde publicacion (backfill o tras una corrección):
+#   python -m services.leaderboard rebuild
+def rebuild():
+    _migrations.upgrade()
+    with _database.engine.begin() as conn:
+        conn.execute(_sql.text("LOCK TABLE ranking_diario IN EXCLUSIVE MODE"))
+        conn.execute(_sql.delete(_models.RankingDiario))
+        dia = _sql.cast(_models.Publicacion.fecha_creacion, _sql.Date)
+        conn.execute(
+            _sql.insert(_models.RankingDiario).from_select(
+                ["Userid", "dia", "publicaciones"],
+                _sql.select(_models.Publicacion.Userid, dia, _sql.func.count())
+                .where(_models.Publicacion.Userid.is_not(None), _models.Publicacion.activo)
+                .group_by(_models.Publicacion.Userid, dia),
+            )
+        )
+        total = conn.scalar(_sql.select(_sql.func.count()).select_from(_models.RankingDiario))
+    print(f"{total} filas de ranking reconstruidas")
+    return total
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ranking de usuarios por publicaciones")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+    subparsers.add_parser("rebuild", help="Reconstruir los conteos diarios desde publicacion")
+    args = parser.parse_args()
+
+    if args.comando == "rebuild":
+        rebuild()
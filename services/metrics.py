@@ -0,0 +1,287 @@
+import bisect
+import collections
+import contextvars
+import hmac
+import logging
+import os
+import threading
+import time
+
+import sqlalchemy as _sql
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Métricas en proceso: cada worker tiene las suyas; Prometheus suma al
+# recoger /metrics de cada uno.
+
+# una petición con más consultas que esto se registra como posible N+1
+METRICS_N1_THRESHOLD = int(os.getenv("METRICS_N1_THRESHOLD", "20"))
+# si se define, /metrics exige "Authorization: Bearer <METRICS_TOKEN>"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+# límites en segundos, de 1 ms a 10 s
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, valor: float):
+        posicion = bisect.bisect_left(self.buckets, valor)
+        with self._lock:
+            self._counts[posicion] += 1
+            self._sum += valor
+
+    def snapshot(self):
+        # conteos acumulados por límite superior, como los expone Prometheus
+        with self._lock:
+            counts, total = list(self._counts), self._sum
+        acumulado, buckets = 0, {}
+        for limite, n in zip(self.buckets + (float("inf"),), counts):
+            acumulado += n
+            buckets["+Inf" if limite == float("inf") else f"{limite:g}"] = acumulado
+        return {"buckets": buckets, "sum": total, "count": acumulado}
+
+
+# Pools de conexiones (database.py): el estado se lee en vivo del pool del
+# motor; la espera hasta obtener conexión y los timeouts los registra el pool.
+_engines = {}
+_pool_wait = {}
+_pool_timeouts = {}
+
+def register_engine(nombre: str, engine):
+    _engines[nombre] = engine
+    _pool_wait.setdefault(nombre, Histogram())
+    _pool_timeouts.setdefault(nombre, 0)
+    _sql.event.listen(engine, "before_cursor_execute", _antes_de_consulta)
+    _sql.event.listen(engine, "after_cursor_execute", _despues_de_consulta)
+
+def observe_pool_wait(nombre: str, segundos: float, timeout: bool = False):
+    _pool_wait.setdefault(nombre, Histogram()).observe(segundos)
+    if timeout:
+        _pool_timeouts[nombre] = _pool_timeouts.get(nombre, 0) + 1
+
+def pool_stats():
+    resultado = {}
+    for nombre, engine in _engines.items():
+        pool = engine.pool
+        estado = {"wait_seconds": _pool_wait[nombre].snapshot(), "timeouts": _pool_timeouts[nombre]}
+        # solo QueuePool tiene tamaño y desbordamiento (NullPool, StaticPool no)
+        if hasattr(pool, "overflow"):
+            estado.update(
+                size=pool.size(),
+                checked_in=pool.checkedin(),
+                checked_out=pool.checkedout(),
+                # overflow() es negativo mientras no se han abierto todas las del pool base
+                overflow=max(pool.overflow(), 0),
+                max_overflow=pool._max_overflow,
+            )
+        resultado[nombre] = estado
+    return resultado
+
+
+# Compresión de respuestas (services/compression.py): bytes antes y después
+# por codificación, para ver el ahorro de ancho de banda.
+_compresion = collections.defaultdict(lambda: [0, 0])
+
+def observe_compression(encoding: str, entrada: int, salida: int):
+    totales = _compresion[encoding]
+    totales[0] += entrada
+    totales[1] += salida
+
+def compression_stats():
+    return {
+        encoding: {"input_bytes": entrada, "output_bytes": salida, "ratio": round(entrada / salida, 2) if salida else None}
+        for encoding, (entrada, salida) in _compresion.items()
+    }
+
+
+# Peticiones rechazadas por services/admission.py, por clase de ruta y motivo
+# (ip, usuario, concurrencia). No llegan a ninguna ruta: en http_requests_total
+# aparecen como "unmatched".
+_rechazos = collections.Counter()
+
+def observe_admission_rejection(clase: str, motivo: str):
+    _rechazos[(clase, motivo)] += 1
+
+
+# Consultas por petición: el middleware deja un _Consultas en el contexto y
+# los eventos del motor lo rellenan. Con el motor asíncrono los eventos corren
+# en el greenlet de SQLAlchemy, que comparte el contexto de la tarea.
+class _Consultas:
+    __slots__ = ("total", "tiempo", "filas", "sentencias")
+
+    def __init__(self):
+        self.total = 0
+        self.tiempo = 0.0
+        self.filas = 0
+        self.sentencias = collections.Counter()
+
+_peticion: contextvars.ContextVar = contextvars.ContextVar("metrics_consultas", default=None)
+
+def _antes_de_consulta(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_inicio", []).append(time.perf_counter())
+
+def _despues_de_consulta(conn, cursor, statement, parameters, context, executemany):
+    duracion = time.perf_counter() - conn.info["metrics_inicio"].pop()
+    consultas = _peticion.get()
+    if consultas is None:
+        return
+    consultas.total += 1
+    consultas.tiempo += duracion
+    # rowcount es -1 en cursores del servidor; solo cuentan las filas devueltas
+    if cursor.description is not None and cursor.rowcount > 0:
+        consultas.filas += cursor.rowcount
+    consultas.sentencias[statement] += 1
+
+
+# Por ruta (la plantilla, no la URL: /snippets/{snippet_id}), para que el
+# número de series no crezca con los ids.
+class _Ruta:
+    def __init__(self):
+        self.latencia = Histogram()
+        self.consultas = Histogram(QUERY_COUNT_BUCKETS)
+        self.tiempo_db = Histogram()
+        self.filas = 0
+        self.n_mas_uno = 0
+        self.estados = collections.Counter()
+
+_rutas = {}
+
+def _ruta(method: str, route: str) -> _Ruta:
+    clave = (method, route)
+    if clave not in _rutas:
+        _rutas[clave] = _Ruta()
+    return _rutas[clave]
+
+
+class MetricsMiddleware:
+    # Mide cada petición HTTP de principio a fin (incluidas las respuestas en
+    # streaming) y le asocia las consultas que haya hecho.
+    def __init__(self, app, n1_threshold: int = METRICS_N1_THRESHOLD):
+        self.app = app
+        self.n1_threshold = n1_threshold
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        consultas = _Consultas()
+        token = _peticion.set(consultas)
+        estado = 500
+        inicio = time.perf_counter()
+
+        async def send_con_estado(message):
+            nonlocal estado
+            if message["type"] == "http.response.start":
+                estado = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_con_estado)
+        finally:
+            duracion = time.perf_counter() - inicio
+            _peticion.reset(token)
+            route = scope.get("route")
+            self._registrar(scope["method"], route.path if route else "unmatched", estado, duracion, consultas)
+
+    def _registrar(self, method, route, estado, duracion, consultas):
+        ruta = _ruta(method, route)
+        ruta.latencia.observe(duracion)
+        ruta.consultas.observe(consultas.total)
+        ruta.tiempo_db.observe(consultas.tiempo)
+        ruta.filas += consultas.filas
+        ruta.estados[estado] += 1
+        if consultas.total > self.n1_threshold:
+            ruta.n_mas_uno += 1
+            sentencia, repeticiones = consultas.sentencias.most_common(1)[0]
+            logger.warning(
+                "Possible N+1 in %s %s: %d queries (%.1f ms in DB); most repeated (%dx): %s",
+                method, route, consultas.total, consultas.tiempo * 1000, repeticiones,
+                " ".join(sentencia.split())[:500],
+            )
+
+
+def authorized(authorization) -> bool:
+    if not METRICS_TOKEN:
+        return True
+    return hmac.compare_digest((authorization or "").encode(), f"Bearer {METRICS_TOKEN}".encode())
+
+
+# Formato de texto de Prometheus
+def _etiquetas(**etiquetas) -> str:
+    partes = []
+    for clave, valor in etiquetas.items():
+        valor = str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        partes.append(f'{clave}="{valor}"')
+    return "{" + ",".join(partes) + "}"
+
+def _histograma(lineas, nombre: str, snapshot: dict, **etiquetas):
+    for limite, n in snapshot["buckets"].items():
+        lineas.append(f"{nombre}_bucket{_etiquetas(**etiquetas, le=limite)} {n}")
+    lineas.append(f"{nombre}_sum{_etiquetas(**etiquetas)} {snapshot['sum']}")
+    lineas.append(f"{nombre}_count{_etiquetas(**etiquetas)} {snapshot['count']}")
+
+def render() -> str:
+    lineas = []
+    rutas = sorted(_rutas.items())
+
+    lineas.append("# HELP http_requests_total HTTP requests by route and status.")
+    lineas.append("# TYPE http_requests_total counter")
+    for (method, route), ruta in rutas:
+        for estado, n in sorted(ruta.estados.items()):
+            lineas.append(f"http_requests_total{_etiquetas(method=method, route=route, status=estado)} {n}")
+
+    for nombre, atributo, ayuda in (
+        ("http_request_duration_seconds", "latencia", "Request latency by route."),
+        ("db_queries_per_request", "consultas", "Database queries issued per request."),
+        ("db_time_per_request_seconds", "tiempo_db", "Total database time per request."),
+    ):
+        lineas.append(f"# HELP {nombre} {ayuda}")
+        lineas.append(f"# TYPE {nombre} histogram")
+        for (method, route), ruta in rutas:
+            _histograma(lineas, nombre, getattr(ruta, atributo).snapshot(), method=method, route=route)
+
+    for nombre, atributo, ayuda in (
+        ("db_rows_returned_total", "filas", "Rows returned by database queries."),
+        ("db_suspected_n_plus_one_total", "n_mas_uno", "Requests over the query-count threshold."),
+    ):
+        lineas.append(f"# HELP {nombre} {ayuda}")
+        lineas.append(f"# TYPE {nombre} counter")
+        for (method, route), ruta in rutas:
+            lineas.append(f"{nombre}{_etiquetas(method=method, route=route)} {getattr(ruta, atributo)}")
+
+    pools = pool_stats()
+    for clave, tipo in (("size", "gauge"), ("checked_out", "gauge"), ("checked_in", "gauge"), ("overflow", "gauge"), ("timeouts", "counter")):
+        nombre = f"db_pool_{clave}_total" if tipo == "counter" else f"db_pool_{clave}"
+        lineas.append(f"# TYPE {nombre} {tipo}")
+        for pool, estado in pools.items():
+            if clave in estado:
+                lineas.append(f"{nombre}{_etiquetas(pool=pool)} {estado[clave]}")
+    lineas.append("# TYPE db_pool_wait_seconds histogram")
+    for pool, estado in pools.items():
+        _histograma(lineas, "db_pool_wait_seconds", estado["wait_seconds"], pool=pool)
+
+    for nombre, posicion, ayuda in (
+        ("http_compression_input_bytes_total", 0, "Response bytes before compression."),
+        ("http_compression_output_bytes_total", 1, "Response bytes after compression."),
+    ):
+        lineas.append(f"# HELP {nombre} {ayuda}")
+        lineas.append(f"# TYPE {nombre} counter")
+        for encoding, totales in sorted(_compresion.items()):
+            lineas.append(f"{nombre}{_etiquetas(encoding=encoding)} {totales[posicion]}")
+
+    lineas.append("# HELP http_admission_rejected_total Requests rejected by admission control.")
+    lineas.append("# TYPE http_admission_rejected_total counter")
+    for (clase, motivo), n in sorted(_rechazos.items()):
+        lineas.append(f"http_admission_rejected_total{_etiquetas(route_class=clase, reason=motivo)} {n}")
+
+    return "\n".join(lineas) + "\n"
@@ -0,0 +1,131 @@
+import argparse
+import importlib.util
+import pathlib
+
+import sqlalchemy as _sql
+
+import database as _database
+
+# Migraciones versionadas: cada archivo NNNN_nombre.py de migrations/ define
+# description, upgrade(conn) y downgrade(conn). Se aplican en orden y cada una
+# corre en su propia transacción salvo que declare transactional = False
+# (p. ej. CREATE INDEX CONCURRENTLY).
+#   python -m services.migrations upgrade [--to NNNN]
+#   python -m services.migrations downgrade NNNN
+#   python -m services.migrations status
+MIGRATIONS_DIR = pathlib.Path(__file__).resolve().parent.parent / "migrations"
+
+# clave del advisory lock: dos procesos no migran a la vez
+_LOCK_ID = 4_815_162_342
+
+
+def _load():
+    migraciones = []
+    for path in sorted(MIGRATIONS_DIR.glob("[0-9]*.py")):
+        spec = importlib.util.spec_from_file_location(f"migrations.m{path.stem}", path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        module.revision = path.stem.split("_", 1)[0]
+        migraciones.append(module)
+    return migraciones
+
+def _ensure_table(conn):
+    conn.exec_driver_sql("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version VARCHAR PRIMARY KEY,
+            descripcion VARCHAR,
+            aplicada TIMESTAMP WITHOUT TIME ZONE DEFAULT (now() at time zone 'utc')
+        )
+    """)
+
+def _applied(conn) -> set:
+    return set(conn.scalars(_sql.text("SELECT version FROM schema_version")).all())
+
+def _run(engine, migracion, paso, registro, params):
+    if getattr(migracion, "transactional", True):
+        with engine.begin() as conn:
+            paso(conn)
+            conn.execute(_sql.text(registro), params)
+    else:
+        with engine.connect() as conn:
+            conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+            paso(conn)
+            conn.execute(_sql.text(registro), params)
+
+class _Lock:
+    def __init__(self, engine):
+        self.engine = engine
+
+    def __enter__(self):
+        self.conn = self.engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+        self.conn.execute(_sql.text("SELECT pg_advisory_lock(:id)"), {"id": _LOCK_ID})
+        _ensure_table(self.conn)
+        return self.conn
+
+    def __exit__(self, *exc):
+        self.conn.execute(_sql.text("SELECT pg_advisory_unlock(:id)"), {"id": _LOCK_ID})
+        self.conn.close()
+
+
+def upgrade(target: str = None, engine=None):
+    engine = engine or _database.engine
+    aplicadas_ahora = []
+    with _Lock(engine) as conn:
+        aplicadas = _applied(conn)
+        for migracion in _load():
+            if target is not None and migracion.revision > target:
+                break
+            if migracion.revision in aplicadas:
+                continue
+            print(f"Aplicando {migracion.revision}: {migracion.description}")
+            _run(
+                engine, migracion, migracion.upgrade,
+                "INSERT INTO schema_version (version, descripcion) VALUES (:version, :descripcion)",
+                {"version": migracion.revision, "descripcion": migracion.description},
+            )
+            aplicadas_ahora.append(migracion.revision)
+    return aplicadas_ahora
+
+def downgrade(target: str, engine=None):
+    engine = engine or _database.engine
+    revertidas = []
+    with _Lock(engine) as conn:
+        aplicadas = _applied(conn)
+        for migracion in reversed(_load()):
+            if migracion.revision <= target or migracion.revision not in aplicadas:
+                continue
+            print(f"Revirtiendo {migracion.revision}: {migracion.description}")
+            _run(
+                engine, migracion, migracion.downgrade,
+                "DELETE FROM schema_version WHERE version = :version",
+                {"version": migracion.revision},
+            )
+            revertidas.append(migracion.revision)
+    return revertidas
+
+def status(engine=None):
+    engine = engine or _database.engine
+    with _Lock(engine) as conn:
+        aplicadas = _applied(conn)
+    return [
+        {"version": m.revision, "descripcion": m.description, "aplicada": m.revision in aplicadas}
+        for m in _load()
+    ]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migraciones del esquema")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+    subir = subparsers.add_parser("upgrade", help="Aplicar las migraciones pendientes")
+    subir.add_argument("--to", dest="target", default=None)
+    bajar = subparsers.add_parser("downgrade", help="Revertir hasta la versión indicada (incluida)")
+    bajar.add_argument("target")
+    subparsers.add_parser("status", help="Listar migraciones aplicadas y pendientes")
+    args = parser.parse_args()
+
+    if args.comando == "upgrade":
+        upgrade(args.target)
+    elif args.comando == "downgrade":
+        downgrade(args.target)
+    else:
+        for m in status():
+            print(f"{'x' if m['aplicada'] else ' '} {m['version']} {m['descripcion']}")
@@ -0,0 +1,58 @@
+import base64
+import binascii
+import datetime as _dt
+import json
+import uuid as _uuid
+from typing import Optional
+
+import sqlalchemy as _sql
+import sqlalchemy.ext.asyncio as _asyncio
+from fastapi import HTTPException
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+# El cursor es opaco para el cliente: la clave de orden del último elemento
+# de la página, serializada en JSON y codificada en base64 url-safe.
+def encode_values(values: list) -> str:
+    raw = json.dumps(values).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_values(cursor: str) -> list:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+def encode_cursor(fecha_creacion: _dt.datetime, id: _uuid.UUID) -> str:
+    return encode_values([fecha_creacion.isoformat(), str(id)])
+
+def decode_cursor(cursor: str):
+    try:
+        fecha_creacion, id = decode_values(cursor)
+        return _dt.datetime.fromisoformat(fecha_creacion), _uuid.UUID(id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+async def paginate(db: _asyncio.AsyncSession, stmt, fecha_col, id_col, cursor: Optional[str], limit: int):
+    # Paginación keyset: ordena de más reciente a más antiguo y continúa
+    # estrictamente después de la última fila vista, sin OFFSET.
+    if cursor:
+        fecha_creacion, id = decode_cursor(cursor)
+        stmt = stmt.filter(_sql.tuple_(fecha_col, id_col) < (fecha_creacion, id))
+
+    result = await db.execute(stmt.order_by(fecha_col.desc(), id_col.desc()).limit(limit + 1))
+    # select(Modelo) devuelve entidades; select(col1, col2, ...) devuelve filas
+    rows = result.scalars().all() if len(stmt.column_descriptions) == 1 else result.all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, fecha_col.key), getattr(last, id_col.key))
+
+    return {"items": rows, "next_cursor": next_cursor}
@@ -1,13 +1,44 @@
+import sqlalchemy as _sql
+import sqlalchemy.ext.asyncio as _asyncio
 import sqlalchemy.orm as _orm
 from fastapi import HTTPException
 
 import base64
+import collections
+import datetime as _dt
 from typing import Optional
 
 import models as _models
 import schemas.user as _user
+import services.pagination as _pagination
+import services.storage as _storage
+import services.stats as _stats
+import services.leaderboard as _leaderboard
 
-async def create_publicacion(Titulo: str, Contenido: str, SnippetId: str, user: _user.User, db: _orm.Session):
+def _snippet_loader(inline: bool):
+    # la columna heredada del snippet es diferida: solo se trae con el contenido inline
+    loader = _orm.joinedload(_models.Publicacion.Snippet)
+    return loader.undefer(_models.Snippet.snippet) if inline else loader
+
+def _archivo_link(archivo: _models.Snippet):
+    return {
+        "archivo_url": f"/snippets/{archivo.Snippetid}/raw",
+        "archivo_hash": archivo.hash_contenido,
+        "archivo_tamano": archivo.tamano,
+    }
+
+async def _verificar_snippet(db: _asyncio.AsyncSession, SnippetId: str):
+    # una publicación no puede apuntar a un snippet inexistente o borrado:
+    # la purga eliminaría el snippet por debajo de ella
+    existe = await db.scalar(
+        _sql.select(_models.Snippet.Snippetid)
+        .filter(_models.Snippet.Snippetid == SnippetId, _models.Snippet.activo)
+    )
+    if existe is None:
+        raise HTTPException(status_code=404, detail="Snippet not found")
+
+async def create_publicacion(Titulo: str, Contenido: str, SnippetId: str, user: _user.User, db: _asyncio.AsyncSession):
+    await _verificar_snippet(db, SnippetId)
     publicacion_obj = _models.Publicacion(
         titulo=Titulo,
         contenido=Contenido,
@@ -16,55 +47,89 @@ async def create_publicacion(Titulo: str, Contenido: str, SnippetId: str, user:
     )
 
     db.add(publicacion_obj)
-    db.commit()
-    db.refresh(publicacion_obj)
+    await _stats.incrementar(db, total_publicaciones=1)
+    await _leaderboard.registrar(db, user.Userid, _dt.datetime.utcnow(), 1)
+    await db.commit()
+    await db.refresh(publicacion_obj)
 
     return publicacion_obj
 
-async def get_publicaciones_by_user(user: _user.User, db: _orm.Session):
+async def get_publicaciones_by_user(user: _user.User, db: _asyncio.AsyncSession, cursor: Optional[str] = None, limit: int = _pagination.DEFAULT_LIMIT, inline: bool = True):
     
-    publicaciones = db.query(_models.Publicacion).filter(_models.Publicacion.Userid == user.Userid).all()
-    if not publicaciones:
+    stmt = (
+        _sql.select(_models.Publicacion)
+        .options(_snippet_loader(inline))
+        .filter(_models.Publicacion.Userid == user.Userid, _models.Publicacion.activo)
+    )
+    pagina = await _pagination.paginate(db, stmt, _models.Publicacion.fecha_creacion, _models.Publicacion.Publicacionid, cursor, limit)
+    if not pagina["items"] and cursor is None:
         raise HTTPException(status_code=404, detail="No publications found")
     resultado = []
-    for publicacion in publicaciones:
-        archivo = archivo = db.query(_models.Snippet).get(publicacion.SnippetId)
+    for publicacion in pagina["items"]:
+        archivo = publicacion.Snippet
         if not archivo:
             raise HTTPException(status_code=404, detail="Snippet not found")
-        resultado.append({
+        item = {
             "id": publicacion.Publicacionid,
             "titulo": publicacion.titulo,
             "contenido": publicacion.contenido,
-            "archivo": archivo.snippet.decode("utf-8"),
-            "archivo_base64": base64.b64encode(archivo.snippet).decode("utf-8")
-        })
-    return resultado
-
-async def get_publicacion_by_id(Publicacionid: str, db: _orm.Session):
-    publicacion = db.query(_models.Publicacion).filter(_models.Publicacion.Publicacionid == Publicacionid).first()
+        }
+        if inline:
+            contenido = await _storage.read_snippet(archivo)
+            item["archivo"] = contenido.decode("utf-8")
+            item["archivo_base64"] = base64.b64encode(contenido).decode("utf-8")
+        else:
+            item.update(_archivo_link(archivo))
+        resultado.append(item)
+    return {"items": resultado, "next_cursor": pagina["next_cursor"]}
+
+async def get_publicacion_version(Publicacionid: str, db: _asyncio.AsyncSession):
+    row = (await db.execute(
+        _sql.select(_models.Publicacion.actualiza, _models.Snippet.actualiza, _models.Snippet.hash_contenido)
+        .join(_models.Snippet, _models.Snippet.Snippetid == _models.Publicacion.SnippetId)
+        .filter(_models.Publicacion.Publicacionid == Publicacionid, _models.Publicacion.activo)
+    )).first()
+    if row is None:
+        return None, None
+    fechas = [fecha for fecha in row[:2] if fecha is not None]
+    return tuple(row), max(fechas) if fechas else None
+
+async def get_publicacion_by_id(Publicacionid: str, db: _asyncio.AsyncSession, inline: bool = True):
+    publicacion = await db.scalar(
+        _sql.select(_models.Publicacion)
+        .options(_snippet_loader(inline))
+        .filter(_models.Publicacion.Publicacionid == Publicacionid, _models.Publicacion.activo)
+    )
     if not publicacion:
         raise HTTPException(status_code=404, detail="Publication not found")
     
-    archivo = db.query(_models.Snippet).get(publicacion.SnippetId)
+    archivo = publicacion.Snippet
     if not archivo:
         raise HTTPException(status_code=404, detail="Snippet not found")
 
-    return {
+    item = {
         "id": publicacion.Publicacionid,
         "titulo": publicacion.titulo,
         "contenido": publicacion.contenido,
-        "archivo": base64.b64encode(archivo.snippet).decode("utf-8")
     }
+    if inline:
+        item["archivo"] = base64.b64encode(await _storage.read_snippet(archivo)).decode("utf-8")
+    else:
+        item.update(_archivo_link(archivo))
+    return item
+
+async def update_publicacion(Publicacionid: str, Titulo: Optional[str], user:_user.User, Snippetid: str ,Contenido: Optional[str], db: _asyncio.AsyncSession):
+    publicacion_db = await db.scalar(
+        _sql.select(_models.Publicacion)
+        .filter(_models.Publicacion.Publicacionid == Publicacionid, _models.Publicacion.activo)
+    )
 
-async def update_publicacion(Publicacionid: str, Titulo: Optional[str], user:_user.User, Snippetid: str ,Contenido: Optional[str], db: _orm.Session):
-    publicacion_db = db.query(_models.Publicacion).filter(_models.Publicacion.Publicacionid == Publicacionid).first()
+    if not publicacion_db:
+        raise HTTPException(status_code=404, detail="Publication not found")
 
     if user.Userid != publicacion_db.Userid:
         raise HTTPException(status_code=403, detail="You do not have permission to edit this publication")
 
-    if not publicacion_db:
-        raise HTTPException(status_code=404, detail="Publication not found")
-
     if Titulo:
         publicacion_db.titulo = Titulo
 
@@ -72,44 +137,86 @@ async def update_publicacion(Publicacionid: str, Titulo: Optional[str], user:_us
         publicacion_db.contenido = Contenido
 
     if Snippetid:
+        await _verificar_snippet(db, Snippetid)
         publicacion_db.SnippetId = Snippetid
 
-    db.commit()
-    db.refresh(publicacion_db)
+    await db.commit()
+    await db.refresh(publicacion_db)
 
     return publicacion_db
 
-async def delete_publicacion(Publicacionid: str, user: _user.User, db: _orm.Session):
-    publicacion_db = db.query(_models.Publicacion).filter(_models.Publicacion.Publicacionid == Publicacionid).first()
+# Borrado lógico en bloque: un UPDATE para las publicaciones que cumplan los
+# filtros y otro para sus comentarios, sin cargar objetos. Descuenta las
+# estadísticas y el ranking en la misma transacción; las filas las elimina
+# después services/purge.py.
+async def desactivar_publicaciones(db: _asyncio.AsyncSession, *filtros):
+    ahora = _dt.datetime.utcnow()
+    publicaciones = (await db.execute(
+        _sql.update(_models.Publicacion)
+        .where(_models.Publicacion.activo, *filtros)
+        .values(activo=False, actualiza=ahora)
+        .returning(_models.Publicacion.Publicacionid, _models.Publicacion.Userid, _models.Publicacion.fecha_creacion)
+        .execution_options(synchronize_session=False)
+    )).all()
+    if not publicaciones:
+        return publicaciones
 
-    if user.Userid != publicacion_db.Userid:
+    comentarios = await db.execute(
+        _sql.update(_models.Comentario)
+        .where(_models.Comentario.activo, _models.Comentario.Publicacionid.in_([p.Publicacionid for p in publicaciones]))
+        .values(activo=False, actualiza=ahora)
+        .execution_options(synchronize_session=False)
+    )
+    await _stats.incrementar(db, total_publicaciones=-len(publicaciones), total_comentarios=-comentarios.rowcount)
+    por_dia = collections.Counter((p.Userid, p.fecha_creacion.date()) for p in publicaciones if p.Userid)
+    for (Userid, dia), n in por_dia.items():
+        await _leaderboard.registrar(db, Userid, _dt.datetime.combine(dia, _dt.time()), -n)
+    return publicaciones
+
+async def delete_publicacion(Publicacionid: str, user: _user.User, db: _asyncio.AsyncSession):
+    borradas = await desactivar_publicaciones(
+        db, _models.Publicacion.Publicacionid == Publicacionid, _models.Publicacion.Userid == user.Userid
+    )
+    if not borradas:
+        # solo en el caso de error: distinguir inexistente de ajena
+        Userid = await db.scalar(
+            _sql.select(_models.Publicacion.Userid)
+            .filter(_models.Publicacion.Publicacionid == Publicacionid, _models.Publicacion.activo)
+        )
+        if Userid is None:
+            raise HTTPException(status_code=404, detail="Publication not found")
         raise HTTPException(status_code=403, detail="You do not have permission to delete this publication")
 
-    if not publicacion_db:
-        raise HTTPException(status_code=404, detail="Publication not found")
-
-    db.delete(publicacion_db)
-    db.commit()
+    await db.commit()
 
     return {"detail": "Publication deleted"}
 
-async def get_publication_by_user(user: _user.User, username: str, db: _orm.Session):
-    user = db.query(_models.User).filter(_models.User.username == username).first()
+async def get_publication_by_user(user: _user.User, username: str, db: _asyncio.AsyncSession, cursor: Optional[str] = None, limit: int = _pagination.DEFAULT_LIMIT, inline: bool = True):
+    user = await db.scalar(_sql.select(_models.User).filter(_models.User.username == username))
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    publicaciones = db.query(_models.Publicacion).filter(_models.Publicacion.Userid == user.Userid).all()
-    if not publicaciones:
+    stmt = (
+        _sql.select(_models.Publicacion)
+        .options(_snippet_loader(inline))
+        .filter(_models.Publicacion.Userid == user.Userid, _models.Publicacion.activo)
+    )
+    pagina = await _pagination.paginate(db, stmt, _models.Publicacion.fecha_creacion, _models.Publicacion.Publicacionid, cursor, limit)
+    if not pagina["items"] and cursor is None:
         raise HTTPException(status_code=404, detail="No publications found")
     resultado = []
-    for publicacion in publicaciones:
-        archivo = db.query(_models.Snippet).get(publicacion.SnippetId)
+    for publicacion in pagina["items"]:
+        archivo = publicacion.Snippet
         if not archivo:
             raise HTTPException(status_code=404, detail="Snippet not found")
-        resultado.append({
+        item = {
             "id": publicacion.Publicacionid,
             "titulo": publicacion.titulo,
             "contenido": publicacion.contenido,
-            "archivo": base64.b64encode(archivo.snippet).decode("utf-8")
-        })
-    return resultado
\ No newline at end of file
+        }
+        if inline:
+            item["archivo"] = base64.b64encode(await _storage.read_snippet(archivo)).decode("utf-8")
+        else:
+            item.update(_archivo_link(archivo))
+        resultado.append(item)
+    return {"items": resultado, "next_cursor": pagina["next_cursor"]}
\ No newline at end of file
@@ -0,0 +1,108 @@
+import argparse
+import datetime as _dt
+import os
+
+import sqlalchemy as _sql
+import sqlalchemy.orm as _orm
+from dotenv import load_dotenv
+
+import database as _database
+import models as _models
+import services.migrations as _migrations
+import services.storage as _storage
+
+load_dotenv()
+
+# Los borrados de la API son lógicos (activo = false): una petición solo marca
+# filas. Este trabajo elimina de verdad las que llevan más de
+# PURGE_RETENTION_HOURS borradas, por lotes y cada lote en su transacción,
+# para no bloquear las tablas ni generar transacciones largas.
+PURGE_RETENTION_HOURS = float(os.getenv("PURGE_RETENTION_HOURS", "24"))
+PURGE_BATCH_SIZE = int(os.getenv("PURGE_BATCH_SIZE", "500"))
+
+
+def _borrados(modelo, columnas, corte: _dt.datetime, batch_size: int):
+    # SKIP LOCKED: varios purgadores (o uno y la API) no se esperan entre sí
+    return (
+        _sql.select(*columnas)
+        .where(_sql.not_(modelo.activo), modelo.actualiza < corte)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+
+def _purgar_comentarios(db: _orm.Session, corte, batch_size: int) -> int:
+    lote = _borrados(_models.Comentario, [_models.Comentario.ComentarioId], corte, batch_size)
+    return db.execute(
+        _sql.delete(_models.Comentario).where(_models.Comentario.ComentarioId.in_(lote))
+    ).rowcount
+
+def _purgar_publicaciones(db: _orm.Session, corte, batch_size: int) -> int:
+    ids = db.scalars(_borrados(_models.Publicacion, [_models.Publicacion.Publicacionid], corte, batch_size)).all()
+    if not ids:
+        return 0
+    # sus comentarios se desactivaron con ella; se van aunque sean más recientes
+    db.execute(_sql.delete(_models.Comentario).where(_models.Comentario.Publicacionid.in_(ids)))
+    return db.execute(_sql.delete(_models.Publicacion).where(_models.Publicacion.Publicacionid.in_(ids))).rowcount
+
+def _purgar_snippets(db: _orm.Session, corte, batch_size: int) -> int:
+    # Solo snippets sin publicaciones activas: una publicación viva nunca se
+    # purga, aunque su snippet esté borrado (delete_snippet y
+    # create_publicacion ya lo evitan; esto cubre las carreras entre ambos).
+    viva = (
+        _sql.select(_models.Publicacion.Publicacionid)
+        .where(_models.Publicacion.SnippetId == _models.Snippet.Snippetid, _models.Publicacion.activo)
+        .exists()
+    )
+    rows = db.execute(
+        _borrados(_models.Snippet, [_models.Snippet.Snippetid, _models.Snippet.hash_contenido], corte, batch_size)
+        .where(~viva)
+    ).all()
+    if not rows:
+        return 0
+    ids = [row.Snippetid for row in rows]
+    publicaciones = _sql.select(_models.Publicacion.Publicacionid).where(_models.Publicacion.SnippetId.in_(ids))
+    db.execute(_sql.delete(_models.Comentario).where(_models.Comentario.Publicacionid.in_(publicaciones)))
+    db.execute(_sql.delete(_models.Publicacion).where(_models.Publicacion.SnippetId.in_(ids), _sql.not_(_models.Publicacion.activo)))
+    # snippet_texto cae con ON DELETE CASCADE
+    total = db.execute(_sql.delete(_models.Snippet).where(_models.Snippet.Snippetid.in_(ids))).rowcount
+    # los archivos se borran tras el commit del lote (purge)
+    db.info["blobs_huerfanos"] = _storage.release_blobs(db, [row.hash_contenido for row in rows])
+    return total
+
+
+# Cron:
+#   python -m services.purge run [--batch-size 500] [--retention-hours 24]
+def purge(batch_size: int = PURGE_BATCH_SIZE, retention_hours: float = PURGE_RETENTION_HOURS) -> dict:
+    _migrations.upgrade()
+
+    corte = _dt.datetime.utcnow() - _dt.timedelta(hours=retention_hours)
+    totales = {}
+    # en el orden de las FKs: comentario -> publicacion -> snippet
+    for nombre, purgar in (
+        ("comentarios", _purgar_comentarios),
+        ("publicaciones", _purgar_publicaciones),
+        ("snippets", _purgar_snippets),
+    ):
+        totales[nombre] = 0
+        while True:
+            with _orm.Session(_database.engine) as db:
+                n = purgar(db, corte, batch_size)
+                db.commit()
+                _storage.delete_files(db.info.pop("blobs_huerfanos", None))
+            if not n:
+                break
+            totales[nombre] += n
+            print(f"{nombre} purgados: {totales[nombre]}")
+
+    return totales
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Purga de filas con borrado lógico")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+    ejecutar = subparsers.add_parser("run", help="Eliminar por lotes las filas borradas hace más del periodo de retención")
+    ejecutar.add_argument("--batch-size", type=int, default=PURGE_BATCH_SIZE)
+    ejecutar.add_argument("--retention-hours", type=float, default=PURGE_RETENTION_HOURS)
+    args = parser.parse_args()
+
+    if args.comando == "run":
+        purge(batch_size=args.batch_size, retention_hours=args.retention_hours)
@@ -0,0 +1,32 @@
+import functools
+
+import pydantic as _pydantic
+from fastapi import Response
+
+# Serialización de las respuestas JSON. Con response_model, FastAPI convierte
+# el resultado en dict, lo vuelve a validar contra el modelo, lo pasa a tipos
+# JSON y por último lo codifica con json.dumps. Aquí se valida una sola vez
+# (desde los atributos del objeto ORM o del dict) y pydantic-core escribe el
+# JSON directamente. Las rutas siguen declarando response_model para OpenAPI;
+# al devolver un Response, FastAPI no lo vuelve a procesar.
+
+
+@functools.lru_cache(maxsize=None)
+def _adapter(tipo) -> _pydantic.TypeAdapter:
+    return _pydantic.TypeAdapter(tipo)
+
+
+def dump_json(tipo, contenido, **opciones) -> bytes:
+    adapter = _adapter(tipo)
+    return adapter.dump_json(adapter.validate_python(contenido, from_attributes=True), **opciones)
+
+
+def json_response(tipo, contenido, response: Response = None, status_code: int = 200, **opciones) -> Response:
+    # response es el que FastAPI inyecta en la ruta: se conservan las cabeceras
+    # que se le hayan puesto (ETag, Cache-Control... de http_cache.conditional)
+    respuesta = Response(dump_json(tipo, contenido, **opciones), status_code=status_code, media_type="application/json")
+    if response is not None:
+        respuesta.raw_headers.extend(
+            (clave, valor) for clave, valor in response.raw_headers if clave != b"content-length"
+        )
+    return respuesta
@@ -0,0 +1,345 @@
+import argparse
+import os
+import re
+import uuid as _uuid
+from typing import Optional
+
+try:
+    import re._parser as _sre_parse
+    import re._constants as _sre_constants
+except ImportError:  # Python < 3.11
+    import sre_parse as _sre_parse
+    import sre_constants as _sre_constants
+
+import sqlalchemy as _sql
+import sqlalchemy.ext.asyncio as _asyncio
+import sqlalchemy.orm as _orm
+from sqlalchemy.dialects import postgresql as _postgresql
+from fastapi import HTTPException
+from dotenv import load_dotenv
+
+import database as _database
+import models as _models
+import services.migrations as _migrations
+import services.pagination as _pagination
+import services.storage as _storage
+
+load_dotenv()
+
+# Un tsvector admite como mucho 1 MB: del contenido se indexa solo el principio
+MAX_INDEXED_CONTENT = 256 * 1024
+
+_CONFIG = _sql.literal_column(f"'{_models.FTS_CONFIG}'::regconfig")
+
+
+def _weighted(texto, peso: str):
+    # el peso va como literal: asyncpg tipa los parámetros como varchar y no
+    # existe setweight(tsvector, varchar)
+    return _sql.func.setweight(
+        _sql.func.to_tsvector(_CONFIG, _sql.func.coalesce(texto, "")),
+        _sql.literal_column(f"'{peso}'"),
+    )
+
+def _texto(contenido: bytes) -> str:
+    # Postgres no admite NUL en text; los bytes no UTF-8 no aportan a la búsqueda
+    return contenido.decode("utf-8", errors="ignore").replace("\x00", "")
+
+def snippet_vector(Titulo, Lenguaje, descripcion, contenido: str):
+    return (
+        _weighted(Titulo, "A")
+        .op("||")(_weighted(Lenguaje, "A"))
+        .op("||")(_weighted(descripcion, "B"))
+        .op("||")(_weighted(contenido, "C"))
+    )
+
+def _texto_stmt(Snippetid, texto: str):
+    return (
+        _postgresql.insert(_models.SnippetTexto)
+        .values(Snippetid=Snippetid, texto=texto)
+        .on_conflict_do_update(index_elements=[_models.SnippetTexto.Snippetid], set_={"texto": texto})
+    )
+
+async def index_snippet(db: _asyncio.AsyncSession, snippet: _models.Snippet, contenido_nuevo: bool = True):
+    # El snippet ya debe estar en la sesión. El vector se asigna como expresión
+    # SQL y se calcula en el mismo INSERT/UPDATE; el texto completo va a
+    # snippet_texto para la búsqueda de código.
+    if not contenido_nuevo:
+        # Solo cambian título, lenguaje o descripción: el texto ya está en
+        # snippet_texto y el vector se recalcula desde ahí, sin leer el blob
+        # ni reescribir el texto. Las filas sin snippet_texto las completa
+        # reindex.
+        texto = (
+            _sql.select(_sql.func.left(_models.SnippetTexto.texto, MAX_INDEXED_CONTENT))
+            .where(_models.SnippetTexto.Snippetid == snippet.Snippetid)
+            .scalar_subquery()
+        )
+        snippet.busqueda = snippet_vector(snippet.Titulo, snippet.Lenguaje, snippet.descripcion, texto)
+        return
+    contenido = await _storage.read_snippet(snippet)
+    snippet.busqueda = snippet_vector(snippet.Titulo, snippet.Lenguaje, snippet.descripcion, _texto(contenido[:MAX_INDEXED_CONTENT]))
+    await db.flush()
+    await db.execute(_texto_stmt(snippet.Snippetid, _texto(contenido)))
+
+async def index_batch(db: _asyncio.AsyncSession, contenidos: dict):
+    # Altas masivas: contenidos es {Snippetid: bytes} de filas ya insertadas.
+    # Un INSERT múltiple para snippet_texto y un único UPDATE ... FROM que
+    # calcula todos los vectores en Postgres a partir de ese texto.
+    if not contenidos:
+        return
+    await db.execute(
+        _sql.insert(_models.SnippetTexto),
+        [{"Snippetid": Snippetid, "texto": _texto(contenido)} for Snippetid, contenido in contenidos.items()],
+    )
+    await db.execute(
+        _sql.update(_models.Snippet)
+        .where(
+            _models.Snippet.Snippetid == _models.SnippetTexto.Snippetid,
+            _models.Snippet.Snippetid.in_(list(contenidos)),
+        )
+        .values(busqueda=snippet_vector(
+            _models.Snippet.Titulo,
+            _models.Snippet.Lenguaje,
+            _models.Snippet.descripcion,
+            _sql.func.left(_models.SnippetTexto.texto, MAX_INDEXED_CONTENT),
+        ))
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def search(
+    db: _asyncio.AsyncSession,
+    q: str,
+    tipo: str = "snippet",
+    lenguaje: Optional[str] = None,
+    autor: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = _pagination.DEFAULT_LIMIT,
+):
+    consulta = _sql.func.websearch_to_tsquery(_CONFIG, q)
+
+    if tipo == "snippet":
+        id_col = _models.Snippet.Snippetid
+        rank = _sql.func.ts_rank_cd(_models.Snippet.busqueda, consulta)
+        stmt = (
+            _sql.select(
+                id_col.label("id"),
+                _models.Snippet.Titulo.label("titulo"),
+                _models.Snippet.Lenguaje.label("lenguaje"),
+                _models.Snippet.descripcion.label("descripcion"),
+                _models.User.username.label("autor"),
+                _models.Snippet.fecha_creacion.label("fecha_creacion"),
+                rank.label("rank"),
+            )
+            .join(_models.User, _models.User.Userid == _models.Snippet.Userid)
+            .filter(_models.Snippet.busqueda.op("@@")(consulta), _models.Snippet.activo)
+        )
+        if lenguaje:
+            stmt = stmt.filter(_models.Snippet.Lenguaje == lenguaje)
+    else:
+        id_col = _models.Publicacion.Publicacionid
+        rank = _sql.func.ts_rank_cd(_models.Publicacion.busqueda, consulta)
+        stmt = (
+            _sql.select(
+                id_col.label("id"),
+                _models.Publicacion.titulo.label("titulo"),
+                _models.Publicacion.contenido.label("contenido"),
+                _models.Publicacion.SnippetId.label("snippet_id"),
+                _models.User.username.label("autor"),
+                _models.Publicacion.fecha_creacion.label("fecha_creacion"),
+                rank.label("rank"),
+            )
+            .join(_models.User, _models.User.Userid == _models.Publicacion.Userid)
+            .filter(_models.Publicacion.busqueda.op("@@")(consulta), _models.Publicacion.activo)
+        )
+        if lenguaje:
+            stmt = stmt.join(_models.Snippet, _models.Snippet.Snippetid == _models.Publicacion.SnippetId).filter(
+                _models.Snippet.Lenguaje == lenguaje
+            )
+
+    if autor:
+        stmt = stmt.filter(_models.User.username == autor)
+
+    # keyset sobre (rank, id): el rank es determinista para la misma consulta
+    if cursor:
+        try:
+            ultimo_rank, ultimo_id = _pagination.decode_values(cursor)
+            ultimo_rank, ultimo_id = float(ultimo_rank), _uuid.UUID(ultimo_id)
+        except (ValueError, TypeError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        stmt = stmt.filter(_sql.tuple_(rank, id_col) < (ultimo_rank, ultimo_id))
+
+    rows = (await db.execute(stmt.order_by(rank.desc(), id_col.desc()).limit(limit + 1))).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _pagination.encode_values([rows[-1].rank, str(rows[-1].id)])
+
+    return {"items": [dict(row._mapping) for row in rows], "next_cursor": next_cursor}
+
+
+# Búsqueda de código: fragmentos exactos o expresiones regulares dentro del
+# contenido. pg_trgm necesita al menos un trigrama para usar el índice.
+MIN_CODE_QUERY = 3
+MAX_CODE_QUERY = int(os.getenv("SEARCH_CODE_MAX_QUERY", "256"))
+# statement_timeout de la consulta de búsqueda de código (0 = sin límite)
+SEARCH_CODE_TIMEOUT_MS = int(os.getenv("SEARCH_CODE_TIMEOUT_MS", "2000"))
+_CONTEXTO = 60
+
+
+def _literales(patron) -> list:
+    # Tramos de texto literal que toda coincidencia tiene que contener: los de
+    # la secuencia principal, los de grupos y los de repeticiones de mínimo 1.
+    # Las alternativas (a|b), clases y repeticiones opcionales no aportan.
+    tramos, actual = [], ""
+    for op, av in patron:
+        if op is _sre_constants.LITERAL:
+            actual += chr(av)
+            continue
+        if actual:
+            tramos.append(actual)
+            actual = ""
+        if op is _sre_constants.SUBPATTERN:
+            tramos += _literales(av[-1])
+        elif op in (_sre_constants.MAX_REPEAT, _sre_constants.MIN_REPEAT) and av[0] >= 1:
+            tramos += _literales(av[2])
+    if actual:
+        tramos.append(actual)
+    return tramos
+
+def _prefiltro_regex(q: str, ignore_case: bool):
+    # Una regex sin literal de al menos MIN_CODE_QUERY caracteres (.*, \w+)
+    # no da trigramas: Postgres la evaluaría contra todo snippet_texto. Se exige
+    # ese literal y se añade como LIKE, que sí usa el índice de trigramas.
+    try:
+        patron = _sre_parse.parse(q)
+    except re.error:
+        raise HTTPException(status_code=400, detail="Invalid regular expression")
+    literal = max(_literales(patron), key=len, default="")
+    if len(literal) < MIN_CODE_QUERY:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Regular expression must contain a literal of at least {MIN_CODE_QUERY} characters",
+        )
+    texto = _models.SnippetTexto.texto
+    if ignore_case or patron.state.flags & re.IGNORECASE or "(?i" in q:
+        return texto.icontains(literal, autoescape=True)
+    return texto.contains(literal, autoescape=True)
+
+async def search_code(
+    db: _asyncio.AsyncSession,
+    q: str,
+    modo: str = "substring",
+    ignore_case: bool = False,
+    lenguaje: Optional[str] = None,
+    autor: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = _pagination.DEFAULT_LIMIT,
+):
+    texto = _models.SnippetTexto.texto
+
+    if len(q) > MAX_CODE_QUERY:
+        raise HTTPException(status_code=400, detail=f"Query must have at most {MAX_CODE_QUERY} characters")
+
+    if modo == "regex":
+        condicion = _sql.and_(_prefiltro_regex(q, ignore_case), texto.op("~*" if ignore_case else "~")(q))
+        coincidencia = _sql.func.substring(texto, q if not ignore_case else f"(?i){q}")
+    else:
+        if len(q) < MIN_CODE_QUERY:
+            raise HTTPException(status_code=400, detail=f"Query must have at least {MIN_CODE_QUERY} characters")
+        condicion = texto.icontains(q, autoescape=True) if ignore_case else texto.contains(q, autoescape=True)
+        posicion = _sql.func.strpos(_sql.func.lower(texto), q.lower()) if ignore_case else _sql.func.strpos(texto, q)
+        coincidencia = _sql.func.substr(texto, _sql.func.greatest(posicion - _CONTEXTO, 1), len(q) + 2 * _CONTEXTO)
+
+    stmt = (
+        _sql.select(
+            _models.Snippet.Snippetid,
+            _models.Snippet.Titulo,
+            _models.Snippet.Lenguaje,
+            _models.User.username,
+            _models.Snippet.fecha_creacion,
+            coincidencia.label("coincidencia"),
+        )
+        .join(_models.SnippetTexto, _models.SnippetTexto.Snippetid == _models.Snippet.Snippetid)
+        .join(_models.User, _models.User.Userid == _models.Snippet.Userid)
+        .filter(condicion, _models.Snippet.activo)
+    )
+    if lenguaje:
+        stmt = stmt.filter(_models.Snippet.Lenguaje == lenguaje)
+    if autor:
+        stmt = stmt.filter(_models.User.username == autor)
+
+    if SEARCH_CODE_TIMEOUT_MS:
+        # solo para esta transacción: la conexión vuelve al pool sin el límite
+        await db.execute(_sql.text(f"SET LOCAL statement_timeout = {int(SEARCH_CODE_TIMEOUT_MS)}"))
+    try:
+        pagina = await _pagination.paginate(db, stmt, _models.Snippet.fecha_creacion, _models.Snippet.Snippetid, cursor, limit)
+    except _sql.exc.DataError:
+        # sintaxis de regex válida en Python pero no en Postgres (ARE)
+        raise HTTPException(status_code=400, detail="Invalid regular expression")
+    except _sql.exc.DBAPIError as e:
+        if getattr(e.orig, "sqlstate", None) != "57014":  # query_canceled
+            raise
+        raise HTTPException(status_code=400, detail="Code search took too long; use a more specific query")
+
+    return {
+        "items": [
+            {
+                "id": row.Snippetid,
+                "titulo": row.Titulo,
+                "lenguaje": row.Lenguaje,
+                "autor": row.username,
+                "coincidencia": row.coincidencia,
+            }
+            for row in pagina["items"]
+        ],
+        "next_cursor": pagina["next_cursor"],
+    }
+
+
+# Reindexado: aplica las migraciones pendientes y calcula el vector y el texto
+# de los snippets que aún no los tienen.
+#   python -m services.search reindex --batch-size 500
+def reindex(batch_size: int = 500):
+    _migrations.upgrade()
+
+    store = _storage.get_store()
+    total = 0
+    while True:
+        with _orm.Session(_database.engine) as db:
+            snippets = db.scalars(
+                _sql.select(_models.Snippet)
+                .outerjoin(_models.SnippetTexto, _models.SnippetTexto.Snippetid == _models.Snippet.Snippetid)
+                .where(
+                    _models.Snippet.activo,
+                    _sql.or_(_models.Snippet.busqueda.is_(None), _models.SnippetTexto.Snippetid.is_(None)),
+                )
+                .limit(batch_size)
+                .with_for_update(of=_models.Snippet, skip_locked=True)
+            ).all()
+            if not snippets:
+                break
+
+            for snippet in snippets:
+                if snippet.hash_contenido:
+                    contenido = store.read(snippet.hash_contenido)
+                else:
+                    contenido = snippet.snippet or b""
+                snippet.busqueda = snippet_vector(snippet.Titulo, snippet.Lenguaje, snippet.descripcion, _texto(contenido[:MAX_INDEXED_CONTENT]))
+                db.execute(_texto_stmt(snippet.Snippetid, _texto(contenido)))
+            db.commit()
+
+        total += len(snippets)
+        print(f"{total} snippets indexados")
+
+    return total
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Índice de búsqueda de texto")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+    reindexar = subparsers.add_parser("reindex", help="Indexar los snippets sin vector de búsqueda o sin texto")
+    reindexar.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    if args.comando == "reindex":
+        reindex(batch_size=args.batch_size)
@@ -1,7 +1,10 @@
+import sqlalchemy as _sql
+import sqlalchemy.ext.asyncio as _asyncio
 import sqlalchemy.orm as _orm
 
 from fastapi import File, Form, HTTPException
-from fastapi import UploadFile, Depends
+from fastapi import UploadFile, Depends, Request, Response
+from fastapi.responses import FileResponse
 
 from typing import Optional, List
 import datetime as _dt
@@ -12,17 +15,25 @@ import models as _models
 
 from services.database import get_db
 import services.publication as _publicationServices
+import services.pagination as _pagination
+import services.storage as _storage
+import services.uploads as _uploads
+import services.http_cache as _httpCache
+import services.compression as _compression
+import services.search as _search
+import services.stats as _stats
 
-def create_snippet(
+async def create_snippet(
     user: _user.User,
     Titulo: str = Form(...),
     Lenguaje: str = Form(...),
     descripcion: str = Form(...),
     file: UploadFile = File(...),
-    db: _orm.Session = Depends(get_db)
+    db: _asyncio.AsyncSession = Depends(get_db)
 ):
     
-    file_content = file.file.read()
+    resumen = _storage.Resumen()
+    hash_contenido, tamano = await _uploads.save_upload(db, file, resumen)
 
     # Crear un objeto Snippet
     snippet_obj = _models.Snippet(
@@ -30,24 +41,68 @@ def create_snippet(
         Userid=user.Userid,
         descripcion=descripcion,
         Lenguaje=Lenguaje,
-        snippet=file_content
+        hash_contenido=hash_contenido,
+        tamano=tamano,
+        lineas=resumen.lineas,
+        vista_previa=resumen.vista_previa,
+        tipo_contenido=file.content_type,
+        nombre_archivo=file.filename,
     )
-
     db.add(snippet_obj)
-    db.commit()
-    db.refresh(snippet_obj)
+    await _search.index_snippet(db, snippet_obj)
+    await _stats.incrementar(db, total_snippets=1, snippets_aprobados=1)
+
+    await db.commit()
+    await db.refresh(snippet_obj)
 
     return snippet_obj
 
-async def get_snippets_by_user(user: _user.User, db: _orm.Session = Depends(get_db)):
-    return db.query(_models.Snippet).filter(_models.Snippet.Userid == user.Userid).all()
+async def get_snippets_version(Userid, db: _asyncio.AsyncSession):
+    # cambia con cualquier alta, baja o edición de snippets del usuario
+    total, ultima = (await db.execute(
+        _sql.select(_sql.func.count(_models.Snippet.Snippetid), _sql.func.max(_models.Snippet.actualiza))
+        .filter(_models.Snippet.Userid == Userid, _models.Snippet.activo)
+    )).one()
+    return (str(Userid), total, ultima), ultima
+
+async def get_snippets_version_by_username(username: str, db: _asyncio.AsyncSession):
+    total, ultima = (await db.execute(
+        _sql.select(_sql.func.count(_models.Snippet.Snippetid), _sql.func.max(_models.Snippet.actualiza))
+        .join(_models.User, _models.User.Userid == _models.Snippet.Userid)
+        .filter(_models.User.username == username, _models.Snippet.activo)
+    )).one()
+    return (username, total, ultima), ultima
+
+# Los listados solo traen las columnas del resumen: ni el contenido heredado
+# ni el vector de búsqueda. El contenido se descarga desde /snippets/{id}/raw.
+_RESUMEN = (
+    _models.Snippet.Snippetid,
+    _models.Snippet.Titulo,
+    _models.Snippet.Lenguaje,
+    _models.Snippet.descripcion,
+    _models.Snippet.Userid,
+    _models.Snippet.nombre_archivo,
+    _models.Snippet.tipo_contenido,
+    _models.Snippet.tamano,
+    _models.Snippet.lineas,
+    _models.Snippet.hash_contenido,
+    _models.Snippet.vista_previa,
+    _models.Snippet.fecha_creacion,
+    _models.Snippet.actualiza,
+    _models.Snippet.activo,
+)
+
+def _resumenes(Userid):
+    return _sql.select(_models.Snippet).options(_orm.load_only(*_RESUMEN)).filter(_models.Snippet.Userid == Userid, _models.Snippet.activo)
+
+async def get_snippets_by_user(user: _user.User, db: _asyncio.AsyncSession = Depends(get_db), cursor: Optional[str] = None, limit: int = _pagination.DEFAULT_LIMIT):
+    return await _pagination.paginate(db, _resumenes(user.Userid), _models.Snippet.fecha_creacion, _models.Snippet.Snippetid, cursor, limit)
 
-async def _Snippet_selector(Snippetid: str, user: _user.User, db: _orm.Session):
-    Snippet = (
-        db.query(_models.Snippet)
+async def _Snippet_selector(Snippetid: str, user: _user.User, db: _asyncio.AsyncSession):
+    Snippet = await db.scalar(
+        _sql.select(_models.Snippet)
         .filter_by(Userid = user.Userid)
-        .filter(_models.Snippet.Snippetid == Snippetid)
-        .first()
+        .filter(_models.Snippet.Snippetid == Snippetid, _models.Snippet.activo)
     )
 
     if Snippet is None:
@@ -55,7 +110,7 @@ async def _Snippet_selector(Snippetid: str, user: _user.User, db: _orm.Session):
 
     return Snippet
 
-async def update_snippet(Snippetid: str, Titulo: Optional[str], Lenguaje: Optional[str], file: Optional[UploadFile], descripcion: Optional[str], user: _user.User, db: _orm.Session):
+async def update_snippet(Snippetid: str, Titulo: Optional[str], Lenguaje: Optional[str], file: Optional[UploadFile], descripcion: Optional[str], user: _user.User, db: _asyncio.AsyncSession):
     snippet_db = await _Snippet_selector(Snippetid, user, db)
 
     if Titulo:
@@ -64,39 +119,160 @@ async def update_snippet(Snippetid: str, Titulo: Optional[str], Lenguaje: Option
     if Lenguaje:
         snippet_db.Lenguaje = Lenguaje
 
+    hash_anterior = None
+    contenido_nuevo = False
     if file:
-        snippet_db.snippet = file.file.read()
+        hash_anterior = snippet_db.hash_contenido
+        await _storage.release_blob(db, hash_anterior)
+        resumen = _storage.Resumen()
+        snippet_db.hash_contenido, snippet_db.tamano = await _uploads.save_upload(db, file, resumen)
+        contenido_nuevo = snippet_db.hash_contenido != hash_anterior
+        snippet_db.lineas = resumen.lineas
+        snippet_db.vista_previa = resumen.vista_previa
+        snippet_db.tipo_contenido = file.content_type
+        snippet_db.nombre_archivo = file.filename
+        snippet_db.snippet = None
     
     if descripcion:
         snippet_db.descripcion = descripcion
 
-    snippet_db.date_last_updated = _dt.datetime.utcnow()
+    snippet_db.actualiza = _dt.datetime.utcnow()
+    # el texto solo se reindexa si ha cambiado el contenido
+    await _search.index_snippet(db, snippet_db, contenido_nuevo=contenido_nuevo)
 
-    db.commit()
-    db.refresh(snippet_db)
+    await db.commit()
+    await _storage.purge_blobs(db, [hash_anterior])
+    await db.refresh(snippet_db)
 
     return snippet_db
 
-async def delete_snippet(Snippetid: str, user: _user.User, db: _orm.Session):
-
-    # determine if the publication is in a publication and delete it
-    publication = db.query( _models.Publicacion ).filter( Snippetid == _models.Publicacion.SnippetId ).first()
-
-    if publication:
-        await _publicationServices.delete_publicacion(db=db, Publicacionid=publication.Publicacionid, user=user)
+async def delete_snippet(Snippetid: str, user: _user.User, db: _asyncio.AsyncSession):
+    # Borrado lógico del snippet y, en bloque, de sus publicaciones (todas del
+    # mismo autor) y sus comentarios. El blob y las filas los libera
+    # services/purge.py. Si otro usuario lo tiene publicado, no se borra: sus
+    # publicaciones no son del que borra.
+    ajena = await db.scalar(
+        _sql.select(_models.Publicacion.Publicacionid)
+        .filter(
+            _models.Publicacion.SnippetId == Snippetid,
+            _models.Publicacion.Userid != user.Userid,
+            _models.Publicacion.activo,
+        )
+        .limit(1)
+    )
+    if ajena is not None:
+        raise HTTPException(status_code=403, detail="Snippet is used in publications by other users")
 
-    snippet_db = await _Snippet_selector(Snippetid, user, db)
+    borrado = await db.scalar(
+        _sql.update(_models.Snippet)
+        .where(_models.Snippet.Snippetid == Snippetid, _models.Snippet.Userid == user.Userid, _models.Snippet.activo)
+        .values(activo=False, actualiza=_dt.datetime.utcnow())
+        .returning(_models.Snippet.Snippetid)
+        .execution_options(synchronize_session=False)
+    )
+    if borrado is None:
+        raise HTTPException(status_code=404, detail="Snippet does not exist")
 
-    db.delete(snippet_db)
-    db.commit()
+    # el texto solo sirve para buscar: fuera ya del índice de trigramas
+    await db.execute(_sql.delete(_models.SnippetTexto).where(_models.SnippetTexto.Snippetid == Snippetid))
+    await _publicationServices.desactivar_publicaciones(
+        db, _models.Publicacion.SnippetId == Snippetid, _models.Publicacion.Userid == user.Userid
+    )
+    await _stats.incrementar(db, total_snippets=-1, snippets_aprobados=-1)
+    await db.commit()
 
     return {"detail": "Snippet deleted"}
 
-async def get_snippets_by_username(username: str, db: _orm.Session, user: _user.User):
-    users = db.query(_models.User).filter(_models.User.username == username).first()
-    if not user:
+async def get_snippets_by_username(username: str, db: _asyncio.AsyncSession, user: _user.User, cursor: Optional[str] = None, limit: int = _pagination.DEFAULT_LIMIT):
+    users = await db.scalar(_sql.select(_models.User).filter(_models.User.username == username))
+    if not users:
         raise HTTPException(status_code=404, detail="User not found")
-    snippets = db.query(_models.Snippet).filter(_models.Snippet.Userid == users.Userid).all()
-    if not snippets:
+    snippets = await _pagination.paginate(db, _resumenes(users.Userid), _models.Snippet.fecha_creacion, _models.Snippet.Snippetid, cursor, limit)
+    if not snippets["items"] and cursor is None:
         raise HTTPException(status_code=404, detail="Snippets not found")
-    return snippets
\ No newline at end of file
+    return snippets
+
+def _byte_range(range_header: str, tamano: int):
+    # Solo un rango "bytes=inicio-fin" o sufijo "bytes=-n"; None si no es válido
+    unidad, _, rango = range_header.partition("=")
+    if unidad.strip() != "bytes" or "," in rango:
+        return None
+    inicio, _, fin = rango.strip().partition("-")
+    try:
+        if inicio == "":
+            inicio, fin = max(tamano - int(fin), 0), tamano - 1
+        else:
+            inicio, fin = int(inicio), min(int(fin), tamano - 1) if fin else tamano - 1
+    except ValueError:
+        return None
+    if inicio > fin or inicio >= tamano:
+        return None
+    return inicio, fin
+
+async def get_snippet_raw(Snippetid: str, request: Request, db: _asyncio.AsyncSession):
+    snippet_db = await db.scalar(
+        _sql.select(_models.Snippet).filter(_models.Snippet.Snippetid == Snippetid, _models.Snippet.activo)
+    )
+    if snippet_db is None:
+        raise HTTPException(status_code=404, detail="Snippet does not exist")
+
+    contenido = None
+    hash_contenido = snippet_db.hash_contenido
+    if hash_contenido is None:
+        contenido = await _storage.read_snippet(snippet_db)
+        hash_contenido = _storage.hash_bytes(contenido)
+
+    # el hash del contenido es un validador fuerte: mismo hash, mismos bytes
+    headers = {
+        "ETag": f'"{hash_contenido}"',
+        "Accept-Ranges": "bytes",
+        "Cache-Control": _httpCache.PRIVATE,
+        "Vary": "Accept-Encoding",
+    }
+    if _httpCache.etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
+    media_type = snippet_db.tipo_contenido or "text/plain; charset=utf-8"
+
+    if contenido is None:
+        store = _storage.get_store()
+        comprimido = store.encoded_path(hash_contenido)
+        if (
+            comprimido is not None
+            and "range" not in request.headers
+            and _compression.negotiate(request.headers.get("accept-encoding"), [comprimido[1]])
+        ):
+            # el blob comprimido en disco se sirve tal cual, sin descomprimir ni recomprimir
+            path, encoding = comprimido
+            return FileResponse(
+                path,
+                media_type=media_type,
+                headers={**headers, "ETag": f'W/"{hash_contenido}"', "Content-Encoding": encoding},
+                filename=snippet_db.nombre_archivo,
+                content_disposition_type="inline",
+            )
+        path = store.local_path(hash_contenido)
+        if path is not None:
+            # FileResponse resuelve Range/If-Range y usa pathsend si el servidor lo soporta
+            return FileResponse(
+                path,
+                media_type=media_type,
+                headers=headers,
+                filename=snippet_db.nombre_archivo,
+                content_disposition_type="inline",
+            )
+        contenido = await _storage.read_snippet(snippet_db)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range == headers["ETag"]):
+        rango = _byte_range(range_header, len(contenido))
+        if rango is None:
+            raise HTTPException(status_code=416, detail="Requested range not satisfiable", headers={
+                "Content-Range": f"bytes */{len(contenido)}"
+            })
+        inicio, fin = rango
+        headers["Content-Range"] = f"bytes {inicio}-{fin}/{len(contenido)}"
+        return Response(contenido[inicio:fin + 1], status_code=206, media_type=media_type, headers=headers)
+
+    return Response(contenido, media_type=media_type, headers=headers)
\ No newline at end of file
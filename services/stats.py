@@ -0,0 +1,104 @@
+import argparse
+import asyncio
+import os
+import random
+
+import sqlalchemy as _sql
+import sqlalchemy.ext.asyncio as _asyncio
+from sqlalchemy.dialects import postgresql as _postgresql
+from dotenv import load_dotenv
+
+import database as _database
+import models as _models
+
+load_dotenv()
+
+# Cada contador se reparte en varias filas (shards) para que las escrituras
+# concurrentes no hagan cola sobre una sola; leer es sumar unas pocas filas.
+STATS_SHARDS = int(os.getenv("STATS_SHARDS", "8"))
+
+CLAVES = (
+    "total_usuarios",
+    "total_snippets",
+    "total_publicaciones",
+    "total_comentarios",
+    "snippets_aprobados",
+    "usuarios_activos",
+)
+
+
+async def incrementar(db: _asyncio.AsyncSession, **deltas: int):
+    # Se ejecuta dentro de la transacción de la escritura que lo origina:
+    # si esa transacción hace rollback, el contador también.
+    shard = random.randrange(STATS_SHARDS)
+    for clave, delta in deltas.items():
+        if clave not in CLAVES:
+            raise ValueError(f"Unknown statistic: {clave}")
+        if not delta:
+            continue
+        await db.execute(
+            _postgresql.insert(_models.Estadistica)
+            .values(clave=clave, shard=shard, valor=delta)
+            .on_conflict_do_update(
+                index_elements=[_models.Estadistica.clave, _models.Estadistica.shard],
+                set_={"valor": _models.Estadistica.valor + delta},
+            )
+        )
+
+async def leer(db: _asyncio.AsyncSession) -> dict:
+    rows = (await db.execute(
+        _sql.select(_models.Estadistica.clave, _sql.func.sum(_models.Estadistica.valor))
+        .group_by(_models.Estadistica.clave)
+    )).all()
+    stats = {clave: int(valor) for clave, valor in rows}
+
+    # primera lectura sin contadores: calcularlos una vez
+    if any(clave not in stats for clave in CLAVES):
+        stats = await reconciliar(db)
+
+    return {clave: stats[clave] for clave in CLAVES}
+
+def _conteo_exacto():
+    def contar(columna, *filtros):
+        return _sql.select(_sql.func.count(columna)).where(*filtros).scalar_subquery()
+
+    # todos los conteos en una sola sentencia; las filas con borrado lógico
+    # (activo = false) no cuentan, igual que al descontarlas al borrar
+    return _sql.select(
+        contar(_models.User.Userid).label("total_usuarios"),
+        contar(_models.Snippet.Snippetid, _models.Snippet.activo).label("total_snippets"),
+        contar(_models.Publicacion.Publicacionid, _models.Publicacion.activo).label("total_publicaciones"),
+        contar(_models.Comentario.ComentarioId, _models.Comentario.activo).label("total_comentarios"),
+        contar(_models.Snippet.Snippetid, _models.Snippet.activo == True).label("snippets_aprobados"),
+        contar(_models.User.Userid, _models.User.activo == True).label("usuarios_activos"),
+    )
+
+async def reconciliar(db: _asyncio.AsyncSession) -> dict:
+    # El bloqueo espera a las transacciones que ya tocaron contadores y frena
+    # las nuevas hasta el commit, así el conteo y los contadores no se cruzan.
+    await db.execute(_sql.text("LOCK TABLE estadistica IN EXCLUSIVE MODE"))
+    stats = dict((await db.execute(_conteo_exacto())).one()._mapping)
+
+    await db.execute(_sql.delete(_models.Estadistica).where(_models.Estadistica.clave.in_(CLAVES)))
+    await db.execute(
+        _sql.insert(_models.Estadistica),
+        [{"clave": clave, "shard": 0, "valor": valor} for clave, valor in stats.items()],
+    )
+    await db.commit()
+    return stats
+
+
+# Reconciliación periódica (cron):
+#   python -m services.stats reconcile
+async def _reconcile():
+    async with _database.AsyncSessionLocal() as db:
+        print(await reconciliar(db))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Contadores de estadísticas")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+    subparsers.add_parser("reconcile", help="Recalcular los contadores a partir de las tablas")
+    args = parser.parse_args()
+
+    if args.comando == "reconcile":
+        asyncio.run(_reconcile())
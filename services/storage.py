@@ -0,0 +1,710 @@
+import argparse
+import collections
+import hashlib
+import os
+import tempfile
+import time
+import zlib
+from typing import Optional
+
+import sqlalchemy as _sql
+import sqlalchemy.ext.asyncio as _asyncio
+import sqlalchemy.orm as _orm
+from sqlalchemy.dialects import postgresql as _postgresql
+from dotenv import load_dotenv
+from fastapi.concurrency import run_in_threadpool
+
+import database as _database
+import models as _models
+import services.migrations as _migrations
+
+# zstandard es opcional: solo hace falta con BLOB_COMPRESSION=zstd
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+load_dotenv()
+
+BLOB_STORAGE_BACKEND = os.getenv("BLOB_STORAGE_BACKEND", "local")
+BLOB_STORAGE_PATH = os.getenv("BLOB_STORAGE_PATH", "blobs")
+CHUNK_SIZE = 1024 * 1024
+
+# Compresión en reposo: "gzip", "zstd" o "none". Cada blob se escribe una vez
+# y se lee muchas: zstd usa por defecto un nivel alto; en gzip el 9 apenas
+# mejora al 6 y es tres veces más lento.
+BLOB_COMPRESSION = os.getenv("BLOB_COMPRESSION", "gzip")
+BLOB_COMPRESSION_LEVEL = os.getenv("BLOB_COMPRESSION_LEVEL")
+# solo se guarda comprimido si ocupa como mucho esta fracción del original
+_RATIO_MAXIMO = 0.9
+
+_EXTENSIONES = {"gzip": ".gz", "zstd": ".zst"}
+_NIVELES = {"gzip": 6, "zstd": 10}
+
+# Vista previa de los listados: primeras líneas, con un tope de bytes
+SNIPPET_PREVIEW_LINES = int(os.getenv("SNIPPET_PREVIEW_LINES", "10"))
+SNIPPET_PREVIEW_BYTES = int(os.getenv("SNIPPET_PREVIEW_BYTES", "1024"))
+
+# El barrido de huérfanos (sweep) solo toca archivos con más de estas horas:
+# los más recientes pueden ser de una subida que aún no ha hecho commit.
+BLOB_SWEEP_GRACE_HOURS = float(os.getenv("BLOB_SWEEP_GRACE_HOURS", "24"))
+
+
+def _compresor(encoding: str):
+    # ambos devuelven bytes en compress() y cierran el flujo con flush()
+    nivel = int(BLOB_COMPRESSION_LEVEL or _NIVELES[encoding])
+    if encoding == "gzip":
+        return zlib.compressobj(nivel, zlib.DEFLATED, 31)
+    return zstandard.ZstdCompressor(level=nivel).compressobj()
+
+def decompress(encoding: Optional[str], data: bytes) -> bytes:
+    if encoding is None:
+        return data
+    if encoding == "gzip":
+        return zlib.decompress(data, 31)
+    # decompressobj no necesita el tamaño en la cabecera del frame
+    return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+
+
+class BlobTooLarge(Exception):
+    pass
+
+
+class Resumen:
+    # Tamaño, número de líneas y vista previa del contenido. Se alimenta por
+    # bloques mientras se copia, así que no hace falta volver a leerlo.
+    def __init__(self):
+        self.tamano = 0
+        self._saltos = 0
+        self._ultimo = b""
+        self._inicio = bytearray()
+
+    def update(self, chunk: bytes):
+        if not chunk:
+            return
+        self.tamano += len(chunk)
+        self._saltos += chunk.count(b"\n")
+        self._ultimo = chunk[-1:]
+        if len(self._inicio) < SNIPPET_PREVIEW_BYTES:
+            self._inicio += chunk[:SNIPPET_PREVIEW_BYTES - len(self._inicio)]
+
+    @property
+    def lineas(self) -> int:
+        # la última línea cuenta aunque no termine en salto
+        return self._saltos + (1 if self._ultimo not in (b"", b"\n") else 0)
+
+    @property
+    def vista_previa(self) -> str:
+        inicio = b"\n".join(bytes(self._inicio).split(b"\n")[:SNIPPET_PREVIEW_LINES])
+        # el tope de bytes puede cortar un carácter; Postgres no admite NUL en text
+        return inicio.decode("utf-8", errors="ignore").replace("\x00", "")
+
+    def columnas(self) -> dict:
+        return {"tamano": self.tamano, "lineas": self.lineas, "vista_previa": self.vista_previa}
+
+def resumir(data: bytes) -> Resumen:
+    resumen = Resumen()
+    resumen.update(data)
+    return resumen
+
+
+class BlobStore:
+    # Almacén direccionado por contenido: la clave de cada blob es su SHA-256.
+    def exists(self, hash: str) -> bool:
+        raise NotImplementedError
+
+    def write(self, hash: str, data: bytes):
+        raise NotImplementedError
+
+    def read(self, hash: str) -> bytes:
+        raise NotImplementedError
+
+
+    def delete(self, hash: str):
+        raise NotImplementedError
+
+    # Ruta en disco si el backend la tiene, para servir el archivo sin copiarlo.
+    def local_path(self, hash: str) -> Optional[str]:
+        return None
+
+    # (ruta, encoding) si el blob está guardado comprimido: se puede servir tal
+    # cual con Content-Encoding a los clientes que acepten ese encoding.
+    def encoded_path(self, hash: str) -> Optional[tuple]:
+        return None
+
+    # (bytes en disco, encoding) para el informe de compresión.
+    def stored(self, hash: str) -> Optional[tuple]:
+        return None
+
+    # Comprime un blob guardado sin comprimir; False si no hay nada que hacer.
+    def compress(self, hash: str) -> bool:
+        return False
+
+    # Subidas en streaming: stage copia el origen por bloques a un área temporal
+    # calculando hash y tamaño (y el resumen, si se pasa uno), y commit_staged
+    # lo publica bajo su hash.
+    def stage(self, source, max_size: Optional[int] = None, resumen: Optional[Resumen] = None):
+        raise NotImplementedError
+
+    def commit_staged(self, hash: str, staged):
+        raise NotImplementedError
+
+    def discard_staged(self, staged):
+        raise NotImplementedError
+
+    # Para el barrido de huérfanos: hashes con archivo guardado sin modificar
+    # desde antes de `antes` (timestamp), y limpieza de los temporales de
+    # staging y de escrituras a medias igual de antiguos.
+    def stored_hashes(self, antes: float):
+        return iter(())
+
+    def clean_temporary(self, antes: float) -> int:
+        return 0
+
+
+class LocalBlobStore(BlobStore):
+    # Cada blob está en root/ab/cd/<hash> o, si se guardó comprimido, en
+    # <hash>.gz / <hash>.zst. Solo existe una de las variantes a la vez.
+    def __init__(self, root: str, compression: str = BLOB_COMPRESSION):
+        if compression not in ("none", *_EXTENSIONES):
+            raise RuntimeError(f"Unknown blob compression: {compression}")
+        if compression == "zstd" and zstandard is None:
+            raise RuntimeError("BLOB_COMPRESSION=zstd requires the zstandard package")
+        self.root = os.path.abspath(root)
+        self.compression = None if compression == "none" else compression
+        os.makedirs(self.root, exist_ok=True)
+
+    def path(self, hash: str) -> str:
+        return os.path.join(self.root, hash[:2], hash[2:4], hash)
+
+    def _variantes(self, hash: str):
+        base = self.path(hash)
+        return [(base, None)] + [(base + extension, encoding) for encoding, extension in _EXTENSIONES.items()]
+
+    def _encontrar(self, hash: str):
+        for ruta, encoding in self._variantes(hash):
+            if os.path.exists(ruta):
+                return ruta, encoding
+        return None
+
+    def exists(self, hash: str) -> bool:
+        return self._encontrar(hash) is not None
+
+    def local_path(self, hash: str) -> Optional[str]:
+        ruta = self.path(hash)
+        return ruta if os.path.exists(ruta) else None
+
+    def encoded_path(self, hash: str) -> Optional[tuple]:
+        encontrado = self._encontrar(hash)
+        return encontrado if encontrado and encontrado[1] else None
+
+    def stored(self, hash: str) -> Optional[tuple]:
+        encontrado = self._encontrar(hash)
+        if encontrado is None:
+            return None
+        ruta, encoding = encontrado
+        return os.path.getsize(ruta), encoding
+
+    def _escribir(self, destino: str, data: bytes):
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        # escribir en un temporal del mismo directorio y renombrar: nunca queda un blob a medias
+        fd, temporal = tempfile.mkstemp(dir=os.path.dirname(destino))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(temporal, destino)
+        except BaseException:
+            if os.path.exists(temporal):
+                os.unlink(temporal)
+            raise
+
+    def _comprimir_archivo(self, origen: str, destino: str) -> bool:
+        # Comprime por bloques a un temporal junto al destino; solo lo publica
+        # si compensa.
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        compresor = _compresor(self.compression)
+        fd, temporal = tempfile.mkstemp(dir=os.path.dirname(destino))
+        entrada = salida = 0
+        try:
+            with os.fdopen(fd, "wb") as f, open(origen, "rb") as fuente:
+                while True:
+                    chunk = fuente.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    entrada += len(chunk)
+                    salida += f.write(compresor.compress(chunk))
+                salida += f.write(compresor.flush())
+            if salida > entrada * _RATIO_MAXIMO:
+                os.unlink(temporal)
+                return False
+            os.replace(temporal, destino)
+            return True
+        except BaseException:
+            if os.path.exists(temporal):
+                os.unlink(temporal)
+            raise
+
+    def write(self, hash: str, data: bytes):
+        if self.exists(hash):
+            return
+        destino = self.path(hash)
+        if self.compression:
+            compresor = _compresor(self.compression)
+            comprimido = compresor.compress(data) + compresor.flush()
+            if len(comprimido) <= len(data) * _RATIO_MAXIMO:
+                destino, data = destino + _EXTENSIONES[self.compression], comprimido
+        self._escribir(destino, data)
+
+    def read(self, hash: str) -> bytes:
+        # en orden: compress() publica la variante comprimida antes de borrar la otra
+        for ruta, encoding in self._variantes(hash):
+            try:
+                with open(ruta, "rb") as f:
+                    data = f.read()
+            except FileNotFoundError:
+                continue
+            return decompress(encoding, data)
+        raise FileNotFoundError(self.path(hash))
+
+    def compress(self, hash: str) -> bool:
+        ruta = self.path(hash)
+        if not self.compression or not os.path.exists(ruta):
+            return False
+        if not self._comprimir_archivo(ruta, ruta + _EXTENSIONES[self.compression]):
+            return False
+        os.unlink(ruta)
+        return True
+
+    def stage(self, source, max_size: Optional[int] = None, resumen: Optional[Resumen] = None):
+        staging = os.path.join(self.root, "tmp")
+        os.makedirs(staging, exist_ok=True)
+        fd, temporal = tempfile.mkstemp(dir=staging)
+        digest = hashlib.sha256()
+        tamano = 0
+        try:
+            with os.fdopen(fd, "wb") as f:
+                while True:
+                    chunk = source.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    tamano += len(chunk)
+                    if max_size is not None and tamano > max_size:
+                        raise BlobTooLarge()
+                    digest.update(chunk)
+                    if resumen is not None:
+                        resumen.update(chunk)
+                    f.write(chunk)
+        except BaseException:
+            os.unlink(temporal)
+            raise
+        return digest.hexdigest(), tamano, temporal
+
+    def commit_staged(self, hash: str, staged):
+        if self.exists(hash):
+            os.unlink(staged)
+            return
+        destino = self.path(hash)
+        if self.compression and self._comprimir_archivo(staged, destino + _EXTENSIONES[self.compression]):
+            os.unlink(staged)
+            return
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        os.replace(staged, destino)
+
+    def discard_staged(self, staged):
+        try:
+            os.unlink(staged)
+        except FileNotFoundError:
+            pass
+
+    def delete(self, hash: str):
+        for ruta, _ in self._variantes(hash):
+            try:
+                os.unlink(ruta)
+            except FileNotFoundError:
+                pass
+
+    def _antiguos(self, antes: float):
+        # (directorio, nombre) de los archivos bajo root modificados antes de `antes`
+        for directorio, _, nombres in os.walk(self.root):
+            for nombre in nombres:
+                try:
+                    if os.path.getmtime(os.path.join(directorio, nombre)) < antes:
+                        yield directorio, nombre
+                except FileNotFoundError:
+                    pass
+
+    def stored_hashes(self, antes: float):
+        staging = os.path.join(self.root, "tmp")
+        for directorio, nombre in self._antiguos(antes):
+            if directorio == staging or nombre.startswith("tmp"):
+                continue
+            hash = nombre.split(".", 1)[0]
+            if self.path(hash) == os.path.join(directorio, hash):
+                yield hash
+
+    def clean_temporary(self, antes: float) -> int:
+        # staging de stage() y temporales de mkstemp que dejó un proceso caído
+        staging = os.path.join(self.root, "tmp")
+        borrados = 0
+        for directorio, nombre in self._antiguos(antes):
+            if directorio == staging or nombre.startswith("tmp"):
+                try:
+                    os.unlink(os.path.join(directorio, nombre))
+                    borrados += 1
+                except FileNotFoundError:
+                    pass
+        return borrados
+
+
+_BACKENDS = {
+    "local": lambda: LocalBlobStore(BLOB_STORAGE_PATH),
+}
+_store: Optional[BlobStore] = None
+
+def register_backend(name: str, factory):
+    _BACKENDS[name] = factory
+
+def get_store() -> BlobStore:
+    global _store
+    if _store is None:
+        if BLOB_STORAGE_BACKEND not in _BACKENDS:
+            raise RuntimeError(f"Unknown blob storage backend: {BLOB_STORAGE_BACKEND}")
+        _store = _BACKENDS[BLOB_STORAGE_BACKEND]()
+    return _store
+
+def hash_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+# Conteo de referencias: una fila en blob por contenido distinto. Subir el mismo
+# archivo dos veces solo incrementa referencias; el blob se borra al llegar a 0.
+def _reference_stmt(hash: str, tamano: int):
+    return (
+        _postgresql.insert(_models.Blob)
+        .values(hash=hash, tamano=tamano, referencias=1)
+        .on_conflict_do_update(
+            index_elements=[_models.Blob.hash],
+            set_={"referencias": _models.Blob.referencias + 1},
+        )
+    )
+
+def _release_stmt(hash: str):
+    return (
+        _sql.update(_models.Blob)
+        .where(_models.Blob.hash == hash)
+        .values(referencias=_models.Blob.referencias - 1)
+    )
+
+async def save_blob(db: _asyncio.AsyncSession, data: bytes):
+    hash = hash_bytes(data)
+    # primero la referencia (bloquea la fila) y después el archivo, para no
+    # competir con un purge_blobs concurrente del mismo hash
+    await db.execute(_reference_stmt(hash, len(data)))
+    await run_in_threadpool(get_store().write, hash, data)
+    return hash, len(data)
+
+async def save_stream(db: _asyncio.AsyncSession, source, max_size: Optional[int] = None, resumen: Optional[Resumen] = None):
+    # source es un archivo síncrono; la copia completa corre en un solo hilo
+    store = get_store()
+    hash, tamano, staged = await run_in_threadpool(store.stage, source, max_size, resumen)
+    try:
+        await db.execute(_reference_stmt(hash, tamano))
+        await run_in_threadpool(store.commit_staged, hash, staged)
+    except BaseException:
+        await run_in_threadpool(store.discard_staged, staged)
+        raise
+    return hash, tamano
+
+def _write_many(store: BlobStore, blobs: dict):
+    for hash, data in blobs.items():
+        store.write(hash, data)
+
+async def save_blobs(db: _asyncio.AsyncSession, datos: list):
+    # Versión por lotes de save_blob: una sola sentencia suma las referencias de
+    # todos los hashes (ordenados, para que dos lotes concurrentes no se bloqueen
+    # en orden inverso) y después se escriben los archivos que falten. Si luego
+    # hay rollback, esos archivos quedan sin fila hasta el próximo sweep.
+    hashes = await run_in_threadpool(lambda: [hash_bytes(data) for data in datos])
+    blobs = dict(zip(hashes, datos))
+    referencias = {}
+    for hash in hashes:
+        referencias[hash] = referencias.get(hash, 0) + 1
+    if referencias:
+        stmt = _postgresql.insert(_models.Blob).values([
+            {"hash": hash, "tamano": len(blobs[hash]), "referencias": referencias[hash]}
+            for hash in sorted(referencias)
+        ])
+        await db.execute(stmt.on_conflict_do_update(
+            index_elements=[_models.Blob.hash],
+            set_={"referencias": _models.Blob.referencias + stmt.excluded.referencias},
+        ))
+        await run_in_threadpool(_write_many, get_store(), blobs)
+    return [(hash, len(data)) for hash, data in zip(hashes, datos)]
+
+async def release_blob(db: _asyncio.AsyncSession, hash: Optional[str]):
+    if hash:
+        await db.execute(_release_stmt(hash))
+
+# Los archivos se borran solo después del commit: si fallara, el rollback
+# devolvería filas cuyo contenido ya no estaría en disco. Ni siquiera entonces
+# basta con comprobar que el hash sigue sin fila: una subida del mismo
+# contenido que aún no ha hecho commit no se ve, y commit_staged/write ya
+# habrán descartado su copia al encontrar el archivo viejo. Por eso antes de
+# borrar se reclama cada hash con una fila provisional (referencias = 0,
+# ON CONFLICT DO NOTHING, en orden como save_blobs): el INSERT espera a las
+# subidas en vuelo y solo devuelve los hashes que siguen sin fila. Mientras no
+# se haga commit, las subidas nuevas de esos hashes esperan en su INSERT; al
+# terminar se borran las filas provisionales y escriben su archivo de nuevo.
+def _reclamar_stmt(hashes):
+    stmt = _postgresql.insert(_models.Blob).values([
+        {"hash": hash, "tamano": 0, "referencias": 0} for hash in sorted(set(hashes))
+    ])
+    return stmt.on_conflict_do_nothing().returning(_models.Blob.hash)
+
+def _liberar_stmt(hashes):
+    return _sql.delete(_models.Blob).where(_models.Blob.hash.in_(list(hashes)))
+
+def _borrar_archivos(hashes):
+    store = get_store()
+    for hash in hashes:
+        store.delete(hash)
+
+def _borrar_reclamados(db: _orm.Session, hashes) -> int:
+    # versión síncrona, para delete_files y sweep; hace el commit
+    reclamados = db.scalars(_reclamar_stmt(hashes)).all()
+    _borrar_archivos(reclamados)
+    if reclamados:
+        db.execute(_liberar_stmt(reclamados))
+    db.commit()
+    return len(reclamados)
+
+async def purge_blobs(db: _asyncio.AsyncSession, hashes):
+    hashes = [h for h in hashes if h]
+    if not hashes:
+        return
+    huerfanos = (await db.execute(
+        _sql.delete(_models.Blob)
+        .where(_models.Blob.hash.in_(hashes), _models.Blob.referencias <= 0)
+        .returning(_models.Blob.hash)
+    )).scalars().all()
+    await db.commit()
+    if huerfanos:
+        reclamados = (await db.scalars(_reclamar_stmt(huerfanos))).all()
+        await run_in_threadpool(_borrar_archivos, reclamados)
+        if reclamados:
+            await db.execute(_liberar_stmt(reclamados))
+        await db.commit()
+
+# Versión síncrona y por lotes de release_blob + purge_blobs para los trabajos
+# de mantenimiento (services/purge.py): un UPDATE por hash distinto y un único
+# DELETE de los que se quedan sin referencias. Devuelve esos hashes: quien
+# llama hace el commit y después delete_files.
+def release_blobs(db: _orm.Session, hashes) -> list:
+    referencias = collections.Counter(h for h in hashes if h)
+    if not referencias:
+        return []
+    blob = _models.Blob.__table__
+    db.execute(
+        blob.update()
+        .where(blob.c.hash == _sql.bindparam("h"))
+        .values(referencias=blob.c.referencias - _sql.bindparam("n")),
+        [{"h": hash, "n": n} for hash, n in referencias.items()],
+    )
+    return db.scalars(
+        _sql.delete(_models.Blob)
+        .where(_models.Blob.hash.in_(list(referencias)), _models.Blob.referencias <= 0)
+        .returning(_models.Blob.hash)
+    ).all()
+
+def delete_files(hashes):
+    if not hashes:
+        return
+    with _orm.Session(_database.engine) as db:
+        _borrar_reclamados(db, hashes)
+
+async def read_snippet(snippet: _models.Snippet) -> bytes:
+    # filas antiguas que aún no se migraron conservan el contenido en la columna
+    if snippet.hash_contenido:
+        return await run_in_threadpool(get_store().read, snippet.hash_contenido)
+    # la columna es diferida: en la sesión asíncrona no hay carga implícita
+    db = _asyncio.async_object_session(snippet)
+    if db is not None and "snippet" in _sql.inspect(snippet).unloaded:
+        await db.refresh(snippet, attribute_names=["snippet"])
+    return snippet.snippet or b""
+
+
+# Migración: mueve el contenido de snippet.snippet al almacén por lotes.
+# El esquema (tabla blob, columnas nuevas) lo crean las migraciones versionadas.
+#   python -m services.storage migrate --batch-size 200
+def migrate(batch_size: int = 200):
+    _migrations.upgrade()
+
+    store = get_store()
+    total = 0
+    while True:
+        with _orm.Session(_database.engine) as db:
+            rows = db.execute(
+                _sql.select(_models.Snippet.Snippetid, _models.Snippet.snippet)
+                .where(_models.Snippet.snippet.is_not(None), _models.Snippet.hash_contenido.is_(None))
+                .limit(batch_size)
+                .with_for_update(skip_locked=True)
+            ).all()
+            if not rows:
+                break
+
+            for snippet_id, data in rows:
+                hash = hash_bytes(data)
+                db.execute(_reference_stmt(hash, len(data)))
+                store.write(hash, data)
+                db.execute(
+                    _sql.update(_models.Snippet)
+                    .where(_models.Snippet.Snippetid == snippet_id)
+                    .values(hash_contenido=hash, snippet=None, **resumir(data).columnas())
+                )
+            db.commit()
+
+        total += len(rows)
+        print(f"{total} snippets migrados")
+
+    return total
+
+
+# Resumen (tamaño, líneas, vista previa) de los snippets escritos antes de que
+# existieran esas columnas.
+#   python -m services.storage summarize --batch-size 500
+def summarize(batch_size: int = 500):
+    _migrations.upgrade()
+
+    store = get_store()
+    total = 0
+    while True:
+        with _orm.Session(_database.engine) as db:
+            rows = db.execute(
+                _sql.select(_models.Snippet.Snippetid, _models.Snippet.hash_contenido, _models.Snippet.snippet)
+                .where(_models.Snippet.lineas.is_(None))
+                .limit(batch_size)
+                .with_for_update(skip_locked=True)
+            ).all()
+            if not rows:
+                break
+
+            db.execute(
+                _sql.update(_models.Snippet),
+                [
+                    {"Snippetid": snippet_id, **resumir(store.read(hash) if hash else data or b"").columnas()}
+                    for snippet_id, hash, data in rows
+                ],
+            )
+            db.commit()
+
+        total += len(rows)
+        print(f"{total} snippets resumidos")
+
+    return total
+
+
+# Compresión de los blobs ya guardados sin comprimir (por ejemplo, tras activar
+# BLOB_COMPRESSION), en lotes de hashes por orden.
+#   python -m services.storage compress --batch-size 500
+def compress(batch_size: int = 500):
+    store = get_store()
+    ultimo = ""
+    revisados = comprimidos = 0
+    while True:
+        with _orm.Session(_database.engine) as db:
+            hashes = db.scalars(
+                _sql.select(_models.Blob.hash)
+                .where(_models.Blob.hash > ultimo)
+                .order_by(_models.Blob.hash)
+                .limit(batch_size)
+            ).all()
+        if not hashes:
+            break
+        for hash in hashes:
+            comprimidos += store.compress(hash)
+        revisados += len(hashes)
+        ultimo = hashes[-1]
+        print(f"{revisados} blobs revisados, {comprimidos} comprimidos")
+    return comprimidos
+
+# Barrido de huérfanos: las subidas e importaciones escriben el archivo antes
+# del commit (así nunca hay una fila sin contenido), de modo que un rollback
+# deja en disco archivos sin fila en blob. Cada lote se borra reclamando los
+# hashes igual que purge_blobs, así que no compite con las subidas en vuelo.
+#   python -m services.storage sweep --batch-size 500 --grace-hours 24
+
+def sweep(batch_size: int = 500, grace_hours: float = BLOB_SWEEP_GRACE_HOURS) -> int:
+    _migrations.upgrade()
+
+    store = get_store()
+    antes = time.time() - grace_hours * 3600
+    lote = set()
+    revisados = borrados = 0
+    with _orm.Session(_database.engine) as db:
+        for hash in store.stored_hashes(antes):
+            lote.add(hash)
+            if len(lote) >= batch_size:
+                borrados += _borrar_reclamados(db, lote)
+                revisados += len(lote)
+                lote.clear()
+                print(f"{revisados} blobs revisados, {borrados} huérfanos borrados")
+        if lote:
+            borrados += _borrar_reclamados(db, lote)
+            revisados += len(lote)
+    temporales = store.clean_temporary(antes)
+    print(f"{revisados} blobs revisados, {borrados} huérfanos borrados, {temporales} temporales borrados")
+    return borrados
+
+# Informe del ahorro: tamaño lógico (tabla blob) frente a lo que ocupa en disco,
+# por encoding.
+#   python -m services.storage report
+def report():
+    store = get_store()
+    totales = {}
+    with _orm.Session(_database.engine) as db:
+        filas = db.execute(
+            _sql.select(_models.Blob.hash, _models.Blob.tamano).execution_options(yield_per=1000)
+        )
+        for hash, tamano in filas:
+            guardado = store.stored(hash)
+            encoding = (guardado[1] or "none") if guardado else "missing"
+            total = totales.setdefault(encoding, [0, 0, 0])
+            total[0] += 1
+            total[1] += tamano or 0
+            total[2] += guardado[0] if guardado else 0
+
+    print(f"{'encoding':<10}{'blobs':>10}{'logical':>16}{'stored':>16}{'saved':>8}")
+    for encoding, (blobs, logico, guardado) in sorted(totales.items()):
+        ahorro = f"{100 * (1 - guardado / logico):.1f}%" if logico and encoding != "missing" else "-"
+        print(f"{encoding:<10}{blobs:>10}{logico:>16}{guardado:>16}{ahorro:>8}")
+    logico = sum(t[1] for e, t in totales.items() if e != "missing")
+    guardado = sum(t[2] for t in totales.values())
+    if logico:
+        print(f"{'total':<10}{sum(t[0] for t in totales.values()):>10}{logico:>16}{guardado:>16}{100 * (1 - guardado / logico):>7.1f}%")
+    return totales
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Almacén de contenido de snippets")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+    migrar = subparsers.add_parser("migrate", help="Mover el contenido existente de Postgres al almacén")
+    migrar.add_argument("--batch-size", type=int, default=200)
+    resumen = subparsers.add_parser("summarize", help="Calcular tamaño, líneas y vista previa de los snippets que no los tienen")
+    resumen.add_argument("--batch-size", type=int, default=500)
+    comprimir = subparsers.add_parser("compress", help="Comprimir los blobs guardados sin comprimir")
+    comprimir.add_argument("--batch-size", type=int, default=500)
+    subparsers.add_parser("report", help="Tamaño lógico frente a tamaño en disco por encoding")
+    barrer = subparsers.add_parser("sweep", help="Borrar los archivos del almacén que no tienen fila en blob")
+    barrer.add_argument("--batch-size", type=int, default=500)
+    barrer.add_argument("--grace-hours", type=float, default=BLOB_SWEEP_GRACE_HOURS)
+    args = parser.parse_args()
+
+    if args.comando == "migrate":
+        migrate(batch_size=args.batch_size)
+    elif args.comando == "summarize":
+        summarize(batch_size=args.batch_size)
+    elif args.comando == "compress":
+        compress(batch_size=args.batch_size)
+    elif args.comando == "report":
+        report()
+    elif args.comando == "sweep":
+        sweep(batch_size=args.batch_size, grace_hours=args.grace_hours)
@@ -0,0 +1,62 @@
+import os
+
+from dotenv import load_dotenv
+from fastapi import HTTPException, UploadFile
+from starlette.responses import JSONResponse
+import sqlalchemy.ext.asyncio as _asyncio
+
+import services.storage as _storage
+
+load_dotenv()
+
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", str(5 * 1024 * 1024)))
+# margen para los demás campos del formulario y los separadores multipart
+_FORM_OVERHEAD = 64 * 1024
+
+def _too_large(limite: int = MAX_UPLOAD_SIZE):
+    return HTTPException(status_code=413, detail=f"File too large (max {limite} bytes)")
+
+async def save_upload(db: _asyncio.AsyncSession, file: UploadFile, resumen: _storage.Resumen = None):
+    try:
+        return await _storage.save_stream(db, file.file, MAX_UPLOAD_SIZE, resumen)
+    except _storage.BlobTooLarge:
+        raise _too_large()
+
+
+class UploadLimitMiddleware:
+    # Rechaza cuerpos multipart demasiado grandes antes de que se terminen de
+    # recibir: por Content-Length si viene, o contando bytes a medida que llegan.
+    # path_limits permite un límite propio por ruta (p. ej. la importación masiva).
+    def __init__(self, app, max_body_size: int = MAX_UPLOAD_SIZE + _FORM_OVERHEAD, path_limits: dict = None):
+        self.app = app
+        self.max_body_size = max_body_size
+        self.path_limits = path_limits or {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope["headers"])
+        if not headers.get(b"content-type", b"").startswith(b"multipart/form-data"):
+            return await self.app(scope, receive, send)
+
+        limite = self.path_limits.get(scope["path"])
+        max_body_size = limite + _FORM_OVERHEAD if limite else self.max_body_size
+        content_length = headers.get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > max_body_size:
+            error = _too_large(limite or MAX_UPLOAD_SIZE)
+            response = JSONResponse({"detail": error.detail}, status_code=error.status_code)
+            return await response(scope, receive, send)
+
+        recibido = 0
+
+        async def limited_receive():
+            nonlocal recibido
+            message = await receive()
+            if message["type"] == "http.request":
+                recibido += len(message.get("body", b""))
+                if recibido > max_body_size:
+                    raise _too_large(limite or MAX_UPLOAD_SIZE)
+            return message
+
+        await self.app(scope, limited_receive, send)
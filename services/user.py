@@ -4,7 +4,6 @@ import os
 
 from jose import jwt, JWTError
 from dotenv import load_dotenv
-from passlib.context import CryptContext
 
 import fastapi.security as _security
 from fastapi import HTTPException, Depends
@@ -12,12 +11,13 @@ from fastapi import HTTPException, Depends
 import models as _models
 import schemas.user as _user
 from services.database import get_db
+import services.hashing as _hashing
+import services.auth_cache as _authCache
+import services.stats as _stats
+import services.leaderboard as _leaderboard
 
-import sqlalchemy.orm as _orm
-from sqlalchemy import func, desc
-
-# Crea el contexto para hashing con bcrypt
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+import sqlalchemy as _sql
+import sqlalchemy.ext.asyncio as _asyncio
 
 load_dotenv()
 
@@ -26,22 +26,34 @@ OAuth2_scheme = _security.OAuth2PasswordBearer("/token")
 JWT_SECRET = os.getenv("JWT_SECRET")
 ALGORITHM = os.getenv("ALGORITHM")
 
-async def get_user_by_username(username: str, db: _orm.Session):
-    return db.query(_models.User).filter(_models.User.username == username).first()
-
-async def create_user(user: _user.UserCreate, db: _orm.Session):
+async def get_user_by_username(username: str, db: _asyncio.AsyncSession):
+    return await db.scalar(_sql.select(_models.User).filter(_models.User.username == username))
+
+async def get_user_version(username: str, db: _asyncio.AsyncSession):
+    row = (await db.execute(
+        _sql.select(_models.User.Userid, _models.User.actualiza).filter(_models.User.username == username)
+    )).first()
+    if row is None:
+        return None, None
+    return tuple(row), row.actualiza
+
+async def create_user(user: _user.UserCreate, db: _asyncio.AsyncSession):
+    # bcrypt tarda cientos de ms: la conexión de las consultas previas vuelve
+    # al pool mientras tanto, o una tormenta de registros lo agota
+    await db.close()
     user_obj = _models.User(
         username=user.username,
         full_name=user.full_name,
         email=user.email,
-        hashed_password= pwd_context.hash(user.hashed_password) 
+        hashed_password= await _hashing.hash_password(user.hashed_password) 
     )
     db.add(user_obj)
-    db.commit()
-    db.refresh(user_obj)
+    await _stats.incrementar(db, total_usuarios=1, usuarios_activos=1)
+    await db.commit()
+    await db.refresh(user_obj)
     return user_obj
 
-async def authenticate_user(username: str, password: str, db: _orm.Session):
+async def authenticate_user(username: str, password: str, db: _asyncio.AsyncSession):
     user = await get_user_by_username(db=db, username=username)
 
     if not user:
@@ -49,7 +61,10 @@ async def authenticate_user(username: str, password: str, db: _orm.Session):
             "WWW-Authenticate":"Bearer"
         })
 
-    if not user.verify_password(password):
+    # como en create_user: sin conexión retenida durante bcrypt (el usuario
+    # queda desconectado de la sesión, con sus columnas ya cargadas)
+    await db.close()
+    if not await _hashing.verify_password(password, user.hashed_password):
         raise HTTPException(status_code=401, detail="Could not validate credentials", headers={
             "WWW-Authenticate":"Bearer"
         })
@@ -67,47 +82,33 @@ def create_token(data: dict, time_expire: Union[datetime, None] = None):
     
     return  token_jwt
 
-async def get_current_user(db: _orm.Session = Depends(get_db), token: str = Depends(OAuth2_scheme)):
-    try:
-        token_decode = jwt.decode(token, key=JWT_SECRET, algorithms=[ALGORITHM])
+async def get_current_user(db: _asyncio.AsyncSession = Depends(get_db), token: str = Depends(OAuth2_scheme)):
+    # Caso común: token y usuario ya están en caché y no se toca la base de datos
+    user_id = _authCache.get_token(token)
+    if user_id is None:
+        try:
+            token_decode = jwt.decode(token, key=JWT_SECRET, algorithms=[ALGORITHM])
+        except JWTError:
+            raise HTTPException(status_code=401, detail="Could not validate credentials", headers={
+                "WWW-Authenticate": "Bearer"
+            })
+
         user_id = token_decode.get("id")
         if user_id is None:
             raise HTTPException(status_code=401, detail="Invalid token payload")
+        _authCache.put_token(token, user_id, token_decode.get("exp"))
 
-        user = db.query(_models.User).filter_by(Userid=user_id).first()  
-        if user is None:
+    user = _authCache.get_principal(user_id)
+    if user is None:
+        user_db = await db.scalar(_sql.select(_models.User).filter_by(Userid=user_id))
+        if user_db is None:
             raise HTTPException(status_code=401, detail="User not found")
+        user = _authCache.put_principal(user_db)
 
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Could not validate credentials", headers={
-            "WWW-Authenticate": "Bearer"
-        })
+    if user.activo is False:
+        raise HTTPException(status_code=401, detail="Inactive user")
 
     return user
 
-async def top_five_users( user: _user.User, db: _orm.Session = Depends(get_db),):
-    top_five = db.query(
-        _models.User.Userid,
-        _models.User.username,
-        _models.User.full_name,
-        func.count( _models.Publicacion.Userid )
-    ).join(
-        _models.Publicacion,
-        _models.User.Userid == _models.Publicacion.Userid
-    ).group_by(
-        _models.User.Userid,
-        _models.User.username,
-        _models.User.full_name,
-    ).order_by(
-        desc( func.count( _models.Publicacion.Userid ) )
-    ).limit( 6 )
-
-    top_five = [
-        {
-            "id": r[0],
-            "username": r[1],
-            "full_name": r[2],
-            "numero_publicaciones": r[3]
-        } for r in top_five
-    ]
-    return top_five
\ No newline at end of file
+async def top_five_users( user: _user.User, db: _asyncio.AsyncSession = Depends(get_db), ventana: str = "all", k: int = 5):
+    return await _leaderboard.top(db, ventana=ventana, k=k)
\ No newline at end of file